@@ -0,0 +1,416 @@
+"""
+Fake Upstream APIs
+
+Local HTTP stand-in for zippopotam.us, ip-api.com, Open-Meteo (forecast,
+archive and geocoding) and wttr.in with configurable latency, jitter and error rates.
+Like the real upstreams, responses are gzipped when the client accepts it.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Zip codes the fake zippopotam.us reports as unknown
+UNKNOWN_ZIPCODES = {"00000"}
+
+# Names the fake geocoding API knows more than one place by; any other name
+# is a single town in Oregon, except for those in UNKNOWN_PLACES
+NAMESAKES = {
+    "portland": [
+        ("Portland", "Oregon", 45.5234, -122.6762, 652503, "America/Los_Angeles"),
+        ("Portland", "Maine", 43.6615, -70.2553, 66881, "America/New_York"),
+    ],
+}
+UNKNOWN_PLACES = {"nowhere"}
+
+# Bodies shorter than this are sent uncompressed
+GZIP_MIN_SIZE = 256
+
+
+def fake_coordinates(zipcode):
+    """Return stable, plausible continental US coordinates for a zip code."""
+    seed = zlib.crc32(zipcode.encode("utf-8"))
+    lat = 25 + (seed % 24000) / 1000
+    lon = -124 + ((seed // 24000) % 57000) / 1000
+    return round(lat, 4), round(lon, 4)
+
+
+class FakeEndpoints:
+    """The upstream URLs of fake upstreams serving at url."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def env(self):
+        """Environment variables pointing WeatherService at this server."""
+        return {
+            "WEATHER_OPEN_METEO_URL": f"{self.url}/v1/forecast",
+            "WEATHER_IP_LOCATION_URL": f"{self.url}/json",
+            "WEATHER_ZIPCODE_URL": f"{self.url}/us",
+            "WEATHER_WTTR_URL": f"{self.url}/wttr",
+            "WEATHER_ARCHIVE_URL": f"{self.url}/v1/archive",
+            "WEATHER_GEOCODING_URL": f"{self.url}/v1/search",
+        }
+
+    def configure(self, service):
+        """Point an existing WeatherService at this server."""
+        service.weather_base_url = f"{self.url}/v1/forecast"
+        service.ip_location_url = f"{self.url}/json"
+        service.zipcode_url = f"{self.url}/us"
+        service.wttr_url = f"{self.url}/wttr"
+        service.archive_url = f"{self.url}/v1/archive"
+        service.geocoding_url = f"{self.url}/v1/search"
+        return service
+
+
+class FakeUpstreams(FakeEndpoints):
+    """Threaded HTTP server imitating the upstream APIs.
+
+    Every response is delayed by latency plus up to jitter seconds, and a
+    fraction error_rate of requests fail with a 503. With etags, responses
+    carry an ETag and conditional requests for an unchanged body get a 304.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, etags=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.etags = etags
+        self.random = random.Random(seed)
+        self.counts = {
+            "zipcode": 0,
+            "ip": 0,
+            "weather": 0,
+            "archive": 0,
+            "geocoding": 0,
+            "wttr": 0,
+            "errors": 0,
+            "not_modified": 0,
+        }
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeHandler)
+        self.server.daemon_threads = True
+        self.server.upstreams = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.05}
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _delay_and_fail(self):
+        """Sleep for the configured latency; return True if this call should fail."""
+        with self._lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._count("errors")
+        return fail
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    # Keep connections open like the real upstreams do, and send headers and
+    # body in one write so Nagle's algorithm does not add latency of its own
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def do_GET(self):
+        upstreams = self.server.upstreams
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/_counts":
+            with upstreams._lock:
+                counts = dict(upstreams.counts)
+            self._reply(counts)
+        elif upstreams._delay_and_fail():
+            self._reply({"error": "unavailable"}, status=503)
+        elif url.path.startswith("/us/"):
+            upstreams._count("zipcode")
+            self._zipcode(url.path[len("/us/") :])
+        elif url.path == "/json":
+            upstreams._count("ip")
+            self._reply(
+                {
+                    "status": "success",
+                    "city": "Portland",
+                    "regionName": "Oregon",
+                    "lat": 45.5152,
+                    "lon": -122.6784,
+                    "timezone": "America/Los_Angeles",
+                }
+            )
+        elif url.path == "/v1/forecast":
+            upstreams._count("weather")
+            self._forecast(query)
+        elif url.path == "/v1/archive":
+            upstreams._count("archive")
+            self._archive(query)
+        elif url.path == "/v1/search":
+            upstreams._count("geocoding")
+            self._search(query.get("name", ""))
+        elif url.path.startswith("/wttr/"):
+            upstreams._count("wttr")
+            lat = float(url.path[len("/wttr/") :].split(",")[0])
+            self._reply(
+                {
+                    "current_condition": [
+                        {
+                            "temp_F": str(int(60 + lat % 20)),
+                            "weatherCode": "116",
+                            "weatherDesc": [{"value": "Partly cloudy"}],
+                        }
+                    ]
+                }
+            )
+        else:
+            self._reply({"error": "not found"}, status=404)
+
+    def _zipcode(self, zipcode):
+        if zipcode in UNKNOWN_ZIPCODES:
+            self._reply({}, status=404)
+            return
+        lat, lon = fake_coordinates(zipcode)
+        self._reply(
+            {
+                "post code": zipcode,
+                "country": "United States",
+                "places": [
+                    {
+                        "place name": f"Town {zipcode}",
+                        "state": "Oregon",
+                        "state abbreviation": "OR",
+                        "latitude": str(lat),
+                        "longitude": str(lon),
+                    }
+                ],
+            }
+        )
+
+    def _forecast(self, query):
+        lats = str(query.get("latitude", "0")).split(",")
+        lons = str(query.get("longitude", "0")).split(",")
+        days = int(query.get("forecast_days", 7))
+        results = []
+        for lat, lon in zip(lats, lons):
+            result = {
+                "latitude": float(lat),
+                "longitude": float(lon),
+                "utc_offset_seconds": 0,
+                "current": {"temperature_2m": 60 + float(lat) % 20, "weather_code": 2},
+            }
+            if "daily" in query:
+                start = int(time.time()) // 86400 * 86400
+                result["daily"] = {
+                    "time": [start + d * 86400 for d in range(days)],
+                    "weather_code": [d % 4 for d in range(days)],
+                    "temperature_2m_max": [70.0 + d for d in range(days)],
+                    "temperature_2m_min": [50.0 + d for d in range(days)],
+                }
+            if "hourly" in query:
+                # Every hour of the days asked for, or forecast_hours from now
+                start = int(time.time()) // 86400 * 86400
+                hours = range(days * 24)
+                if "forecast_hours" in query:
+                    start = int(time.time()) // 3600 * 3600
+                    hours = range(int(query["forecast_hours"]))
+                result["hourly"] = {
+                    "time": [start + h * 3600 for h in hours],
+                    "weather_code": [h % 4 for h in hours],
+                    "temperature_2m": [55.0 + h % 24 for h in hours],
+                }
+            results.append(result)
+        self._reply(results[0] if len(results) == 1 else results)
+
+    def _archive(self, query):
+        start = date.fromisoformat(query["start_date"])
+        end = date.fromisoformat(query["end_date"])
+        if end > date.today():
+            # Like Open-Meteo, which has no data past today
+            self._reply({"error": True, "reason": "end_date out of range"}, status=400)
+            return
+        days = [start + timedelta(days=d) for d in range((end - start).days + 1)]
+        highs = [60.0 + day.toordinal() % 10 for day in days]
+        self._reply(
+            {
+                "latitude": float(query.get("latitude", 0)),
+                "longitude": float(query.get("longitude", 0)),
+                "utc_offset_seconds": 0,
+                "daily": {
+                    "time": [day.isoformat() for day in days],
+                    "temperature_2m_max": highs,
+                    "temperature_2m_min": [high - 20 for high in highs],
+                    "temperature_2m_mean": [high - 10 for high in highs],
+                    "precipitation_sum": [0.1 for _ in days],
+                    "weather_code": [3 for _ in days],
+                },
+            }
+        )
+
+    def _search(self, name):
+        key = name.strip().lower()
+        if key in UNKNOWN_PLACES:
+            # The real API leaves results out rather than returning none
+            self._reply({"generationtime_ms": 0.1})
+            return
+        lat, lon = fake_coordinates(key)
+        places = NAMESAKES.get(
+            key, [(name.strip(), "Oregon", lat, lon, 1000, "America/Los_Angeles")]
+        )
+        self._reply(
+            {
+                "results": [
+                    {
+                        "id": zlib.crc32(f"{place}/{state}".encode("utf-8")),
+                        "name": place,
+                        "latitude": lat,
+                        "longitude": lon,
+                        "feature_code": "PPL",
+                        "country_code": "US",
+                        "admin1": state,
+                        "timezone": timezone,
+                        "population": population,
+                        "country": "United States",
+                    }
+                    for place, state, lat, lon, population, timezone in places
+                ],
+                "generationtime_ms": 0.1,
+            }
+        )
+
+    def _reply(self, payload, status=200):
+        upstreams = self.server.upstreams
+        body = json.dumps(payload).encode("utf-8")
+        etag = f'"{zlib.crc32(body):08x}"'
+        if upstreams.etags and status == 200:
+            if self.headers.get("If-None-Match") == etag:
+                upstreams._count("not_modified")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+        encoding = None
+        accepted = self.headers.get("Accept-Encoding", "")
+        if "gzip" in accepted and len(body) >= GZIP_MIN_SIZE:
+            body = gzip.compress(body)
+            encoding = "gzip"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if upstreams.etags and status == 200:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+        with upstreams._lock:
+            upstreams.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeUpstreamsProcess(FakeEndpoints):
+    """FakeUpstreams served by a child process.
+
+    Benchmarks use it so the server's CPU time and GIL contention are not
+    counted against the client being measured.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        super().__init__(None)
+        self.options = [
+            f"--latency={latency}",
+            f"--jitter={jitter}",
+            f"--error-rate={error_rate}",
+        ]
+        if seed is not None:
+            self.options.append(f"--seed={seed}")
+        self._process = None
+
+    @property
+    def counts(self):
+        """Requests served so far, as FakeUpstreams.counts."""
+        with urlopen(f"{self.url}/_counts") as response:
+            return json.load(response)
+
+    def start(self):
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", *self.options],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            cwd=ROOT,
+        )
+        self.url = self._process.stdout.readline().strip()
+        if not self.url:
+            self._process.wait()
+            raise RuntimeError("fake upstreams failed to start")
+        return self
+
+    def stop(self):
+        # Closing stdin tells the server to shut down
+        self._process.stdin.close()
+        self._process.wait()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    """Serve fake upstreams, print their URL and stop when stdin closes."""
+    parser = argparse.ArgumentParser(description="Serve fake upstream APIs")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    with FakeUpstreams(args.latency, args.jitter, args.error_rate, args.seed) as fake:
+        print(fake.url, flush=True)
+        sys.stdin.read()
+
+
+if __name__ == "__main__":
+    main()
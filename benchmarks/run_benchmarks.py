@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Weather Benchmarks
+
+Drives WeatherService and the weather CLI against local fake upstreams and
+reports latency percentiles, throughput and peak memory as JSON. The fake
+upstreams and every scenario run in processes of their own, so each
+scenario's peak memory is its own and the server's CPU time does not slow
+down the client being measured.
+
+Usage:
+    python -m benchmarks.run_benchmarks --latency 0.05 --jitter 0.02
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/abc1234.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_upstreams import FakeEndpoints, FakeUpstreamsProcess  # noqa: E402
+from weather_api import WeatherService  # noqa: E402
+from weather_batch import run_batch  # noqa: E402
+from weather_cache import ResponseCache  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(
+        len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, operations=None):
+    """Summarize per-operation latencies (seconds) into a JSON-friendly dict."""
+    values = sorted(latencies)
+    operations = operations if operations is not None else len(values)
+    return {
+        "operations": operations,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "throughput_per_s": round(operations / elapsed, 2) if elapsed else None,
+        "peak_rss_kb": peak_rss_kb(resource.RUSAGE_SELF),
+    }
+
+
+def peak_rss_kb(who):
+    """High-water resident set size in KiB (ru_maxrss is bytes on macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def timed(iterations, operation):
+    """Run operation(i) iterations times, returning (latencies, elapsed)."""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+
+def lookup(service, zipcode):
+    """The work done by 'weather current --zipcode': location, then weather."""
+    location = service.resolve_location(zipcode)
+    if location is None:
+        raise RuntimeError(f"lookup failed for {zipcode}")
+    return service.get_weather_by_coordinates(location.lat, location.lon)
+
+
+def zipcode(i):
+    return "%05d" % (10000 + i)
+
+
+def bench_single_lookup(upstreams, iterations, cache_dir):
+    """A fresh, uncached service per lookup, as a cold CLI process would have."""
+
+    def operation(i):
+        with upstreams.configure(WeatherService(rate_limits={})) as service:
+            lookup(service, zipcode(i))
+
+    return summarize(*timed(iterations, operation))
+
+
+def bench_cache_miss(upstreams, iterations, cache_dir):
+    """A long-lived cached service looking up a new zip code every time."""
+    cache = ResponseCache(os.path.join(cache_dir, "miss.sqlite3"))
+    service = upstreams.configure(WeatherService(cache=cache, rate_limits={}))
+    with service:
+        result = summarize(*timed(iterations, lambda i: lookup(service, zipcode(i))))
+    cache.close()
+    return result
+
+
+def bench_cache_hit(upstreams, iterations, cache_dir):
+    """A long-lived cached service answering the same zip code repeatedly."""
+    cache = ResponseCache(os.path.join(cache_dir, "hit.sqlite3"))
+    service = upstreams.configure(WeatherService(cache=cache, rate_limits={}))
+    with service:
+        lookup(service, zipcode(0))
+        result = summarize(*timed(iterations, lambda i: lookup(service, zipcode(0))))
+    cache.close()
+    return result
+
+
+def bench_bulk(upstreams, size, cache_dir, concurrency=10):
+    """One batch run over size distinct zip codes."""
+    service = upstreams.configure(WeatherService(rate_limits={}, pool_size=concurrency))
+    latencies = []
+    started = time.perf_counter()
+    with service:
+        for record in run_batch(
+            service, [zipcode(i) for i in range(size)], concurrency=concurrency
+        ):
+            if record.error:
+                raise RuntimeError(f"batch lookup failed: {record}")
+            latencies.append(time.perf_counter() - started)
+    elapsed = time.perf_counter() - started
+    # Per-record latency is time-to-record since the batch started
+    return summarize(latencies, elapsed, operations=size)
+
+
+def bench_cli(upstreams, iterations, cache_dir):
+    """Cold 'weather current' processes, including interpreter startup."""
+    env = {**os.environ, **upstreams.env(), "WEATHER_CACHE_DIR": cache_dir}
+    command = [sys.executable, os.path.join(ROOT, "weather.py"), "current"]
+
+    def operation(i):
+        result = subprocess.run(
+            command + ["--zipcode", zipcode(i), "--no-cache"],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        if "It is currently" not in result.stdout:
+            raise RuntimeError(f"CLI lookup failed: {result.stdout}{result.stderr}")
+
+    summary = summarize(*timed(iterations, operation))
+    summary["peak_rss_kb"] = peak_rss_kb(resource.RUSAGE_CHILDREN)
+    return summary
+
+
+SCENARIOS = {
+    "single_lookup": (bench_single_lookup, "iterations"),
+    "cache_miss": (bench_cache_miss, "iterations"),
+    "cache_hit": (bench_cache_hit, "iterations"),
+    "bulk": (bench_bulk, "bulk_size"),
+    "cli": (bench_cli, "cli_iterations"),
+}
+
+
+def run_scenario(name, url, size, cache_dir):
+    """Run one scenario in a fresh interpreter and return its summary."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.run_benchmarks",
+            "--scenario",
+            name,
+            "--upstreams",
+            url,
+            "--size",
+            str(size),
+            "--cache-dir",
+            cache_dir,
+        ],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"scenario {name} failed: {result.stderr}")
+    return json.loads(result.stdout)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Run every scenario and return the report dict."""
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "iterations": args.iterations,
+            "bulk_size": args.bulk_size,
+        },
+        "scenarios": {},
+    }
+    upstreams = FakeUpstreamsProcess(args.latency, args.jitter, args.error_rate, seed=1)
+    with upstreams, tempfile.TemporaryDirectory() as cache_dir:
+        for name, (_, size) in SCENARIOS.items():
+            size = getattr(args, size)
+            if size:
+                report["scenarios"][name] = run_scenario(
+                    name, upstreams.url, size, cache_dir
+                )
+        report["upstream_requests"] = upstreams.counts
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Print p50/p95 changes against a baseline; return True on regression."""
+    regressed = False
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            before, after = previous[metric], current[metric]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(
+                f"{name:14} {metric}: {before:9.3f} -> {after:9.3f} ({change:+.1%}){flag}"
+            )
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Upstream latency (s)"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.01, help="Extra random latency (s)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of 503s"
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=50, help="Lookups per scenario"
+    )
+    parser.add_argument(
+        "--bulk-size", type=int, default=500, help="Zip codes in the batch"
+    )
+    parser.add_argument(
+        "--cli-iterations", type=int, default=5, help="Cold CLI runs (0 to skip)"
+    )
+    parser.add_argument(
+        "--output", help="JSON report path (default: results/<commit>.json)"
+    )
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed p50/p95 slowdown (0.2 = 20%%)",
+    )
+    # Used by run_scenario to run a single scenario in a child process
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--upstreams", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        bench = SCENARIOS[args.scenario][0]
+        summary = bench(FakeEndpoints(args.upstreams), args.size, args.cache_dir)
+        print(json.dumps(summary))
+        return 0
+
+    report = run(args)
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"{report['commit'] or 'latest'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["scenarios"], indent=2))
+    print(f"Report written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -31,9 +31,25 @@ setup(
     author="Assaf Stone",
     author_email="devopsjester@github.com",
     url="https://github.com/devopsjester/ubiquitous-octo-spork",
-    packages=find_packages(exclude=["tests*"]),
-    py_modules=["weather", "weather_api"],
+    packages=find_packages(exclude=["tests*", "benchmarks*"]),
+    py_modules=[
+        "weather",
+        "weather_api",
+        "weather_batch",
+        "weather_cache",
+        "weather_daemon",
+        "weather_gazetteer",
+        "weather_history",
+        "weather_json",
+        "weather_metrics",
+        "weather_output",
+        "weather_places",
+        "weather_ratelimit",
+        "weather_watch",
+    ],
     install_requires=main_requirements,
+    # Faster decoding and smaller transfers of upstream JSON, used when installed
+    extras_require={"fast": ["brotli>=1.0", "msgspec>=0.18", "orjson>=3.9"]},
     entry_points={
         "console_scripts": [
             "weather=weather:weather",
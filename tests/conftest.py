@@ -0,0 +1,13 @@
+"""
+Shared fixtures for the Weather CLI test suite.
+"""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep every test's cache and local data files inside a temporary directory."""
+    cache_dir = tmp_path / "weather-cache"
+    monkeypatch.setenv("WEATHER_CACHE_DIR", str(cache_dir))
+    return cache_dir
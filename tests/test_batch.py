@@ -0,0 +1,173 @@
+"""
+Tests for batch zip code lookups via 'current --zipcode-file'.
+
+These tests verify ordering, deduplication and the batch output formats.
+"""
+
+import json
+import time
+
+import pytest
+from click.testing import CliRunner
+from weather import weather
+from weather_api import Location, UpstreamError, WeatherService
+from weather_batch import read_zipcodes, run_batch
+
+LOCATIONS = {
+    "94105": Location("San Francisco", "CA", 37.79, -122.39),
+    "98101": Location("Seattle", "WA", 47.61, -122.33),
+    "10001": Location("New York", "NY", 40.75, -73.99),
+}
+
+
+@pytest.fixture
+def runner():
+    """Fixture providing a Click CLI test runner."""
+    return CliRunner()
+
+
+@pytest.fixture
+def mock_lookups(mocker):
+    """Fixture mocking location and weather lookups for the known zip codes."""
+
+    def resolve(self, zipcode=None):
+        # Make the first zip code slowest so completion order differs
+        if zipcode == "94105":
+            time.sleep(0.1)
+        return LOCATIONS.get(zipcode)
+
+    location = mocker.patch.object(
+        WeatherService, "resolve_location", autospec=True, side_effect=resolve
+    )
+    weather_lookup = mocker.patch.object(
+        WeatherService,
+        "get_weather_for_coordinates",
+        autospec=True,
+        side_effect=lambda self, points, chunk_size: [(70, "clear sky")] * len(points),
+    )
+    return location, weather_lookup
+
+
+def test_read_zipcodes_skips_blanks_and_comments():
+    """Test that blank lines and comments are ignored."""
+    lines = ["94105\n", "\n", "# stores\n", "  98101  \n"]
+    assert list(read_zipcodes(lines)) == ["94105", "98101"]
+
+
+def test_run_batch_input_order(mock_lookups):
+    """Test that ordered batches yield records in input order."""
+    zipcodes = ["94105", "98101", "00000"]
+    records = list(run_batch(WeatherService(), zipcodes))
+    assert [r.zipcode for r in records] == zipcodes
+    assert records[0].city == "San Francisco"
+    assert records[0].temperature == 70
+    assert records[2].error == "location not found"
+
+
+def test_run_batch_completion_order(mock_lookups):
+    """Test that unordered batches yield fast lookups first."""
+    zipcodes = ["94105", "98101"]
+    records = list(run_batch(WeatherService(), zipcodes, ordered=False, chunk_size=1))
+    assert [r.zipcode for r in records] == ["98101", "94105"]
+
+
+def test_run_batch_deduplicates(mock_lookups):
+    """Test that repeated zip codes are fetched once but reported per line."""
+    location, weather_lookup = mock_lookups
+    records = list(run_batch(WeatherService(), ["10001", "10001", "98101", "10001"]))
+    assert [r.zipcode for r in records] == ["10001", "10001", "98101", "10001"]
+    assert location.call_count == 2
+    weather_lookup.assert_called_once()
+    assert len(weather_lookup.call_args.args[1]) == 2
+
+
+def test_run_batch_chunks_weather_requests(mock_lookups):
+    """Test that located zip codes share multi-location weather requests."""
+    _, weather_lookup = mock_lookups
+    records = list(run_batch(WeatherService(), list(LOCATIONS), chunk_size=2))
+    assert all(r.temperature == 70 for r in records)
+    assert sorted(len(c.args[1]) for c in weather_lookup.call_args_list) == [1, 2]
+
+
+def test_run_batch_reports_point_errors(mocker):
+    """Test that a per-point weather failure is reported on that record only."""
+    mocker.patch.object(
+        WeatherService, "resolve_location", side_effect=lambda z: LOCATIONS[z]
+    )
+    mocker.patch.object(
+        WeatherService,
+        "get_weather_for_coordinates",
+        return_value=[(70, "clear sky"), UpstreamError("no data")],
+    )
+    records = list(run_batch(WeatherService(), ["94105", "98101"], chunk_size=2))
+    errors = {r.zipcode: r.error for r in records}
+    assert sorted(errors.values(), key=str) == [None, "no data"]
+
+
+def test_run_batch_reports_exceptions(mocker):
+    """Test that a failing lookup becomes an error record."""
+    mocker.patch.object(
+        WeatherService, "resolve_location", side_effect=Exception("boom")
+    )
+    records = list(run_batch(WeatherService(), ["94105"]))
+    assert records[0].error == "boom"
+
+
+def test_cli_batch_jsonl_from_stdin(runner, mock_lookups):
+    """Test that zip codes are read from stdin and written as JSON lines."""
+    result = runner.invoke(
+        weather,
+        ["current", "--zipcode-file", "-", "--format", "jsonl"],
+        input="94105\n98101\n",
+    )
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [r["city"] for r in records] == ["San Francisco", "Seattle"]
+
+
+def test_cli_batch_csv(runner, mock_lookups, tmp_path):
+    """Test CSV batch output from a zip code file."""
+    path = tmp_path / "zipcodes.txt"
+    path.write_text("10001\n00000\n")
+    result = runner.invoke(
+        weather, ["current", "--zipcode-file", str(path), "--format", "csv"]
+    )
+    lines = result.output.splitlines()
+    assert lines[0] == "zipcode,city,state,lat,lon,temperature,condition,error"
+    assert lines[1] == "10001,New York,NY,40.75,-73.99,70,clear sky,"
+    assert lines[2] == "00000,,,,,,,location not found"
+
+
+def test_cli_batch_text(runner, mock_lookups):
+    """Test the default sentence output for batch lookups."""
+    result = runner.invoke(
+        weather, ["current", "--zipcode-file", "-"], input="98101\n00000\n"
+    )
+    assert result.output.splitlines() == [
+        "It is currently 70ºF, and clear sky in Seattle, WA.",
+        "Could not get weather information for zipcode 00000.",
+    ]
+
+
+def test_cli_batch_rejects_zipcode(runner):
+    """Test that --zipcode and --zipcode-file cannot be combined."""
+    result = runner.invoke(
+        weather, ["current", "--zipcode", "94105", "--zipcode-file", "-"], input=""
+    )
+    assert result.exit_code != 0
+    assert "mutually exclusive" in result.output
+
+
+def test_cli_batch_json_streams_one_array(runner, mock_lookups):
+    """Test that --format json writes a single array, one record per line."""
+    result = runner.invoke(
+        weather,
+        ["current", "--zipcode-file", "-", "--format", "json"],
+        input="94105\n00000\n",
+    )
+    lines = result.output.splitlines()
+    assert lines[0].startswith('[{"zipcode":"94105"')
+    assert lines[1].startswith(',{"zipcode":"00000"')
+    assert lines[2] == "]"
+    records = json.loads(result.output)
+    assert [r["error"] for r in records] == [None, "location not found"]
@@ -0,0 +1,173 @@
+"""
+Tests for the persistent response cache and its use by WeatherService.
+
+These tests verify TTL expiry, LRU eviction and the CLI cache escape hatches.
+"""
+
+import json
+
+import pytest
+from click.testing import CliRunner
+from weather import weather
+from weather_api import WeatherService
+from weather_cache import ResponseCache, geohash, geohash_bounds
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Fixture providing a cache backed by a temporary database file."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def zipcode_response(mocker):
+    """Fixture mocking requests.get with a zippopotam.us payload."""
+    response = mocker.Mock(status_code=200)
+    response.content = json.dumps(
+        {
+            "post code": "94105",
+            "places": [
+                {
+                    "place name": "San Francisco",
+                    "state abbreviation": "CA",
+                    "latitude": "37.7864",
+                    "longitude": "-122.3892",
+                }
+            ],
+        }
+    ).encode()
+    return mocker.patch("requests.Session.get", return_value=response)
+
+
+def test_cache_roundtrip(cache):
+    """Test that stored values are returned unchanged."""
+    cache.set("key", {"a": [1, 2]})
+    assert cache.get("key") == {"a": [1, 2]}
+    assert cache.get("missing") is None
+
+
+def test_cache_shared_between_instances(cache):
+    """Test that a second cache on the same file sees earlier writes."""
+    cache.set("key", "value")
+    other = ResponseCache(cache.path)
+    assert other.get("key") == "value"
+    other.close()
+
+
+def test_cache_ttl_expiry(cache, mocker):
+    """Test that entries expire after their TTL."""
+    clock = mocker.patch("weather_cache.time.time", return_value=1000.0)
+    cache.set("short", 1, ttl=60)
+    cache.set("forever", 2)
+
+    clock.return_value = 1059.0
+    assert cache.get("short") == 1
+
+    clock.return_value = 1061.0
+    assert cache.get("short") is None
+    assert cache.get("forever") == 2
+
+
+def test_cache_lru_eviction(cache, mocker):
+    """Test that the least recently used entry is evicted when full."""
+    clock = mocker.patch("weather_cache.time.time", return_value=1.0)
+    for i, key in enumerate(["a", "b", "c"]):
+        clock.return_value = float(i)
+        cache.set(key, key)
+
+    clock.return_value = 10.0
+    cache.get("a")
+    clock.return_value = 11.0
+    cache.set("d", "d")
+
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+
+
+def test_geohash():
+    """Test geohash encoding against known cells and their bounds."""
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash(37.7864, -122.3892, 5) == "9q8yy"
+    south, west, north, east = geohash_bounds("ezs42")
+    assert south < 42.605 < north and west < -5.603 < east
+    assert geohash((south + north) / 2, (west + east) / 2, 5) == "ezs42"
+
+
+def test_find_in_box(cache, mocker):
+    """Test that entries with bounds are found by overlap, prefix and expiry."""
+    clock = mocker.patch("weather_cache.time.time", return_value=1000.0)
+    cache.set("cell=a", "a", ttl=60, bounds=(10, 10, 11, 11))
+    cache.set("cell=b", "b", ttl=600, bounds=(20, 20, 21, 21))
+    cache.set("other=c", "c", bounds=(10.5, 10.5, 10.6, 10.6))
+    assert cache.find_in_box(10.9, 10.9, 12, 12, prefix="cell=") == {"cell=a": "a"}
+    assert cache.find_in_box(0, 0, 30, 30) == {
+        "cell=a": "a",
+        "cell=b": "b",
+        "other=c": "c",
+    }
+
+    clock.return_value = 1100.0
+    assert cache.find_in_box(0, 0, 30, 30, prefix="cell=") == {"cell=b": "b"}
+
+
+def test_find_in_box_forgets_evicted_entries(cache):
+    """Test that evicting an entry also drops it from the box index."""
+    cache.set("a", "a", bounds=(0, 0, 1, 1))
+    cache.delete("a")
+    assert cache.find_in_box(0, 0, 1, 1) == {}
+    cache.set("b", "b", bounds=(0, 0, 1, 1))
+    cache.clear()
+    assert cache.find_in_box(0, 0, 1, 1) == {}
+
+
+def test_validated_responses(cache):
+    """Test storing responses with validators and their LRU bound."""
+    assert cache.get_validated("a") is None
+    cache.set_validated("a", {"v": 1}, etag='"x"')
+    cache.set_validated("b", [2], last_modified="Tue, 01 Oct 2024 00:00:00 GMT")
+    assert cache.get_validated("a") == ({"v": 1}, '"x"', None)
+    assert cache.get_validated("b")[2] == "Tue, 01 Oct 2024 00:00:00 GMT"
+    assert len(cache) == 0  # kept apart from expiring entries
+
+    for key in "cde":
+        cache.set_validated(key, key, etag=key)
+    assert cache.get_validated("a") is None
+    assert cache.get_validated("e") == ("e", "e", None)
+    cache.clear()
+    assert cache.get_validated("e") is None
+
+
+def test_service_uses_cache(cache, zipcode_response):
+    """Test that a second zipcode lookup is served from the cache."""
+    service = WeatherService(cache=cache)
+    assert service.get_location_by_zipcode("94105") == ("San Francisco", "CA")
+    assert service.get_coordinates_by_zipcode("94105") == (37.7864, -122.3892)
+    assert zipcode_response.call_count == 1
+
+
+def test_service_refresh_bypasses_cache(cache, zipcode_response):
+    """Test that refresh refetches even when a cached entry exists."""
+    WeatherService(cache=cache).get_location_by_zipcode("94105")
+    WeatherService(cache=cache, refresh=True).get_location_by_zipcode("94105")
+    assert zipcode_response.call_count == 2
+
+
+def test_cli_no_cache(zipcode_response, isolated_cache_dir):
+    """Test that --no-cache leaves no cache file behind."""
+    runner = CliRunner()
+    result = runner.invoke(weather, ["where-is", "--zipcode", "94105", "--no-cache"])
+    assert result.exit_code == 0
+    assert "94105 is in San Francisco, CA" in result.output
+    assert not (isolated_cache_dir / "cache.sqlite3").exists()
+
+
+def test_cli_cache_shared_between_invocations(zipcode_response):
+    """Test that separate CLI invocations share the on-disk cache."""
+    runner = CliRunner()
+    runner.invoke(weather, ["where-is", "--zipcode", "94105"])
+    result = runner.invoke(weather, ["where-is", "--zipcode", "94105"])
+    assert "94105 is in San Francisco, CA" in result.output
+    assert zipcode_response.call_count == 1
@@ -4,10 +4,15 @@ Tests for the 'current' command of the Weather CLI application.
 These tests verify the functionality of the current weather features.
 """
 
+import json
+
 import pytest
 from click.testing import CliRunner
 from weather import weather
-from weather_api import WeatherService
+from weather_api import Location, WeatherService
+
+SAN_FRANCISCO = Location("San Francisco", "CA", 37.7864, -122.3892)
+SEATTLE = Location("Seattle", "WA", 47.6062, -122.3321, "America/Los_Angeles")
 
 
 @pytest.fixture
@@ -18,59 +23,57 @@ def runner():
 
 def test_current_with_valid_zipcode(runner, mocker):
     """Test current command with a valid zipcode."""
-    # Mock both the weather and location service methods
-    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_zipcode")
-    mock_location = mocker.patch.object(WeatherService, "get_location_by_zipcode")
+    # Mock both the location and weather service methods
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_coordinates")
 
+    mock_location.return_value = SAN_FRANCISCO
     mock_weather.return_value = (72, "sunny")
-    mock_location.return_value = ("San Francisco", "CA")
 
     result = runner.invoke(weather, ["current", "--zipcode", "94105"])
     assert result.exit_code == 0
     assert "It is currently 72ºF, and sunny in San Francisco, CA" in result.output
-    mock_weather.assert_called_once_with("94105")
     mock_location.assert_called_once_with("94105")
+    mock_weather.assert_called_once_with(37.7864, -122.3892)
 
 
 def test_current_without_zipcode(runner, mocker):
     """Test current command without zipcode (current location)."""
-    # Mock both the weather and location service methods
-    mock_weather = mocker.patch.object(WeatherService, "get_current_weather")
-    mock_location = mocker.patch.object(WeatherService, "get_current_location")
+    # Mock both the location and weather service methods
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_coordinates")
 
+    mock_location.return_value = SEATTLE
     mock_weather.return_value = (65, "cloudy")
-    mock_location.return_value = ("Seattle", "WA")
 
     result = runner.invoke(weather, ["current"])
     assert result.exit_code == 0
     assert "It is currently 65ºF, and cloudy in Seattle, WA" in result.output
-    mock_weather.assert_called_once()
-    mock_location.assert_called_once()
+    mock_location.assert_called_once_with(None)
+    mock_weather.assert_called_once_with(47.6062, -122.3321)
 
 
 def test_current_with_invalid_zipcode(runner, mocker):
     """Test current command with an invalid zipcode."""
-    # Mock both service methods to return None for invalid zipcode
-    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_zipcode")
-    mock_location = mocker.patch.object(WeatherService, "get_location_by_zipcode")
+    # An unknown zipcode resolves to no location, so weather is never fetched
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_coordinates")
 
-    mock_weather.return_value = None
     mock_location.return_value = None
 
     result = runner.invoke(weather, ["current", "--zipcode", "00000"])
     assert result.exit_code == 0
     assert "Could not get weather information for zipcode 00000" in result.output
-    mock_weather.assert_called_once_with("00000")
     mock_location.assert_called_once_with("00000")
+    mock_weather.assert_not_called()
 
 
 def test_current_location_failure(runner, mocker):
     """Test current command when current location cannot be determined."""
-    # Mock both service methods to simulate location failure
-    mock_weather = mocker.patch.object(WeatherService, "get_current_weather")
-    mock_location = mocker.patch.object(WeatherService, "get_current_location")
+    # Mock the location lookup to simulate failure
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_coordinates")
 
-    mock_weather.return_value = None
     mock_location.return_value = None
 
     result = runner.invoke(weather, ["current"])
@@ -78,35 +81,113 @@ def test_current_location_failure(runner, mocker):
     assert (
         "Could not get weather information for your current location" in result.output
     )
-    mock_weather.assert_called_once()
     mock_location.assert_called_once()
+    mock_weather.assert_not_called()
+
+
+def test_current_weather_failure(runner, mocker):
+    """Test current command when the location resolves but weather does not."""
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_coordinates")
+
+    mock_location.return_value = SAN_FRANCISCO
+    mock_weather.return_value = None
+
+    result = runner.invoke(weather, ["current", "--zipcode", "94105"])
+    assert result.exit_code == 0
+    assert "Could not get weather information for zipcode 94105" in result.output
 
 
 def test_current_weather_api_error(runner, mocker):
     """Test current command when weather API throws an error."""
     # Mock the weather service to raise an exception
-    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_zipcode")
-    mock_location = mocker.patch.object(WeatherService, "get_location_by_zipcode")
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_coordinates")
 
+    mock_location.return_value = SAN_FRANCISCO
     mock_weather.side_effect = Exception("Weather API Error")
-    mock_location.return_value = ("San Francisco", "CA")
 
     result = runner.invoke(weather, ["current", "--zipcode", "94105"])
     assert result.exit_code == 0  # CLI handles errors gracefully
     assert "Error: Weather API Error" in result.output
-    mock_weather.assert_called_once_with("94105")
+    mock_weather.assert_called_once_with(37.7864, -122.3892)
 
 
 def test_current_location_api_error(runner, mocker):
     """Test current command when location API throws an error."""
     # Mock the location service to raise an exception
-    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_zipcode")
-    mock_location = mocker.patch.object(WeatherService, "get_location_by_zipcode")
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_weather = mocker.patch.object(WeatherService, "get_weather_by_coordinates")
 
-    mock_weather.return_value = (72, "sunny")
     mock_location.side_effect = Exception("Location API Error")
 
     result = runner.invoke(weather, ["current", "--zipcode", "94105"])
     assert result.exit_code == 0  # CLI handles errors gracefully
     assert "Error: Location API Error" in result.output
     mock_location.assert_called_once_with("94105")
+    mock_weather.assert_not_called()
+
+
+def test_current_fetches_zipcode_once(runner, mocker):
+    """Test that current resolves the zipcode with a single upstream request."""
+    zipcode_response = mocker.Mock(status_code=200)
+    zipcode_response.content = json.dumps(
+        {
+            "places": [
+                {
+                    "place name": "San Francisco",
+                    "state abbreviation": "CA",
+                    "latitude": "37.7864",
+                    "longitude": "-122.3892",
+                }
+            ]
+        }
+    ).encode()
+    weather_response = mocker.Mock(status_code=200)
+    weather_response.content = json.dumps(
+        {"current": {"temperature_2m": 61.4, "weather_code": 3}}
+    ).encode()
+    mock_get = mocker.patch(
+        "requests.Session.get",
+        side_effect=[zipcode_response, weather_response],
+    )
+
+    result = runner.invoke(weather, ["current", "--zipcode", "94105", "--no-cache"])
+    assert "It is currently 61ºF, and overcast in San Francisco, CA" in result.output
+    assert mock_get.call_count == 2
+
+
+def test_current_jsonl(runner, mocker):
+    """Test that --format jsonl prints one typed record per lookup."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=SEATTLE)
+    mocker.patch.object(
+        WeatherService, "get_weather_by_coordinates", return_value=(65, "cloudy")
+    )
+
+    result = runner.invoke(weather, ["current", "--format", "jsonl"])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == {
+        "zipcode": None,
+        "city": "Seattle",
+        "state": "WA",
+        "lat": 47.6062,
+        "lon": -122.3321,
+        "temperature": 65,
+        "condition": "cloudy",
+        "error": None,
+    }
+
+
+def test_current_json_reports_errors(runner, mocker):
+    """Test that structured output carries errors instead of printing them."""
+    mocker.patch.object(
+        WeatherService, "resolve_location", side_effect=Exception("Location API Error")
+    )
+
+    result = runner.invoke(
+        weather, ["current", "--zipcode", "94105", "--format", "json"]
+    )
+    assert result.exit_code == 0
+    [record] = json.loads(result.output)
+    assert record["zipcode"] == "94105"
+    assert record["error"] == "Location API Error"
@@ -0,0 +1,249 @@
+"""
+Tests for the local weather daemon and its client.
+
+These tests verify request coalescing and transparent use by the CLI.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from urllib.request import urlopen
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from click.testing import CliRunner
+from weather import weather
+from weather_api import Location, WeatherService
+from weather_daemon import DaemonClient, SingleFlight, WeatherDaemon, default_state_path
+from weather_gazetteer import Gazetteer, build_gazetteer
+from weather_places import PlaceIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEATTLE = Location("Seattle", "WA", 47.61, -122.33, "America/Los_Angeles")
+
+
+@pytest.fixture
+def daemon():
+    """Fixture running a daemon with a plain WeatherService in a thread."""
+    daemon = WeatherDaemon(WeatherService(cache=None))
+    thread = threading.Thread(
+        target=daemon.serve_forever, args=(default_state_path(),), daemon=True
+    )
+    thread.start()
+    state_path = default_state_path()
+    while not os.path.exists(state_path):
+        time.sleep(0.01)
+    yield daemon
+    daemon.shutdown()
+    thread.join()
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    """Test that concurrent calls with one key run the function once."""
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flights.do("key", slow)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flights.do("key", lambda: "again") == "again"
+
+
+def test_single_flight_shares_errors():
+    """Test that the leader's exception is raised to every caller."""
+    flights = SingleFlight()
+    with pytest.raises(ValueError):
+        flights.do("key", lambda: (_ for _ in ()).throw(ValueError("bad")))
+
+
+def test_client_round_trip(daemon, mocker):
+    """Test that the client returns the daemon service's results."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=SEATTLE)
+    mocker.patch.object(
+        WeatherService, "get_weather_by_coordinates", return_value=(52, "fog")
+    )
+    mocker.patch.object(
+        WeatherService,
+        "get_weather_for_coordinates",
+        return_value=[(52, "fog"), Exception("no data")],
+    )
+    client = DaemonClient.discover()
+    assert client.resolve_location("98101") == SEATTLE
+    assert client.get_location_by_zipcode("98101") == ("Seattle", "WA")
+    assert client.get_weather_by_coordinates(47.61, -122.33) == (52, "fog")
+    results = client.get_weather_for_coordinates([(1, 2), (3, 4)])
+    assert results[0] == (52, "fog")
+    assert str(results[1]) == "no data"
+    client.close()
+
+
+def test_daemon_coalesces_identical_requests(daemon, mocker):
+    """Test that concurrent identical lookups reach the upstream once."""
+
+    def slow_resolve(self, zipcode=None, city=None, coordinates=None):
+        time.sleep(0.2)
+        return SEATTLE
+
+    resolve = mocker.patch.object(
+        WeatherService, "resolve_location", autospec=True, side_effect=slow_resolve
+    )
+    client = DaemonClient.discover()
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(client.resolve_location("98101"))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [SEATTLE] * 4
+    assert resolve.call_count == 1
+    client.close()
+
+
+def test_discover_without_daemon():
+    """Test that discovery fails cleanly when no daemon is running."""
+    assert DaemonClient.discover() is None
+
+
+def test_stale_state_file_falls_back(tmp_path, mocker):
+    """Test that lookups go direct, and the state file is removed, without a daemon."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=SEATTLE)
+    path = tmp_path / "daemon.json"
+    path.write_text('{"url": "http://127.0.0.1:9", "pid": 1}')
+    client = DaemonClient.discover(str(path))
+    assert client.resolve_location("98101") == SEATTLE
+    assert not path.exists()
+    request = mocker.spy(client, "_request")
+    assert client.resolve_location("98101") == SEATTLE
+    assert request.spy_exception is not None
+    client.close()
+
+
+def test_serve_removes_state_file_on_sigterm(isolated_cache_dir):
+    """Test that a daemon stopped with SIGTERM cleans up after itself."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "weather.py"), "serve"],
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=ROOT,
+    )
+    try:
+        assert process.stdout.readline().startswith("Serving weather lookups on")
+        deadline = time.monotonic() + 10
+        while not os.path.exists(default_state_path()):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=10) == 0
+    finally:
+        process.kill()
+    assert not os.path.exists(default_state_path())
+
+
+def test_cli_uses_running_daemon(daemon, mocker):
+    """Test that CLI commands are transparently served by the daemon."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=SEATTLE)
+    mocker.patch.object(
+        WeatherService, "get_weather_by_coordinates", return_value=(52, "fog")
+    )
+    client_resolve = mocker.spy(DaemonClient, "resolve_location")
+
+    result = CliRunner().invoke(weather, ["current", "--zipcode", "98101"])
+    assert "It is currently 52ºF, and fog in Seattle, WA." in result.output
+    client_resolve.assert_called_once()
+
+
+def test_cli_refresh_bypasses_daemon(daemon, mocker):
+    """Test that --refresh talks to the upstreams directly."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=SEATTLE)
+    mocker.patch.object(
+        WeatherService, "get_weather_by_coordinates", return_value=(52, "fog")
+    )
+    client_resolve = mocker.spy(DaemonClient, "resolve_location")
+
+    result = CliRunner().invoke(weather, ["current", "--zipcode", "98101", "--refresh"])
+    assert "52ºF" in result.output
+    client_resolve.assert_not_called()
+
+
+def test_cli_forecast_cached_while_daemon_runs(daemon, monkeypatch):
+    """Test that forecasts are fetched once and cached with a daemon running."""
+    with FakeUpstreams() as upstreams:
+        for name, value in upstreams.env().items():
+            monkeypatch.setenv(name, value)
+        runner = CliRunner()
+        args = ["forecast", "--zipcode", "97201", "--days", "2"]
+        first = runner.invoke(weather, args)
+        second = runner.invoke(weather, args)
+        assert first.exit_code == 0
+        assert first.output == second.output
+        assert "Forecast for Town 97201" in first.output
+        assert upstreams.counts["weather"] == 1
+
+
+def test_cli_city_and_coords_served_by_daemon(tmp_path, monkeypatch, mocker):
+    """Test that city and coordinate lookups go to the daemon's service."""
+    csv_path = tmp_path / "zipcodes.csv"
+    csv_path.write_text("zip,city,state,lat,lon\n97201,Portland,OR,45.5,-122.69\n")
+    build_gazetteer(str(csv_path), str(tmp_path / "gazetteer.bin"))
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(
+            WeatherService(
+                rate_limits={},
+                gazetteer=Gazetteer(str(tmp_path / "gazetteer.bin")),
+                places=PlaceIndex(str(tmp_path / "places.sqlite3")),
+            )
+        )
+        daemon = WeatherDaemon(service)
+        thread = threading.Thread(
+            target=daemon.serve_forever, args=(default_state_path(),), daemon=True
+        )
+        thread.start()
+        while not os.path.exists(default_state_path()):
+            time.sleep(0.01)
+        # The CLI's own service would ask a dead upstream and find no gazetteer
+        monkeypatch.setenv("WEATHER_GEOCODING_URL", "http://127.0.0.1:9/v1/search")
+        forwarded = mocker.spy(WeatherDaemon, "location")
+        try:
+            runner = CliRunner()
+            result = runner.invoke(weather, ["where-is", "--coords", "45.52,-122.68"])
+            assert result.output == "45.52,-122.68 is near Portland, OR.\n"
+            for _ in range(2):
+                result = runner.invoke(weather, ["where-is", "--city", "Portland, ME"])
+                assert result.output == "Portland, ME is at 43.6615,-70.2553.\n"
+            assert upstreams.counts["geocoding"] == 1
+            assert forwarded.call_count == 3
+        finally:
+            daemon.shutdown()
+            thread.join()
+            service.close()
+
+
+def test_daemon_exports_metrics(daemon):
+    """Test that the daemon serves its service metrics in Prometheus format."""
+    daemon.service.metrics.increment("cache_hits", upstream="api.zippopotam.us")
+    with urlopen(f"{daemon.url}/metrics") as response:
+        assert response.headers["Content-Type"].startswith("text/plain")
+        text = response.read().decode("utf-8")
+    assert 'weather_cache_hits_total{upstream="api.zippopotam.us"} 1' in text
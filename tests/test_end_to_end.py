@@ -0,0 +1,129 @@
+"""
+End-to-end tests against the local fake upstream APIs.
+
+These tests exercise the real HTTP request path, without mocking WeatherService.
+"""
+
+import json
+
+import pytest
+from benchmarks import run_benchmarks
+from benchmarks.fake_upstreams import FakeUpstreams, fake_coordinates
+from click.testing import CliRunner
+from weather import weather
+from weather_api import WeatherService
+from weather_cache import ResponseCache
+
+
+@pytest.fixture
+def upstreams():
+    """Fixture running fake upstreams for the duration of a test."""
+    with FakeUpstreams() as upstreams:
+        yield upstreams
+
+
+@pytest.fixture
+def service(upstreams):
+    """Fixture providing a WeatherService pointed at the fake upstreams."""
+    with upstreams.configure(WeatherService(rate_limits={})) as service:
+        yield service
+
+
+def test_current_lookup(service, upstreams):
+    """Test a zipcode lookup and its weather over real HTTP."""
+    location = service.resolve_location("97201")
+    assert location.city == "Town 97201"
+    assert (location.lat, location.lon) == fake_coordinates("97201")
+    temperature, condition = service.get_weather_by_coordinates(
+        location.lat, location.lon
+    )
+    assert condition == "partly cloudy"
+    assert upstreams.counts["zipcode"] == 1
+    assert upstreams.counts["weather"] == 1
+
+
+def test_unknown_zipcode(service):
+    """Test that a 404 from zippopotam.us resolves to None."""
+    assert service.resolve_location("00000") is None
+
+
+def test_multi_location_weather(service, upstreams):
+    """Test that a multi-location request is split back per point."""
+    results = service.get_weather_for_coordinates([(40.1, -75), (41.5, -76), (42, -77)])
+    assert [condition for _, condition in results] == ["partly cloudy"] * 3
+    assert upstreams.counts["weather"] == 1
+
+
+def test_conditional_requests(tmp_path):
+    """Test that unchanged responses are revalidated with a 304."""
+    with FakeUpstreams(etags=True) as upstreams:
+        cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+        service = upstreams.configure(WeatherService(cache=cache, rate_limits={}))
+        first = service.get_forecast(45.5, -122.6, days=3)
+        sent = upstreams.bytes_sent
+        cache.delete(service._forecast_key(45.5, -122.6))
+
+        again = service.get_forecast(45.5, -122.6, days=3)
+        assert list(again.daily_max) == list(first.daily_max)
+        assert upstreams.counts["weather"] == 2
+        assert upstreams.counts["not_modified"] == 1
+        assert upstreams.bytes_sent == sent
+        assert service.metrics.counter(
+            "upstream_responses", upstream="127.0.0.1", status="304"
+        )
+        service.close()
+
+
+def test_responses_are_compressed(service, upstreams):
+    """Test that large bodies come gzipped and are counted as received."""
+    forecast = service.get_forecast(45.5, -122.6, days=16)
+    assert len(forecast.hourly_time) == 16 * 24
+    received = service.metrics.counter("upstream_bytes", upstream="127.0.0.1")
+    assert 0 < received == upstreams.bytes_sent
+    session = service._session_for(service.weather_base_url)
+    assert "gzip" in session.headers["Accept-Encoding"]
+
+
+def test_retries_recover_from_server_errors():
+    """Test that 503s are retried until the upstream answers."""
+    with FakeUpstreams(error_rate=0.5, seed=3) as upstreams:
+        service = WeatherService(retries=10, backoff_factor=0, rate_limits={})
+        upstreams.configure(service)
+        for zipcode in ("10001", "10002", "10003", "10004"):
+            assert service.resolve_location(zipcode) is not None
+        service.close()
+    assert upstreams.counts["errors"] > 0
+
+
+def test_cli_against_fake_upstreams(upstreams, monkeypatch):
+    """Test the current command end to end using environment overrides."""
+    for name, value in upstreams.env().items():
+        monkeypatch.setenv(name, value)
+    result = CliRunner().invoke(weather, ["current"])
+    assert "and partly cloudy in Portland, Oregon." in result.output
+    assert upstreams.counts["ip"] == 1
+
+
+def test_benchmark_report(tmp_path):
+    """Test that the benchmark harness writes a complete JSON report."""
+    output = tmp_path / "report.json"
+    args = ["--latency", "0", "--jitter", "0", "--iterations", "3"]
+    args += ["--bulk-size", "20", "--cli-iterations", "1", "--output", str(output)]
+    assert run_benchmarks.main(args) == 0
+
+    report = json.loads(output.read_text())
+    assert set(report["scenarios"]) == {
+        "single_lookup",
+        "cache_miss",
+        "cache_hit",
+        "bulk",
+        "cli",
+    }
+    for summary in report["scenarios"].values():
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+        assert summary["throughput_per_s"] > 0
+        assert summary["peak_rss_kb"] > 0
+    assert (
+        run_benchmarks.main(args + ["--compare", str(output), "--threshold", "100"])
+        == 0
+    )
@@ -0,0 +1,185 @@
+"""
+Tests for the 'forecast' command and WeatherService.get_forecast.
+
+These tests verify the columnar forecast and current conditions served from it.
+"""
+
+import json
+import math
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from click.testing import CliRunner
+from weather import weather
+from weather_api import CURRENT_FORECAST_HOURS, Forecast, Location, WeatherService
+from weather_cache import ResponseCache
+
+# 2024-06-01 00:00 in UTC-7, i.e. 07:00 UTC
+MIDNIGHT = 1717225200
+OFFSET = -7 * 3600
+
+
+def make_payload(days=2):
+    """Build an Open-Meteo unixtime forecast payload."""
+    hours = days * 24
+    return {
+        "utc_offset_seconds": OFFSET,
+        "daily": {
+            "time": [MIDNIGHT + d * 86400 for d in range(days)],
+            "weather_code": [3, None][:days] + [0] * (days - 2),
+            "temperature_2m_max": [71.6, 68.2][:days] + [60.0] * (days - 2),
+            "temperature_2m_min": [55.1, None][:days] + [50.0] * (days - 2),
+        },
+        "hourly": {
+            "time": [MIDNIGHT + h * 3600 for h in range(hours)],
+            "weather_code": [h % 4 for h in range(hours)],
+            "temperature_2m": [50.0 + h for h in range(hours)],
+        },
+    }
+
+
+@pytest.fixture
+def mock_get(mocker):
+    """Fixture patching HTTP GETs to return a two-day forecast."""
+    response = mocker.Mock(status_code=200)
+    response.content = json.dumps(make_payload()).encode()
+    return mocker.patch("requests.Session.get", return_value=response)
+
+
+def test_forecast_columns():
+    """Test that series are packed into typed parallel arrays."""
+    forecast = Forecast(make_payload())
+    assert len(forecast) == 2
+    assert forecast.daily_time.typecode == "q"
+    assert list(forecast.daily_max) == [71.6, 68.2]
+    assert math.isnan(forecast.daily_min[1])
+    assert list(forecast.daily_code) == [3, -1]
+    assert len(forecast.hourly_temperature) == 48
+
+
+def test_forecast_truncates_to_days():
+    """Test that a longer payload can be viewed as a shorter forecast."""
+    forecast = Forecast(make_payload(3), days=1)
+    assert len(forecast) == 1
+    assert len(forecast.hourly_time) == 24
+
+
+def test_forecast_hour_index():
+    """Test locating the hourly slot containing a timestamp."""
+    forecast = Forecast(make_payload())
+    assert forecast.hour_index(MIDNIGHT) == 0
+    assert forecast.hour_index(MIDNIGHT + 5 * 3600 + 59) == 5
+    assert forecast.hour_index(MIDNIGHT - 1) is None
+    assert forecast.hour_index(MIDNIGHT + 48 * 3600) is None
+
+
+def test_get_forecast_single_request(mock_get):
+    """Test that daily and hourly series are fetched in one request."""
+    forecast = WeatherService().get_forecast(45.5, -122.6, days=2)
+    assert len(forecast) == 2
+    mock_get.assert_called_once()
+    params = mock_get.call_args.kwargs["params"]
+    assert params["daily"] == "weather_code,temperature_2m_max,temperature_2m_min"
+    assert params["hourly"] == "weather_code,temperature_2m"
+    assert params["forecast_days"] == 2
+    assert params["timeformat"] == "unixtime"
+
+
+def test_get_forecast_reuses_longer_cached_forecast(mock_get, tmp_path):
+    """Test that a cached forecast serves requests for fewer days."""
+    service = WeatherService(cache=ResponseCache(str(tmp_path / "c.sqlite3")))
+    service.get_forecast(45.5, -122.6, days=2)
+    assert len(service.get_forecast(45.5, -122.6, days=1)) == 1
+    mock_get.assert_called_once()
+
+    service.get_forecast(45.5, -122.6, days=3)
+    assert mock_get.call_count == 2
+
+
+def test_get_forecast_requests_every_hour_only_when_needed(mock_get, tmp_path):
+    """Test that only the next hours are asked for unless hourly is wanted."""
+    service = WeatherService(cache=ResponseCache(str(tmp_path / "c.sqlite3")))
+    payload = make_payload()
+    payload["hourly"] = {key: value[:24] for key, value in payload["hourly"].items()}
+    payload["hourly"]["time"] = [MIDNIGHT + (h + 6) * 3600 for h in range(24)]
+    mock_get.return_value.content = json.dumps(payload).encode()
+    forecast = service.get_forecast(45.5, -122.6, days=2, hourly=False)
+    assert len(forecast) == 2 and len(forecast.hourly_time) == 24
+    params = mock_get.call_args.kwargs["params"]
+    assert params["forecast_hours"] == CURRENT_FORECAST_HOURS
+
+    service.get_forecast(45.5, -122.6, days=1, hourly=False)
+    assert mock_get.call_count == 1
+    mock_get.return_value.content = json.dumps(make_payload()).encode()
+    service.get_forecast(45.5, -122.6, days=1)
+    assert mock_get.call_count == 2
+    assert "forecast_hours" not in mock_get.call_args.kwargs["params"]
+
+
+def test_get_forecast_keeps_every_hour_when_extended(tmp_path):
+    """Test that fetching more days keeps a cached hourly forecast hourly."""
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(
+            WeatherService(cache=ResponseCache(str(tmp_path / "c.sqlite3")))
+        )
+        service.get_forecast(45.5, -122.6, days=7, hourly=True)
+        forecast = service.get_forecast(45.5, -122.6, days=10, hourly=False)
+        assert len(forecast.hourly_time) == 10 * 24
+        assert service.get_weather_by_coordinates(45.5, -122.6) is not None
+        assert upstreams.counts["weather"] == 2
+        service.close()
+
+
+def test_cli_current_served_from_daily_forecast(monkeypatch):
+    """Test that current weather after a plain forecast needs no request."""
+    with FakeUpstreams() as upstreams:
+        for name, value in upstreams.env().items():
+            monkeypatch.setenv(name, value)
+        runner = CliRunner()
+        result = runner.invoke(weather, ["forecast", "--zipcode", "97201"])
+        assert result.output.startswith("Forecast for Town 97201, OR:")
+        assert len(result.output.splitlines()) == 8
+        result = runner.invoke(weather, ["current", "--zipcode", "97201"])
+        assert result.output.startswith("It is currently")
+        assert upstreams.counts["weather"] == 1
+
+
+def test_current_weather_served_from_cached_forecast(mock_get, mocker, tmp_path):
+    """Test that current conditions come from a cached forecast's hourly data."""
+    service = WeatherService(cache=ResponseCache(str(tmp_path / "c.sqlite3")))
+    service.get_forecast(45.5, -122.6, days=2)
+    mocker.patch("weather_api.time.time", return_value=MIDNIGHT + 6 * 3600 + 120)
+
+    assert service.get_weather_by_coordinates(45.5, -122.6) == (56, "partly cloudy")
+    mock_get.assert_called_once()
+
+
+def test_cli_forecast(mock_get, mocker):
+    """Test the daily and hourly forecast output."""
+    mocker.patch.object(
+        WeatherService,
+        "resolve_location",
+        return_value=Location("Portland", "OR", 45.5, -122.6),
+    )
+    result = CliRunner().invoke(
+        weather, ["forecast", "--zipcode", "97201", "--days", "2", "--hourly"]
+    )
+    lines = result.output.splitlines()
+    assert lines[0] == "Forecast for Portland, OR:"
+    assert lines[1] == "Sat Jun 01: high 72ºF, low 55ºF, overcast"
+    assert lines[2] == "  00:00 50ºF, clear sky"
+    assert lines[26] == "Sun Jun 02: high 68ºF, low n/a, unknown conditions"
+    assert len(lines) == 51
+
+
+def test_cli_forecast_unknown_zipcode(mocker):
+    """Test the message for a zipcode that cannot be resolved."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=None)
+    result = CliRunner().invoke(weather, ["forecast", "--zipcode", "00000"])
+    assert "Could not get a forecast for zipcode 00000." in result.output
+
+
+def test_cli_forecast_days_limit():
+    """Test that --days is limited to what Open-Meteo offers."""
+    result = CliRunner().invoke(weather, ["forecast", "--days", "30"])
+    assert result.exit_code != 0
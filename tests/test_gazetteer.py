@@ -0,0 +1,151 @@
+"""
+Tests for the offline zip code gazetteer.
+
+These tests verify building, lookups, nearest-point search and CLI import.
+"""
+
+import pytest
+import weather_gazetteer
+from click.testing import CliRunner
+from weather import weather
+from weather_api import Location, WeatherService
+from weather_gazetteer import Gazetteer, build_gazetteer, default_gazetteer_path
+
+CSV = """zip,city,state,lat,lon
+94105,San Francisco,CA,37.7864,-122.3892
+98101,Seattle,WA,47.6114,-122.3305
+10001,New York,NY,40.7484,-73.9967
+02101,Boston,MA,42.3706,-71.0270
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    """Fixture writing a small zip code CSV."""
+    path = tmp_path / "zipcodes.csv"
+    path.write_text(CSV)
+    return path
+
+
+@pytest.fixture
+def places(csv_path, tmp_path):
+    """Fixture providing a gazetteer built from the small CSV."""
+    path = str(tmp_path / "gazetteer.bin")
+    build_gazetteer(str(csv_path), path)
+    places = Gazetteer(path)
+    yield places
+    places.close()
+
+
+def test_lookup(places):
+    """Test O(1) zip code lookups, including leading zeros and misses."""
+    assert len(places) == 4
+    assert places.lookup("94105") == Location("San Francisco", "CA", 37.7864, -122.3892)
+    assert places.lookup("02101").city == "Boston"
+    assert places.lookup("99999") is None
+    assert places.lookup("abc") is None
+
+
+@pytest.mark.parametrize("with_numpy", [True, False])
+def test_nearest(places, monkeypatch, with_numpy):
+    """Test nearest zip code search with and without NumPy."""
+    if not with_numpy:
+        monkeypatch.setattr(weather_gazetteer, "_numpy", lambda: None)
+    elif weather_gazetteer._numpy() is None:
+        pytest.skip("NumPy is not installed")
+    zipcode, location = places.nearest(47.6, -122.3)
+    assert zipcode == "98101"
+    assert location.city == "Seattle"
+    assert places.nearest(42.36, -71.06)[0] == "02101"
+
+
+def test_tsv_with_geonames_headers(tmp_path):
+    """Test importing a tab-separated file with GeoNames-style headers."""
+    path = tmp_path / "US.txt"
+    path.write_text(
+        "postal code\tplace name\tadmin code1\tlatitude\tlongitude\n"
+        "90210\tBeverly Hills\tCA\t34.0901\t-118.4065\n"
+    )
+    out = str(tmp_path / "gazetteer.bin")
+    assert build_gazetteer(str(path), out) == 1
+    assert Gazetteer(out).lookup("90210").city == "Beverly Hills"
+
+
+def test_headerless_geonames_dump(tmp_path):
+    """Test importing a GeoNames US.txt file as downloaded, with no header."""
+    path = tmp_path / "US.txt"
+    path.write_text(
+        "US\t99553\tAkutan\tAlaska\tAK\tAleutians East\t013\t\t\t54.143\t-165.7854\t1\n"
+        "US\t90210\tBeverly Hills\tCalifornia\tCA\tLos Angeles\t037\t\t\t"
+        "34.0901\t-118.4065\t\n"
+    )
+    out = str(tmp_path / "gazetteer.bin")
+    assert build_gazetteer(str(path), out) == 2
+    places = Gazetteer(out)
+    assert places.lookup("99553") == Location("Akutan", "AK", 54.143, -165.7854)
+    assert places.lookup("90210").state == "CA"
+    places.close()
+
+
+def test_missing_column(tmp_path):
+    """Test that a CSV without coordinates is rejected."""
+    path = tmp_path / "bad.csv"
+    path.write_text("zip,city,state\n94105,San Francisco,CA\n")
+    with pytest.raises(ValueError, match="lat"):
+        build_gazetteer(str(path), str(tmp_path / "gazetteer.bin"))
+
+
+def test_full_state_names(tmp_path):
+    """Test that state names are stored as codes and unknown ones rejected."""
+    path = tmp_path / "zipcodes.csv"
+    path.write_text(
+        "zip,city,state,lat,lon\n"
+        "97201,Portland,Oregon,45.5,-122.69\n"
+        "00901,San Juan,puerto  rico,18.46,-66.11\n"
+        "94105,San Francisco,ca,37.79,-122.39\n"
+    )
+    out = str(tmp_path / "gazetteer.bin")
+    assert build_gazetteer(str(path), out) == 3
+    places = Gazetteer(out)
+    assert places.lookup("97201").state == "OR"
+    assert places.lookup("00901").state == "PR"
+    assert places.lookup("94105").state == "CA"
+    places.close()
+
+    path.write_text("zip,city,state,lat,lon\n12345,Montréal,Québec,45.5,-73.57\n")
+    with pytest.raises(ValueError, match="'Québec' of zip code 12345"):
+        build_gazetteer(str(path), out)
+
+
+def test_service_prefers_gazetteer(places, mocker):
+    """Test that WeatherService resolves listed zip codes without the API."""
+    get = mocker.patch("requests.Session.get")
+    service = WeatherService(gazetteer=places)
+    assert service.get_location_by_zipcode("98101") == ("Seattle", "WA")
+    get.assert_not_called()
+
+    get.return_value = mocker.Mock(status_code=404)
+    assert service.resolve_location("99999") is None
+    get.assert_called_once()
+
+
+def test_cli_import_and_nearest(csv_path, mocker):
+    """Test that the CLI imports the gazetteer and uses it for lookups."""
+    runner = CliRunner()
+    result = runner.invoke(weather, ["gazetteer", "import", str(csv_path)])
+    assert "Imported 4 zip codes" in result.output
+    assert default_gazetteer_path() in result.output
+
+    result = runner.invoke(weather, ["gazetteer", "nearest", "40.75", "-74.0"])
+    assert "The nearest zip code is 10001 in New York, NY." in result.output
+
+    get = mocker.patch("requests.Session.get")
+    result = runner.invoke(weather, ["where-is", "--zipcode", "10001"])
+    assert "10001 is in New York, NY." in result.output
+    get.assert_not_called()
+
+
+def test_cli_nearest_without_gazetteer():
+    """Test the hint shown when no gazetteer has been imported."""
+    result = CliRunner().invoke(weather, ["gazetteer", "nearest", "40", "-74"])
+    assert "weather gazetteer import" in result.output
@@ -0,0 +1,151 @@
+"""
+Tests for historical weather and its local columnar store.
+
+These tests verify that stored days are not fetched again and that
+aggregates are computed from the stored columns.
+"""
+
+import json
+import math
+from array import array
+from datetime import date, timedelta
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from click.testing import CliRunner
+from weather import weather
+from weather_api import Location, WeatherService
+from weather_history import History, HistoryStore
+
+SEATTLE = Location("Seattle", "WA", 47.6062, -122.3321)
+
+
+def history(start, highs, lows, means=None):
+    means = means or [math.nan] * len(highs)
+    return History(
+        start,
+        [
+            array("d", highs),
+            array("d", lows),
+            array("d", means),
+            array("d", [0.1] * len(highs)),
+            array("d", [3] * len(highs)),
+        ],
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history"))
+
+
+def test_store_roundtrip_across_years(store):
+    """Test that days spanning a year boundary are saved and loaded."""
+    store.save("c23nb", history(date(2023, 12, 30), [50, 51, 52, 53], [30, 31, 32, 33]))
+    loaded = store.load("c23nb", date(2023, 12, 29), date(2024, 1, 3))
+    assert list(loaded.high[1:5]) == [50, 51, 52, 53]
+    assert math.isnan(loaded.high[0]) and math.isnan(loaded.high[5])
+    assert store.missing("c23nb", date(2023, 12, 29), date(2024, 1, 3)) == [
+        (date(2023, 12, 29), date(2023, 12, 29)),
+        (date(2024, 1, 3), date(2024, 1, 3)),
+    ]
+
+
+def test_store_skips_days_without_data(store):
+    """Test that days the archive has no data for yet stay missing."""
+    store.save("c23nb", history(date(2024, 3, 1), [50, math.nan], [30, math.nan]))
+    assert store.missing("c23nb", date(2024, 3, 1), date(2024, 3, 2)) == [
+        (date(2024, 3, 2), date(2024, 3, 2))
+    ]
+
+
+def test_aggregate_by_month_with_degree_days():
+    """Test monthly summaries and degree-days from the daily columns."""
+    result = history(date(2024, 1, 30), [60, 70, 80], [40, 50, 60], [55, math.nan, 70])
+    january, february = result.aggregate("month", base=65)
+    assert january.period == "2024-01"
+    assert (january.low, january.high, january.mean) == (40, 70, 57.5)
+    assert (january.heating_degree_days, january.cooling_degree_days) == (15, 0)
+    assert (february.mean, february.cooling_degree_days) == (70, 5)
+    assert result.degree_days(base=65) == (15, 5)
+    assert [r.period for r in result.aggregate("week")] == ["2024-W05"]
+
+
+def test_get_history_fetches_only_missing_days(store):
+    """Test that overlapping range queries only request days not yet stored."""
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(WeatherService(rate_limits={}, history=store))
+        first = service.get_history(47.6, -122.3, date(2024, 1, 1), date(2024, 1, 10))
+        assert len(first) == 10 and not math.isnan(first.high[9])
+        assert upstreams.counts["archive"] == 1
+
+        service.get_history(47.6, -122.3, date(2024, 1, 3), date(2024, 1, 8))
+        assert upstreams.counts["archive"] == 1
+
+        later = service.get_history(47.6, -122.3, date(2024, 1, 5), date(2024, 1, 15))
+        assert upstreams.counts["archive"] == 2
+        assert list(later.high[:6]) == list(first.high[4:])
+        assert service.metrics.counter("history_days_fetched") == 15
+        service.close()
+
+
+def test_get_history_stops_at_today(store):
+    """Test that a range past today only requests days up to today."""
+    today = date.today()
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(WeatherService(rate_limits={}, history=store))
+        start = today - timedelta(days=2)
+        result = service.get_history(47.6, -122.3, start, today + timedelta(days=5))
+        assert len(result) == 3
+        assert upstreams.counts["archive"] == 1
+        service.close()
+
+
+def test_get_history_rejects_bad_ranges():
+    """Test that reversed and pre-archive ranges raise ValueError."""
+    service = WeatherService(rate_limits={})
+    with pytest.raises(ValueError):
+        service.get_history(47.6, -122.3, date(2024, 1, 2), date(2024, 1, 1))
+    with pytest.raises(ValueError):
+        service.get_history(47.6, -122.3, date(1900, 1, 1), date(1900, 1, 2))
+    tomorrow = date.today() + timedelta(days=1)
+    with pytest.raises(ValueError, match="future"):
+        service.get_history(47.6, -122.3, tomorrow, tomorrow)
+
+
+def test_history_command(mocker):
+    """Test history output as text and as JSON records."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=SEATTLE)
+    mocker.patch.object(
+        WeatherService,
+        "get_history",
+        return_value=history(date(2024, 1, 1), [50, 54], [30, 34]),
+    )
+    runner = CliRunner()
+    args = ["history", "--zipcode", "98101", "--start", "2024-01-01"]
+    result = runner.invoke(weather, args + ["--end", "2024-01-02"])
+    assert result.output.splitlines() == [
+        "Weather history for Seattle, WA:",
+        "2024-01-01: low 30ºF, high 50ºF, mean 40ºF, precipitation 0.10 in, "
+        "degree-days 25 heating / 0 cooling",
+        "2024-01-02: low 34ºF, high 54ºF, mean 44ºF, precipitation 0.10 in, "
+        "degree-days 21 heating / 0 cooling",
+    ]
+
+    result = runner.invoke(
+        weather, args + ["--end", "2024-01-02", "--by", "year", "--format", "json"]
+    )
+    assert json.loads(result.output) == [
+        {
+            "period": "2024",
+            "low": 30.0,
+            "high": 54.0,
+            "mean": 42.0,
+            "precipitation": 0.2,
+            "heating_degree_days": 46.0,
+            "cooling_degree_days": 0.0,
+        }
+    ]
+
+    result = runner.invoke(weather, args + ["--end", "2023-12-31"])
+    assert result.exit_code == 2
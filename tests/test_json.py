@@ -0,0 +1,116 @@
+"""
+Tests for pluggable JSON decoding and selective field extraction.
+"""
+
+import json
+
+import pytest
+from weather_api import (
+    CURRENT_SCHEMA,
+    FORECAST_SCHEMA,
+    ZIPCODE_SCHEMA,
+    WeatherService,
+)
+from weather_json import (
+    JSONDecoder,
+    MsgspecDecoder,
+    OrjsonDecoder,
+    default_decoder,
+    project,
+)
+
+ZIPCODE_PAYLOAD = {
+    "post code": "94105",
+    "country": "United States",
+    "places": [
+        {
+            "place name": "San Francisco",
+            "longitude": "-122.3892",
+            "state": "California",
+            "state abbreviation": "CA",
+            "latitude": "37.7864",
+        }
+    ],
+}
+
+
+def available_decoders():
+    decoders = [JSONDecoder]
+    for decoder in (OrjsonDecoder, MsgspecDecoder):
+        try:
+            decoder()
+        except ImportError:
+            continue
+        decoders.append(decoder)
+    return decoders
+
+
+def test_project_keeps_schema_fields():
+    """Test that only the fields named by a schema are kept."""
+    assert project(ZIPCODE_PAYLOAD, ZIPCODE_SCHEMA) == {
+        "places": [
+            {
+                "place name": "San Francisco",
+                "state abbreviation": "CA",
+                "latitude": "37.7864",
+                "longitude": "-122.3892",
+            }
+        ]
+    }
+    # Multi-location responses are arrays of objects
+    payload = [{"current": {"temperature_2m": 1, "time": 0}, "elevation": 3}]
+    assert project(payload, CURRENT_SCHEMA) == [{"current": {"temperature_2m": 1}}]
+
+
+@pytest.mark.parametrize("decoder", available_decoders(), ids=lambda d: d.name)
+def test_decoders_agree(decoder):
+    """Test that every decoder returns the same reduced payloads."""
+    forecast = {
+        "latitude": 37.78,
+        "utc_offset_seconds": -25200,
+        "daily_units": {"time": "unixtime"},
+        "daily": {
+            "time": [1717200000],
+            "weather_code": [3],
+            "temperature_2m_max": [72.5],
+            "temperature_2m_min": [None],
+        },
+        "hourly": {"time": [1717200000], "weather_code": [1], "temperature_2m": [60]},
+    }
+    for payload, schema in (
+        (ZIPCODE_PAYLOAD, ZIPCODE_SCHEMA),
+        (forecast, FORECAST_SCHEMA),
+    ):
+        body = json.dumps(payload).encode()
+        assert decoder().decode(body, schema) == JSONDecoder().decode(body, schema)
+    assert decoder().decode(b'{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+def test_msgspec_falls_back_on_unexpected_types():
+    """Test that a payload not matching the schema's types is still decoded."""
+    pytest.importorskip("msgspec")
+    body = b'[{"current": {"temperature_2m": "warm", "weather_code": 2.5}}]'
+    assert MsgspecDecoder().decode(body, CURRENT_SCHEMA) == [
+        {"current": {"temperature_2m": "warm", "weather_code": 2.5}}
+    ]
+
+
+def test_default_decoder_prefers_fastest():
+    """Test that the default decoder is the first one installed."""
+    assert default_decoder().name == available_decoders()[-1].name
+
+
+def test_service_caches_only_used_fields(tmp_path, mocker):
+    """Test that fields the service does not use never reach the cache."""
+    from weather_cache import ResponseCache
+
+    response = mocker.Mock(
+        status_code=200, content=json.dumps(ZIPCODE_PAYLOAD).encode()
+    )
+    mocker.patch("requests.Session.get", return_value=response)
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    service = WeatherService(cache=cache, rate_limits={}, json_decoder=JSONDecoder())
+    assert service.resolve_location("94105").city == "San Francisco"
+    cached = cache.get(service._cache_key(f"{service.zipcode_url}/94105", None))
+    cache.close()
+    assert "country" not in cached and "state" not in cached["places"][0]
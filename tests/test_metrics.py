@@ -0,0 +1,165 @@
+"""
+Tests for request instrumentation and metrics export.
+
+These tests verify timing spans, counters, hooks and the --profile surface.
+"""
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from click.testing import CliRunner
+from weather import weather
+from weather_api import WeatherService
+from weather_cache import ResponseCache
+from weather_metrics import Metrics
+
+
+@pytest.fixture
+def upstreams():
+    """Fixture running fake upstreams for the duration of a test."""
+    with FakeUpstreams() as upstreams:
+        yield upstreams
+
+
+def test_counters_timings_and_hooks():
+    """Test that observations are aggregated per label set and sent to hooks."""
+    events = []
+    metrics = Metrics(hooks=[lambda *event: events.append(event)])
+    metrics.increment("cache_hits", upstream="a")
+    metrics.increment("cache_hits", 2, upstream="a")
+    metrics.increment("cache_hits", upstream="b")
+    metrics.observe("upstream_request", 0.5, phase="ttfb")
+    with metrics.span("upstream_request", phase="ttfb"):
+        pass
+
+    assert metrics.counter("cache_hits", upstream="a") == 3
+    assert metrics.counter("cache_misses") == 0
+    count, total, peak = metrics.timing("upstream_request", phase="ttfb")
+    assert count == 2 and total >= 0.5 and peak == 0.5
+    assert events[0] == ("counter", "cache_hits", 1, {"upstream": "a"})
+    assert events[3][:2] == ("timing", "upstream_request")
+
+
+def test_prometheus_export(tmp_path):
+    """Test the Prometheus text format and the atomic textfile write."""
+    metrics = Metrics()
+    metrics.increment("upstream_retries", 2, upstream="api.open-meteo.com")
+    metrics.observe("upstream_request", 0.25, upstream='a"b', phase="body")
+    text = metrics.to_prometheus()
+    assert "# TYPE weather_upstream_retries_total counter" in text
+    assert 'weather_upstream_retries_total{upstream="api.open-meteo.com"} 2' in text
+    assert "# TYPE weather_upstream_request_seconds summary" in text
+    assert (
+        'weather_upstream_request_seconds_sum{phase="body",upstream="a\\"b"} 0.250000'
+        in text
+    )
+    assert (
+        'weather_upstream_request_seconds_count{phase="body",upstream="a\\"b"} 1'
+        in text
+    )
+
+    path = tmp_path / "metrics" / "weather.prom"
+    metrics.write_prometheus(str(path))
+    assert path.read_text() == text
+    assert [p.name for p in path.parent.iterdir()] == ["weather.prom"]
+
+
+def test_service_times_request_phases(upstreams):
+    """Test that a lookup records connect, ttfb, body and decode per upstream."""
+    service = upstreams.configure(WeatherService(rate_limits={}))
+    with service:
+        service.resolve_location("10001")
+        service.resolve_location("10002")
+    metrics = service.metrics
+    for phase in ("ttfb", "body", "decode"):
+        assert (
+            metrics.timing("upstream_request", upstream="127.0.0.1", phase=phase)[0]
+            == 2
+        )
+    # The second lookup reuses the pooled connection
+    assert (
+        metrics.timing("upstream_request", upstream="127.0.0.1", phase="connect")[0]
+        == 1
+    )
+    assert (
+        metrics.counter("upstream_responses", upstream="127.0.0.1", status="200") == 2
+    )
+
+
+def test_service_counts_retries_and_errors():
+    """Test that retried 503s are counted."""
+    with FakeUpstreams(error_rate=1.0) as upstreams:
+        service = upstreams.configure(
+            WeatherService(retries=2, backoff_factor=0, rate_limits={})
+        )
+        assert service.resolve_location("10001") is None
+        service.close()
+    metrics = service.metrics
+    assert metrics.counter("upstream_retries", upstream="127.0.0.1") == 2
+    assert (
+        metrics.counter("upstream_responses", upstream="127.0.0.1", status="503") == 1
+    )
+    assert metrics.counter("errors", operation="resolve_location") == 0
+
+
+def test_service_counts_failed_requests():
+    """Test that a request that never gets a response counts as an error."""
+    service = WeatherService(retries=0, rate_limits={})
+    # Nothing listens on the discard port, so the connection is refused
+    service.zipcode_url = "http://127.0.0.1:9/us"
+    assert service.resolve_location("10001") is None
+    metrics = service.metrics
+    assert metrics.counter(
+        "upstream_errors", upstream="127.0.0.1", error="ConnectionError"
+    )
+    assert metrics.counter("errors", operation="resolve_location") == 1
+
+
+def test_service_counts_cache_hits_and_misses(upstreams, tmp_path):
+    """Test that cache lookups are counted per upstream host."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    service = upstreams.configure(WeatherService(cache=cache, rate_limits={}))
+    service.resolve_location("10001")
+    service.resolve_location("10001")
+    assert service.metrics.counter("cache_misses", upstream="127.0.0.1") == 1
+    assert service.metrics.counter("cache_hits", upstream="127.0.0.1") == 1
+    service.close()
+    cache.close()
+
+
+def test_cached_current_counts_no_misses(upstreams, monkeypatch, tmp_path):
+    """Test that a fully cached current lookup counts only cache hits."""
+    for name, value in upstreams.env().items():
+        monkeypatch.setenv(name, value)
+    path = tmp_path / "weather.prom"
+    args = ["--metrics-file", str(path), "current", "--zipcode", "10001"]
+    runner = CliRunner()
+    runner.invoke(weather, args)
+    result = runner.invoke(weather, args)
+    assert "It is currently" in result.output
+    metrics = path.read_text()
+    assert "weather_cache_misses_total" not in metrics
+    assert 'weather_cache_hits_total{upstream="127.0.0.1"} 2' in metrics
+
+
+def test_profile_and_metrics_file(upstreams, monkeypatch, tmp_path):
+    """Test that --profile prints a breakdown and --metrics-file exports it."""
+    for name, value in upstreams.env().items():
+        monkeypatch.setenv(name, value)
+    path = tmp_path / "weather.prom"
+    result = CliRunner().invoke(
+        weather,
+        ["--profile", "--metrics-file", str(path), "current", "--zipcode", "10001"],
+    )
+    assert result.exit_code == 0
+    assert "It is currently" in result.output
+    assert "command current" in result.output
+    assert "upstream_request ttfb 127.0.0.1" in result.output
+    assert 'weather_command_seconds_count{command="current"} 1' in path.read_text()
+
+
+def test_no_profile_output_by_default(upstreams, monkeypatch):
+    """Test that commands print no breakdown unless asked to."""
+    for name, value in upstreams.env().items():
+        monkeypatch.setenv(name, value)
+    result = CliRunner().invoke(weather, ["current", "--zipcode", "10001"])
+    assert "upstream_request" not in result.output
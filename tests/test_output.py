@@ -0,0 +1,51 @@
+"""
+Tests for typed result records and their output formats.
+"""
+
+import json
+
+from weather_api import Location, UpstreamError
+from weather_output import PlaceRecord, WeatherRecord, format_records
+
+SEATTLE = Location("Seattle", "WA", 47.6062, -122.3321, "America/Los_Angeles")
+
+
+def test_weather_record_from_lookup():
+    """Test that records combine the location with its weather or error."""
+    record = WeatherRecord.from_lookup("98101", SEATTLE, (65, "cloudy"))
+    assert record == WeatherRecord(
+        "98101", "Seattle", "WA", 47.6062, -122.3321, 65, "cloudy"
+    )
+    failed = WeatherRecord.from_lookup("98101", SEATTLE, UpstreamError("no data"))
+    assert (failed.city, failed.temperature, failed.error) == (
+        "Seattle",
+        None,
+        "no data",
+    )
+    assert (
+        WeatherRecord.from_lookup("98101", SEATTLE, None).error == "weather unavailable"
+    )
+    assert PlaceRecord.from_location("00000", None).error == "location not found"
+
+
+def test_format_records_streams_lazily():
+    """Test that each record is formatted before the next one is produced."""
+    produced = []
+
+    def records():
+        for zipcode in ("94105", "98101"):
+            produced.append(zipcode)
+            yield PlaceRecord(zipcode)
+
+    lines = format_records(records(), PlaceRecord, "jsonl", str)
+    assert json.loads(next(lines))["zipcode"] == "94105"
+    assert produced == ["94105"]
+
+
+def test_format_records_without_records():
+    """Test that empty results are still valid JSON and CSV."""
+    assert list(format_records([], PlaceRecord, "json", str)) == ["[]"]
+    assert list(format_records([], PlaceRecord, "jsonl", str)) == []
+    assert list(format_records([], PlaceRecord, "csv", str)) == [
+        "zipcode,city,state,lat,lon,timezone,error"
+    ]
@@ -0,0 +1,211 @@
+"""
+Tests for city and coordinate lookups and the local place index.
+
+These tests verify that geocoded names are answered from the index after
+the first lookup, and that coordinates are named after nearby places.
+"""
+
+import json
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from click.testing import CliRunner
+from weather import complete_city, weather
+from weather_api import Location, LocationNotFound, WeatherService
+from weather_places import Place, PlaceIndex, normalize, split_query
+
+PORTLAND_OR = Place(
+    1, "Portland", 45.5234, -122.6762, "Oregon", "US", population=652503
+)
+PORTLAND_ME = Place(2, "Portland", 43.6615, -70.2553, "Maine", "US", population=66881)
+PORT_ANGELES = Place(
+    3, "Port Angeles", 48.1181, -123.4307, "Washington", "US", population=20000
+)
+SAO_PAULO = Place(4, "São Paulo", -23.5475, -46.6361, "São Paulo", "BR", "Brazil")
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Fixture providing an empty place index."""
+    index = PlaceIndex(str(tmp_path / "places.sqlite3"))
+    yield index
+    index.close()
+
+
+def test_split_and_normalize():
+    """Test parsing 'City, Qualifier' queries and folding names."""
+    assert split_query("Portland, OR") == ("Portland", ["OR"])
+    assert split_query(" Paris ,, France ") == ("Paris", ["France"])
+    assert normalize("  São   PAULO ") == "sao paulo"
+
+
+def test_place_labels_and_qualifiers():
+    """Test that US places use state abbreviations and others country codes."""
+    assert PORTLAND_OR.label == "Portland, OR"
+    assert SAO_PAULO.label == "São Paulo, BR"
+    assert PORTLAND_OR.matches(["or"]) and PORTLAND_OR.matches(["Oregon", "US"])
+    assert PORTLAND_OR.matches([])
+    assert not PORTLAND_OR.matches(["ME"])
+    assert SAO_PAULO.matches(["brazil"])
+    assert PORTLAND_ME.location() == Location("Portland", "ME", 43.6615, -70.2553)
+
+
+def test_index_search_and_complete(index):
+    """Test stored searches keep their ranking and prefixes complete names."""
+    assert index.search("Portland") is None
+    index.add("Portland", [PORTLAND_OR, PORTLAND_ME])
+    index.add("port angeles", [PORT_ANGELES])
+    index.add("Nowhere", [])
+
+    assert index.search(" PORTLAND ") == [PORTLAND_OR, PORTLAND_ME]
+    assert index.search("nowhere") == []
+    assert len(index) == 3
+
+    assert [p.label for p in index.complete("port")] == [
+        "Portland, OR",
+        "Portland, ME",
+        "Port Angeles, WA",
+    ]
+    assert [p.label for p in index.complete("Portland, m")] == ["Portland, ME"]
+    assert index.complete("port a") == [PORT_ANGELES]
+    assert index.complete("port", limit=1) == [PORTLAND_OR]
+    assert index.complete("x") == []
+
+
+def test_index_persists(tmp_path):
+    """Test that a reopened index still answers stored searches."""
+    path = str(tmp_path / "places.sqlite3")
+    index = PlaceIndex(path)
+    index.add("São Paulo", [SAO_PAULO])
+    index.close()
+
+    index = PlaceIndex(path)
+    assert index.search("sao paulo") == [SAO_PAULO]
+    index.close()
+
+
+def test_index_nearest(index):
+    """Test finding the closest stored place within a radius."""
+    index.add("Portland", [PORTLAND_OR, PORTLAND_ME])
+    assert index.nearest(45.5, -122.6, 25) == PORTLAND_OR
+    assert index.nearest(43.7, -70.3, 25) == PORTLAND_ME
+    assert index.nearest(40.0, -100.0, 25) is None
+
+
+def test_resolve_city_uses_index_after_first_lookup(index):
+    """Test that a name is geocoded once, then answered for any qualifier."""
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(WeatherService(rate_limits={}, places=index))
+        oregon = service.resolve_location(city="Portland, OR")
+        assert (oregon.city, oregon.state) == ("Portland", "OR")
+        assert oregon.timezone == "America/Los_Angeles"
+        assert upstreams.counts["geocoding"] == 1
+
+        maine = service.resolve_location(city="portland, maine")
+        assert (maine.city, maine.state, maine.lat) == ("Portland", "ME", 43.6615)
+        assert service.resolve_location(city="Portland") == oregon
+        assert service.resolve_location(city="Portland, TX") is None
+        assert upstreams.counts["geocoding"] == 1
+        assert service.metrics.counter("place_index_hits") == 3
+
+        assert service.resolve_location(city="Nowhere") is None
+        assert service.resolve_location(city="Nowhere") is None
+        assert upstreams.counts["geocoding"] == 2
+        service.close()
+
+
+def test_resolve_city_without_index():
+    """Test city lookups through the response cache alone."""
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(WeatherService(rate_limits={}, raise_errors=True))
+        assert service.resolve_location(city="Salem").city == "Salem"
+        with pytest.raises(LocationNotFound, match="named Nowhere"):
+            service.resolve_location(city="Nowhere")
+        service.close()
+
+
+def test_resolve_coordinates(index):
+    """Test that coordinates are named after a nearby known place, if any."""
+    index.add("Portland", [PORTLAND_OR, PORTLAND_ME])
+    service = WeatherService(rate_limits={}, places=index)
+    near = service.resolve_location(coordinates=(45.5, -122.6))
+    assert near == Location("Portland", "OR", 45.5, -122.6)
+
+    far = service.resolve_location(coordinates=(10.0, 20.0))
+    assert far == Location(None, None, 10.0, 20.0)
+    assert service.resolve_location(coordinates=(91.0, 0.0)) is None
+
+
+def test_where_is_city_and_coords(mocker):
+    """Test where-is sentences and records for --city and --coords."""
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_location.return_value = PORTLAND_OR.location()
+    runner = CliRunner()
+
+    result = runner.invoke(weather, ["where-is", "--city", "Portland, OR"])
+    assert result.output == "Portland, OR is at 45.5234,-122.6762.\n"
+    mock_location.assert_called_with(city="Portland, OR")
+
+    mock_location.return_value = Location("Portland", "OR", 45.5, -122.6)
+    result = runner.invoke(weather, ["where-is", "--coords", "45.5,-122.6"])
+    assert result.output == "45.5,-122.6 is near Portland, OR.\n"
+    mock_location.assert_called_with(coordinates=(45.5, -122.6))
+
+    mock_location.return_value = Location(None, None, 10.0, 20.0)
+    result = runner.invoke(
+        weather, ["where-is", "--coords", "-10,-20", "--format", "jsonl"]
+    )
+    mock_location.assert_called_with(coordinates=(-10.0, -20.0))
+    assert json.loads(result.output)["city"] is None
+
+    mock_location.return_value = None
+    result = runner.invoke(weather, ["where-is", "--city", "Nowhere"])
+    assert result.output == "Could not find location information for Nowhere.\n"
+
+
+def test_current_city(mocker):
+    """Test current weather for --city and its failure message."""
+    mocker.patch.object(
+        WeatherService, "resolve_location", return_value=PORTLAND_ME.location()
+    )
+    mocker.patch.object(
+        WeatherService, "get_weather_by_coordinates", return_value=(41.0, "fog")
+    )
+    runner = CliRunner()
+    result = runner.invoke(weather, ["current", "--city", "Portland, ME"])
+    assert result.output == "It is currently 41.0ºF, and fog in Portland, ME.\n"
+
+    WeatherService.get_weather_by_coordinates.return_value = None
+    result = runner.invoke(weather, ["current", "--coords", "43.66,-70.26"])
+    assert result.output == "Could not get weather information for 43.66,-70.26.\n"
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["where-is", "--zipcode", "97201", "--city", "Portland"],
+        ["current", "--city", "Portland", "--coords", "45.5,-122.6"],
+    ],
+)
+def test_location_options_are_exclusive(args):
+    """Test that only one way of naming a location is accepted."""
+    result = CliRunner().invoke(weather, args)
+    assert result.exit_code == 2
+    assert "mutually exclusive" in result.output
+
+
+@pytest.mark.parametrize("coords", ["45.5", "north,west", "95,0"])
+def test_bad_coords(coords):
+    """Test that malformed or out of range coordinates are rejected."""
+    result = CliRunner().invoke(weather, ["where-is", "--coords", coords])
+    assert result.exit_code == 2
+    assert "Invalid value for '--coords'" in result.output
+
+
+def test_complete_city_is_local():
+    """Test shell completion of --city from the default place index."""
+    assert complete_city(None, None, "Port") == []
+    index = PlaceIndex()
+    index.add("Portland", [PORTLAND_OR, PORTLAND_ME])
+    index.close()
+    assert complete_city(None, None, "port") == ["Portland, OR", "Portland, ME"]
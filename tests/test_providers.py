@@ -0,0 +1,161 @@
+"""
+Tests for weather provider fallback, hedging and circuit breaking.
+
+These tests verify which providers are asked, and when.
+"""
+
+import time
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from weather_api import (
+    HEDGE_DELAY,
+    CircuitBreaker,
+    UpstreamError,
+    WeatherProvider,
+    WeatherService,
+    WttrProvider,
+)
+
+
+class StubProvider(WeatherProvider):
+    """Provider answering after a delay, or failing, without any HTTP."""
+
+    def __init__(self, name, answer=None, delay=0, breaker=None):
+        super().__init__(breaker)
+        self.name = name
+        self.answer = answer
+        self.delay = delay
+        self.calls = 0
+
+    def fetch(self, service, lat, lon):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.answer is None:
+            raise UpstreamError(f"{self.name} is down")
+        return self.answer
+
+
+def make_service(*providers, hedge_delay=None):
+    return WeatherService(providers=list(providers), hedge_delay=hedge_delay)
+
+
+def test_circuit_breaker_opens_and_recovers(mocker):
+    """Test that a breaker opens after repeated failures and retries later."""
+    now = mocker.patch("weather_api.time.monotonic", return_value=100.0)
+    breaker = CircuitBreaker(failures=3, reset=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now.return_value = 131.0
+    assert breaker.allow()
+    # A failed trial reopens the breaker immediately
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now.return_value = 162.0
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_primary_answers_without_hedging():
+    """Test that a fast primary is the only provider asked."""
+    primary = StubProvider("primary", (70, "clear sky"))
+    backup = StubProvider("backup", (60, "overcast"))
+    service = make_service(primary, backup, hedge_delay=0.5)
+    assert service.get_weather_by_coordinates(1, 2) == (70, "clear sky")
+    assert backup.calls == 0
+
+
+def test_slow_primary_is_hedged():
+    """Test that the backup is asked once the primary exceeds the hedge delay."""
+    primary = StubProvider("primary", (70, "clear sky"), delay=1)
+    backup = StubProvider("backup", (60, "overcast"))
+    service = make_service(primary, backup, hedge_delay=0.05)
+    started = time.perf_counter()
+    assert service.get_weather_by_coordinates(1, 2) == (60, "overcast")
+    assert time.perf_counter() - started < 0.5
+    assert service.metrics.counter("hedged_requests", provider="backup") == 1
+    service.close()
+
+
+def test_failed_primary_falls_back_immediately():
+    """Test that a failing primary does not wait out the hedge delay."""
+    primary = StubProvider("primary")
+    backup = StubProvider("backup", (60, "overcast"))
+    service = make_service(primary, backup, hedge_delay=5)
+    started = time.perf_counter()
+    assert service.get_weather_by_coordinates(1, 2) == (60, "overcast")
+    assert time.perf_counter() - started < 1
+    assert service.metrics.counter("hedged_requests", provider="backup") == 0
+
+
+def test_open_breaker_skips_provider():
+    """Test that a provider is not asked while its breaker is open."""
+    primary = StubProvider("primary", breaker=CircuitBreaker(failures=2))
+    backup = StubProvider("backup", (60, "overcast"))
+    service = make_service(primary, backup)
+    for _ in range(3):
+        assert service.get_weather_by_coordinates(1, 2) == (60, "overcast")
+    assert primary.calls == 2
+    assert service.metrics.counter("provider_skipped", provider="primary") == 1
+
+
+def test_all_providers_failing(caplog):
+    """Test that lookups fail when no provider answers."""
+    service = make_service(StubProvider("primary"), StubProvider("backup"))
+    assert service.get_weather_by_coordinates(1, 2) is None
+    assert "primary is down" in caplog.text
+    assert service.metrics.counter("errors", operation="get_weather_by_coordinates")
+
+
+def test_hedge_delay_tracks_p95_latency():
+    """Test that the hedge delay is the p95 of recent latencies."""
+    provider = StubProvider("primary")
+    assert provider.hedge_delay() == HEDGE_DELAY
+    for latency in range(1, 101):
+        provider.record_latency(latency / 1000)
+    assert provider.hedge_delay() == pytest.approx(0.095)
+
+
+def test_wttr_payload_is_parsed():
+    """Test that wttr.in conditions map onto Open-Meteo's vocabulary."""
+    payload = {
+        "current_condition": [
+            {
+                "temp_F": "54",
+                "weatherCode": "116",
+                "weatherDesc": [{"value": "Partly cloudy"}],
+            }
+        ]
+    }
+    assert WttrProvider().parse(WeatherService(), payload) == (54, "partly cloudy")
+
+
+def test_falls_back_to_wttr_when_open_meteo_is_down():
+    """Test the default providers end to end with Open-Meteo unreachable."""
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(WeatherService(retries=0, rate_limits={}))
+        # Nothing listens on the discard port, so the connection is refused
+        service.weather_base_url = "http://127.0.0.1:9/v1/forecast"
+        assert service.get_weather_by_coordinates(45.5, -122.7) == (
+            65,
+            "partly cloudy",
+        )
+        service.close()
+    assert upstreams.counts["wttr"] == 1
+
+
+def test_batch_fails_fast_while_open_meteo_breaker_is_open(mocker):
+    """Test that multi-location requests honour Open-Meteo's breaker."""
+    get = mocker.patch("requests.Session.get")
+    service = WeatherService()
+    for _ in range(3):
+        service.providers[0].breaker.record_failure()
+    results = service.get_weather_for_coordinates([(1, 2), (3, 4)])
+    assert all(isinstance(result, UpstreamError) for result in results)
+    get.assert_not_called()
@@ -0,0 +1,112 @@
+"""
+Tests for the client-side upstream rate limiter.
+
+These tests verify token bucket behaviour and its use by WeatherService.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from click.testing import CliRunner
+from weather import weather
+from weather_api import WeatherService
+from weather_ratelimit import RateLimiter, SharedRateLimiter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_rate_limiter_allows_burst_then_waits(mocker):
+    """Test that the bucket allows its capacity at once, then throttles."""
+    clock = mocker.patch("weather_ratelimit.time.monotonic", return_value=0.0)
+    sleep = mocker.patch("weather_ratelimit.time.sleep")
+    sleep.side_effect = lambda seconds: setattr(
+        clock, "return_value", clock.return_value + seconds
+    )
+
+    limiter = RateLimiter(2, 1)
+    limiter.acquire()
+    limiter.acquire()
+    sleep.assert_not_called()
+
+    limiter.acquire()
+    sleep.assert_called_once()
+    assert sleep.call_args.args[0] == 0.5
+
+
+def test_rate_limiter_queues_callers_in_order(mocker):
+    """Test that waiting callers reserve successive tokens instead of racing."""
+    mocker.patch("weather_ratelimit.time.monotonic", return_value=0.0)
+    sleep = mocker.patch("weather_ratelimit.time.sleep")
+    limiter = RateLimiter(1, 1)
+    for _ in range(4):
+        limiter.acquire()
+    assert [c.args[0] for c in sleep.call_args_list] == [1.0, 2.0, 3.0]
+
+
+def test_shared_limiter_shares_budget_between_instances(mocker, tmp_path):
+    """Test that limiters on the same host draw from one bucket file."""
+    mocker.patch("weather_ratelimit.time.time", return_value=1000.0)
+    sleep = mocker.patch("weather_ratelimit.time.sleep")
+    first = SharedRateLimiter("ip-api.com", 2, 60, directory=str(tmp_path))
+    second = SharedRateLimiter("ip-api.com", 2, 60, directory=str(tmp_path))
+    first.acquire()
+    second.acquire()
+    sleep.assert_not_called()
+    first.acquire()
+    assert sleep.call_args.args[0] == 30
+    assert second.usage() == {
+        "host": "ip-api.com",
+        "requests": 2,
+        "per": 60,
+        "used": 2,
+        "queued": 1,
+        "total": 3,
+    }
+
+
+def test_shared_limiter_spans_processes(tmp_path):
+    """Test that separate processes are throttled by one shared budget."""
+    script = (
+        "from weather_ratelimit import SharedRateLimiter\n"
+        f"limiter = SharedRateLimiter('example.com', 5, 0.25, {str(tmp_path)!r})\n"
+        "for _ in range(10):\n"
+        "    limiter.acquire()\n"
+    )
+    started = time.perf_counter()
+    workers = [
+        subprocess.Popen([sys.executable, "-c", script], cwd=ROOT) for _ in range(2)
+    ]
+    assert [worker.wait() for worker in workers] == [0, 0]
+    # 20 tokens from a bucket of 5 refilling at 20/s take at least 0.75s
+    assert time.perf_counter() - started >= 0.7
+    usage = SharedRateLimiter("example.com", 5, 0.25, str(tmp_path)).usage()
+    assert usage["total"] == 20
+
+
+def test_quota_command(mocker):
+    """Test that weather quota reports usage for every limited upstream."""
+    limiter = WeatherService().rate_limits["ip-api.com"]
+    mocker.patch("weather_ratelimit.time.sleep")
+    for _ in range(3):
+        limiter.acquire()
+    result = CliRunner().invoke(weather, ["quota"])
+    assert result.exit_code == 0
+    assert "ip-api.com: 3 of 45 requests per 60s in use (3 sent in total)." in (
+        result.output
+    )
+    assert "api.open-meteo.com: 0 of 600 requests" in result.output
+
+
+def test_service_applies_host_limit(mocker):
+    """Test that upstream requests take a token from their host's limiter."""
+    limiter = mocker.Mock()
+    response = mocker.Mock(status_code=200)
+    response.content = json.dumps({"status": "fail"}).encode()
+    mocker.patch("requests.Session.get", return_value=response)
+
+    service = WeatherService(rate_limits={"ip-api.com": limiter})
+    service.resolve_location()
+    limiter.acquire.assert_called_once()
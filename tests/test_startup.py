@@ -0,0 +1,113 @@
+"""
+Startup-time regression tests for the weather console script.
+
+These tests run the CLI in a fresh interpreter with -X importtime and fail
+if cold start goes over budget or help and cached lookups load the HTTP stack.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from weather_api import WeatherService
+from weather_cache import ResponseCache, default_state_path
+from weather_daemon import WeatherDaemon
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time budget for 'weather --help', in milliseconds,
+# excluding interpreter startup (site). Override on slow CI machines.
+BUDGET_MS = float(os.environ.get("WEATHER_STARTUP_BUDGET_MS", "150"))
+
+HTTP_MODULES = ("requests", "urllib3", "charset_normalizer", "idna", "certifi")
+
+
+def run_with_importtime(args, env=None):
+    """Run weather.py in a fresh interpreter, returning (result, {module: us})."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.join(ROOT, "weather.py"), *args],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env={**os.environ, **(env or {})},
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Only top-level entries; nested imports are already in their parent
+        if not name.startswith("  "):
+            imports[name.strip()] = int(cumulative)
+    return result, imports
+
+
+def imported_http_modules(imports):
+    return [name for name in imports if name.split(".")[0] in HTTP_MODULES]
+
+
+def test_help_cold_start_budget():
+    """Test that 'weather --help' stays within its import time budget."""
+    result, imports = run_with_importtime(["--help"])
+    assert result.returncode == 0
+    total_ms = sum(us for name, us in imports.items() if name != "site") / 1000
+    assert total_ms < BUDGET_MS, f"cold start imports took {total_ms:.0f}ms"
+
+
+@pytest.mark.parametrize("command", [["--help"], ["current", "--help"]])
+def test_help_skips_http_stack(command):
+    """Test that help text does not import the HTTP stack."""
+    result, imports = run_with_importtime(command)
+    assert result.returncode == 0
+    assert imported_http_modules(imports) == []
+
+
+def test_cached_lookup_skips_http_stack(isolated_cache_dir):
+    """Test that a fully cached lookup never imports the HTTP stack."""
+    cache = ResponseCache()
+    cache.set(
+        "https://api.zippopotam.us/us/94105",
+        {
+            "places": [
+                {
+                    "place name": "San Francisco",
+                    "state abbreviation": "CA",
+                    "latitude": "37.7864",
+                    "longitude": "-122.3892",
+                }
+            ]
+        },
+    )
+    cache.close()
+
+    result, imports = run_with_importtime(
+        ["where-is", "--zipcode", "94105"],
+        env={"WEATHER_CACHE_DIR": str(isolated_cache_dir)},
+    )
+    assert "94105 is in San Francisco, CA." in result.stdout
+    assert imported_http_modules(imports) == []
+
+
+def test_daemon_lookup_skips_http_stack(isolated_cache_dir):
+    """Test that a lookup served by a running daemon never imports the HTTP stack."""
+    with FakeUpstreams() as upstreams:
+        daemon = WeatherDaemon(upstreams.configure(WeatherService(rate_limits={})))
+        thread = threading.Thread(
+            target=daemon.serve_forever, args=(default_state_path(),), daemon=True
+        )
+        thread.start()
+        try:
+            while not os.path.exists(default_state_path()):
+                time.sleep(0.01)
+            result, imports = run_with_importtime(["current", "--zipcode", "97201"])
+        finally:
+            daemon.shutdown()
+            thread.join()
+            daemon.service.close()
+    assert "It is currently" in result.stdout
+    assert upstreams.counts["weather"] == 1
+    assert imported_http_modules(imports) == []
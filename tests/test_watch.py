@@ -0,0 +1,167 @@
+"""
+Tests for stale-while-revalidate and the watched-location refresher.
+
+These tests verify when cached weather is served, renewed and refetched.
+"""
+
+import threading
+import time
+
+import pytest
+from benchmarks.fake_upstreams import FakeUpstreams
+from click.testing import CliRunner
+from weather import weather
+from weather_api import UpstreamError, WeatherProvider, WeatherService
+from weather_cache import ResponseCache
+from weather_watch import Watchlist, WatchRefresher, parse_location
+
+
+class SlowProvider(WeatherProvider):
+    """Provider answering after a delay without any HTTP."""
+
+    name = "slow"
+
+    def __init__(self, answer, delay):
+        super().__init__()
+        self.answer = answer
+        self.delay = delay
+        self.calls = 0
+
+    def fetch(self, service, lat, lon):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.answer
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Fixture providing a cache backed by a temporary database file."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def test_cache_serves_stale_entries_on_request(cache, mocker):
+    """Test that expired entries are only returned within max_stale."""
+    clock = mocker.patch("weather_cache.time.time", return_value=1000.0)
+    cache.set("key", "value", ttl=60)
+    clock.return_value = 1100.0
+    assert cache.get("key") is None
+    assert cache.get_entry("key", max_stale=30) is None
+    assert cache.get_entry("key", max_stale=60) == ("value", 1060.0)
+
+
+def test_stale_weather_is_served_while_revalidating(cache):
+    """Test that slightly stale weather is returned at once and then renewed."""
+    provider = SlowProvider((70, "clear sky"), delay=0.5)
+    service = WeatherService(cache=cache, providers=[provider])
+    cell, _, _, bounds = service._weather_cell(37.7864, -122.3892)
+    cache.set(service._weather_key(cell), [60, "fog"], ttl=-10, bounds=bounds)
+
+    started = time.perf_counter()
+    assert service.get_weather_by_coordinates(37.7864, -122.3892) == (60, "fog")
+    assert time.perf_counter() - started < 0.3
+    # A second caller during the refresh gets the stale value too
+    assert service.get_weather_by_coordinates(37.7864, -122.3892) == (60, "fog")
+
+    service.close()
+    assert provider.calls == 1
+    assert service.get_weather_by_coordinates(37.7864, -122.3892) == (70, "clear sky")
+    assert service.metrics.counter("revalidations") == 1
+
+
+def test_weather_too_stale_is_refetched(cache):
+    """Test that weather past the stale window is fetched before answering."""
+    provider = SlowProvider((70, "clear sky"), delay=0)
+    service = WeatherService(
+        cache=cache, providers=[provider], stale_while_revalidate=5
+    )
+    cell, _, _, bounds = service._weather_cell(37.7864, -122.3892)
+    cache.set(service._weather_key(cell), [60, "fog"], ttl=-10, bounds=bounds)
+    assert service.get_weather_by_coordinates(37.7864, -122.3892) == (70, "clear sky")
+    assert service.metrics.counter("revalidations") == 0
+
+
+def test_parse_location():
+    """Test that watch list entries are zip codes or LAT,LON pairs."""
+    assert parse_location("94105") == "94105"
+    assert parse_location(" -33.86,151.2 ") == (-33.86, 151.2)
+    for text in ("9410", "abc,def", "95,10", "Springfield"):
+        with pytest.raises(ValueError):
+            parse_location(text)
+
+
+def test_watchlist_roundtrip(tmp_path):
+    """Test that the watch list is saved and loaded with its interval."""
+    path = str(tmp_path / "watch.json")
+    assert Watchlist.load(path) == Watchlist()
+    Watchlist(["94105", "45.5,-122.6"], interval=10).save(path)
+    assert Watchlist.load(path) == Watchlist(["94105", "45.5,-122.6"], 10.0)
+
+
+def test_refresher_renews_entries_before_they_expire(cache, mocker, tmp_path):
+    """Test that the refresher only fetches cells that are about to expire."""
+    path = str(tmp_path / "watch.json")
+    Watchlist(["10001", "45.5,-122.6", "00000"]).save(path)
+    clock = mocker.patch("weather_api.time.time", return_value=600 * 1000 + 100)
+    with FakeUpstreams() as upstreams:
+        service = upstreams.configure(WeatherService(cache=cache, rate_limits={}))
+        refresher = WatchRefresher(service, path)
+
+        results = refresher.refresh_once()
+        assert isinstance(results["10001"], tuple)
+        assert isinstance(results["45.5,-122.6"], tuple)
+        assert isinstance(results["00000"], LookupError)
+        assert upstreams.counts["weather"] == 1
+
+        # Still fresh: nothing to do
+        clock.return_value = 600 * 1000 + 500
+        refresher.refresh_once()
+        assert upstreams.counts["weather"] == 1
+
+        # About to expire: renewed ahead of time, through the next bucket
+        clock.return_value = 600 * 1000 + 560
+        refresher.refresh_once()
+        assert upstreams.counts["weather"] == 2
+        clock.return_value = 600 * 1001 + 100
+        refresher.refresh_once()
+        assert upstreams.counts["weather"] == 2
+        service.close()
+    # Known zip codes are resolved once; unknown ones are retried every check
+    assert upstreams.counts["zipcode"] == 1 + 4
+
+
+def test_refresher_runs_in_background(mocker, tmp_path):
+    """Test that a started refresher checks the watch list until stopped."""
+    path = str(tmp_path / "watch.json")
+    Watchlist(["1.0,2.0"], interval=0.01).save(path)
+    checked = threading.Event()
+    service = mocker.Mock()
+    service.get_weather_for_coordinates.side_effect = lambda points, **kwargs: (
+        checked.set() or [UpstreamError("down")]
+    )
+    refresher = WatchRefresher(service, path).start()
+    assert checked.wait(2)
+    refresher.stop()
+    assert service.get_weather_for_coordinates.call_args.args[0] == [(1.0, 2.0)]
+
+
+def test_watch_commands():
+    """Test adding, listing and removing watched locations."""
+    runner = CliRunner()
+    result = runner.invoke(weather, ["watch", "list"])
+    assert "No locations are being watched." in result.output
+
+    result = runner.invoke(weather, ["watch", "add", "94105", "-33.86,151.2"])
+    assert "Watching 2 locations." in result.output
+    runner.invoke(weather, ["watch", "add", "94105"])
+    runner.invoke(weather, ["watch", "interval", "15"])
+    result = runner.invoke(weather, ["watch", "list"])
+    assert result.output == "94105\n-33.86,151.2\nChecked every 15 seconds.\n"
+
+    result = runner.invoke(weather, ["watch", "remove", "-33.86,151.2"])
+    assert "Watching 1 locations." in result.output
+
+    result = runner.invoke(weather, ["watch", "add", "Springfield"])
+    assert result.exit_code == 2
+    assert "neither a zip code nor a LAT,LON pair" in result.output
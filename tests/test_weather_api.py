@@ -0,0 +1,373 @@
+"""
+Tests for the WeatherService API layer.
+
+These tests verify how upstream payloads are parsed into results.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from weather_api import (
+    AsyncWeatherService,
+    Location,
+    LocationNotFound,
+    UpstreamError,
+    WeatherError,
+    WeatherService,
+    close_shared_service,
+    shared_service,
+)
+from weather_cache import ResponseCache
+
+
+@pytest.fixture
+def mock_get(mocker):
+    """Fixture patching requests.get with a configurable JSON response."""
+
+    def respond(payload, status_code=200):
+        response = mocker.Mock(status_code=status_code)
+        response.content = json.dumps(payload).encode()
+        return mocker.patch("requests.Session.get", return_value=response)
+
+    return respond
+
+
+def test_resolve_location_by_zipcode(mock_get):
+    """Test that a zippopotam.us payload resolves to a Location."""
+    mock_get(
+        {
+            "places": [
+                {
+                    "place name": "Beverly Hills",
+                    "state abbreviation": "CA",
+                    "latitude": "34.0901",
+                    "longitude": "-118.4065",
+                }
+            ]
+        }
+    )
+    location = WeatherService().resolve_location("90210")
+    assert location == Location("Beverly Hills", "CA", 34.0901, -118.4065)
+
+
+def test_resolve_location_by_ip(mock_get):
+    """Test that an ip-api.com payload resolves to a Location with a timezone."""
+    mock_get(
+        {
+            "status": "success",
+            "city": "Portland",
+            "regionName": "Oregon",
+            "lat": 45.52,
+            "lon": -122.68,
+            "timezone": "America/Los_Angeles",
+        }
+    )
+    location = WeatherService().resolve_location()
+    assert location == Location(
+        "Portland", "Oregon", 45.52, -122.68, "America/Los_Angeles"
+    )
+
+
+def test_resolve_location_not_found(mock_get):
+    """Test that an unknown zipcode resolves to None."""
+    mock_get({}, status_code=404)
+    assert WeatherService().resolve_location("00000") is None
+
+
+def test_legacy_lookups_share_resolution(mock_get):
+    """Test that the tuple-returning lookups are derived from resolve_location."""
+    get = mock_get(
+        {
+            "status": "success",
+            "city": "Austin",
+            "regionName": "Texas",
+            "lat": 30.2,
+            "lon": -97.7,
+        }
+    )
+    service = WeatherService()
+    assert service.get_current_location() == ("Austin", "Texas")
+    assert service.get_current_coordinates() == (30.2, -97.7)
+    assert get.call_count == 2
+
+
+def test_sessions_pooled_per_host():
+    """Test that each upstream host gets one reusable session."""
+    with WeatherService() as service:
+        weather = service._session_for(service.weather_base_url)
+        assert service._session_for(service.weather_base_url + "?x=1") is weather
+        assert service._session_for(service.zipcode_url) is not weather
+
+
+def test_session_pool_and_retry_configuration():
+    """Test that pool size overrides and retry policy reach the adapter."""
+    service = WeatherService(
+        retries=5, pool_size=4, pool_sizes={"api.open-meteo.com": 32}
+    )
+    weather = service._session_for(service.weather_base_url).get_adapter(
+        service.weather_base_url
+    )
+    zipcode = service._session_for(service.zipcode_url).get_adapter(service.zipcode_url)
+    assert weather._pool_maxsize == 32
+    assert zipcode._pool_maxsize == 4
+    assert weather.max_retries.total == 5
+    assert 429 in weather.max_retries.status_forcelist
+    assert weather.max_retries.respect_retry_after_header
+    service.close()
+
+
+def test_requests_use_separate_timeouts(mock_get):
+    """Test that connect and read timeouts are passed separately."""
+    get = mock_get({"status": "fail"})
+    WeatherService(connect_timeout=1.5, read_timeout=7).resolve_location()
+    assert get.call_args.kwargs["timeout"] == (1.5, 7)
+
+
+def test_async_service_fans_out_concurrently(mocker):
+    """Test that independent async lookups overlap instead of running serially."""
+
+    def slow_weather(self, lat, lon):
+        time.sleep(0.2)
+        return (int(lat), "clear sky")
+
+    mocker.patch.object(WeatherService, "get_weather_by_coordinates", slow_weather)
+
+    async def run():
+        async with AsyncWeatherService(max_workers=5) as service:
+            return await service.gather_weather([(i, 0) for i in range(5)])
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    assert results == [(i, "clear sky") for i in range(5)]
+    assert elapsed < 0.6
+
+
+def test_async_get_current(mocker):
+    """Test that get_current chains location resolution into the weather lookup."""
+    location = Location("Seattle", "WA", 47.6, -122.3)
+    mocker.patch.object(WeatherService, "resolve_location", return_value=location)
+    mock_weather = mocker.patch.object(
+        WeatherService, "get_weather_by_coordinates", return_value=(50, "fog")
+    )
+
+    async def run():
+        async with AsyncWeatherService() as service:
+            return await service.get_current("98101")
+
+    assert asyncio.run(run()) == (location, (50, "fog"))
+    mock_weather.assert_called_once_with(47.6, -122.3)
+
+
+def test_async_resolve_city_and_coordinates(mocker):
+    """Test that city and coordinate lookups are passed to the service."""
+    location = Location("Seattle", "WA", 47.6, -122.3)
+    resolve = mocker.patch.object(
+        WeatherService, "resolve_location", return_value=location
+    )
+
+    async def run():
+        async with AsyncWeatherService() as service:
+            return (
+                await service.resolve_location(city="Seattle, WA"),
+                await service.resolve_location(coordinates=(47.6, -122.3)),
+            )
+
+    assert asyncio.run(run()) == (location, location)
+    assert resolve.call_args_list == [
+        mocker.call(city="Seattle, WA"),
+        mocker.call(coordinates=(47.6, -122.3)),
+    ]
+
+
+def test_weather_for_coordinates_splits_multi_location_response(mock_get):
+    """Test that many points share one request and map back in order."""
+    get = mock_get(
+        [
+            {"current": {"temperature_2m": 50.2, "weather_code": 0}},
+            {"current": {"temperature_2m": 61.9, "weather_code": 3}},
+            {"current": {}},
+        ]
+    )
+    results = WeatherService(grid_precision=None).get_weather_for_coordinates(
+        [(1.0, 2.0), (3.0, 4.0), (5.0, 6.0)]
+    )
+    assert results[:2] == [(50, "clear sky"), (61, "overcast")]
+    assert isinstance(results[2], UpstreamError)
+    get.assert_called_once()
+    assert get.call_args.kwargs["params"]["latitude"] == "1.0,3.0,5.0"
+    assert get.call_args.kwargs["params"]["longitude"] == "2.0,4.0,6.0"
+
+
+def test_weather_for_coordinates_chunks_requests(mock_get):
+    """Test that points are split into chunk_size requests."""
+    get = mock_get({"current": {"temperature_2m": 40, "weather_code": 45}})
+    results = WeatherService().get_weather_for_coordinates(
+        [(1, 1), (2, 2), (3, 3)], chunk_size=1
+    )
+    assert results == [(40, "fog")] * 3
+    assert get.call_count == 3
+
+
+def test_weather_for_coordinates_reports_failed_chunk(mock_get):
+    """Test that a failed request marks every point in its chunk."""
+    mock_get({"error": True}, status_code=400)
+    results = WeatherService().get_weather_for_coordinates([(1, 1), (2, 2)])
+    assert all(isinstance(r, UpstreamError) for r in results)
+
+
+def test_weather_for_coordinates_uses_point_cache(mock_get, tmp_path):
+    """Test that cached points are skipped and fetched points are cached."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    service = WeatherService(cache=cache, grid_precision=None)
+    get = mock_get([{"current": {"temperature_2m": 70, "weather_code": 1}}] * 2)
+    service.get_weather_for_coordinates([(1.0, 1.0), (2.0, 2.0)])
+
+    get = mock_get({"current": {"temperature_2m": 55, "weather_code": 2}})
+    results = service.get_weather_for_coordinates([(1.0, 1.0), (3.0, 3.0)])
+    assert results == [(70, "mainly clear"), (55, "partly cloudy")]
+    assert get.call_args.kwargs["params"]["latitude"] == "3.0"
+    assert service.get_weather_by_coordinates(2.0, 2.0) == (70, "mainly clear")
+    get.assert_called_once()
+    cache.close()
+
+
+def test_nearby_points_share_a_grid_cell(mock_get, tmp_path):
+    """Test that points in one grid cell share a lookup at the cell's center."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    service = WeatherService(cache=cache)
+    get = mock_get({"current": {"temperature_2m": 64, "weather_code": 0}})
+    # Two San Francisco zip codes about a kilometre apart
+    assert service.get_weather_by_coordinates(37.7864, -122.3892) == (64, "clear sky")
+    assert service.get_weather_by_coordinates(37.7793, -122.4193) == (64, "clear sky")
+    get.assert_called_once()
+    assert get.call_args.kwargs["params"]["latitude"] == 37.771
+    assert get.call_args.kwargs["params"]["longitude"] == -122.4097
+    cache.close()
+
+
+def test_batch_requests_each_cell_once(mock_get):
+    """Test that batch points in one cell are fetched as one location."""
+    get = mock_get(
+        [
+            {"current": {"temperature_2m": 64, "weather_code": 0}},
+            {"current": {"temperature_2m": 80, "weather_code": 1}},
+        ]
+    )
+    results = WeatherService().get_weather_for_coordinates(
+        [(37.7864, -122.3892), (34.0901, -118.4065), (37.7793, -122.4193)]
+    )
+    assert results == [(64, "clear sky"), (80, "mainly clear"), (64, "clear sky")]
+    assert get.call_args.kwargs["params"]["latitude"] == "37.771,34.0796"
+
+
+def test_weather_expires_with_its_time_bucket(mock_get, mocker, tmp_path):
+    """Test that cached weather lives until the end of the current bucket."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    cache_set = mocker.spy(cache, "set")
+    clock = mocker.patch("weather_api.time.time", return_value=600 * 1000 + 300)
+    mock_get({"current": {"temperature_2m": 64, "weather_code": 0}})
+    service = WeatherService(cache=cache)
+    service.get_weather_by_coordinates(37.7864, -122.3892)
+    assert cache_set.call_args.args[2] == 300
+
+    # Weather fetched just before a bucket ends also covers the next one
+    clock.return_value = 600 * 1000 + 590
+    service.get_weather_for_coordinates([(34.0901, -118.4065)])
+    assert cache_set.call_args.args[2] == 610
+    cache.close()
+
+
+def test_cached_weather_in_box(mock_get, tmp_path):
+    """Test that cached cells can be found by bounding box."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    service = WeatherService(cache=cache)
+    mock_get({"current": {"temperature_2m": 64, "weather_code": 0}})
+    service.get_weather_by_coordinates(37.7864, -122.3892)
+    service.get_weather_by_coordinates(34.0901, -118.4065)
+    # The San Francisco Bay Area
+    assert service.cached_weather_in_box(37.2, -122.6, 38.0, -121.8) == {
+        "9q8yy": (64, "clear sky")
+    }
+    assert len(service.cached_weather_in_box(30, -125, 40, -115)) == 2
+    cache.close()
+
+
+def test_failures_are_logged_not_printed(mock_get, capsys, caplog):
+    """Test that a failed lookup returns None and logs instead of printing."""
+    mock_get({}, status_code=500)
+    service = WeatherService(rate_limits={}, retries=0)
+    assert service.get_forecast(1, 2) is None
+    assert capsys.readouterr().out == ""
+    assert "Error getting forecast: Open-Meteo returned no forecast" in caplog.text
+    assert service.metrics.counter("errors", operation="get_forecast") == 1
+
+
+def test_raise_errors(mock_get, mocker):
+    """Test that raise_errors turns failed lookups into WeatherError."""
+    mock_get({}, status_code=404)
+    service = WeatherService(rate_limits={}, retries=0, raise_errors=True)
+    with pytest.raises(LocationNotFound, match="00000"):
+        service.resolve_location("00000")
+    with pytest.raises(UpstreamError):
+        service.get_forecast(1, 2)
+    mocker.patch("requests.Session.get", side_effect=OSError("unreachable"))
+    with pytest.raises(WeatherError) as raised:
+        service.resolve_location()
+    assert isinstance(raised.value.__cause__, OSError)
+
+
+def test_map_returns_errors_as_results(mocker):
+    """Test that map runs calls concurrently and yields exceptions in order."""
+    service = WeatherService(max_workers=3)
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def lookup(lat, lon):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        if lat < 0:
+            raise UpstreamError(f"no data for {lat}")
+        return (lat, lon)
+
+    points = [(lat, 0) for lat in (1, -2, 3, 4, 5, 6, 7, 8)]
+    results = list(service.map(lookup, points))
+    assert results[0] == (1, 0) and results[2:] == points[2:]
+    assert isinstance(results[1], UpstreamError)
+    assert peak == 3
+
+    unordered = list(service.map(str, range(10), ordered=False))
+    assert sorted(unordered, key=int) == [str(i) for i in range(10)]
+    service.close()
+
+
+def test_shared_service_is_process_wide(tmp_path):
+    """Test that every thread gets the same service until it is closed."""
+    services = []
+    threads = [
+        threading.Thread(target=lambda: services.append(shared_service()))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len({id(service) for service in services}) == 1
+        assert services[0].raise_errors and services[0].cache is not None
+        with pytest.raises(RuntimeError):
+            shared_service(raise_errors=False)
+    finally:
+        close_shared_service()
+    assert shared_service(cache=None) is not services[0]
+    close_shared_service()
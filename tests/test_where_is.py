@@ -4,10 +4,15 @@ Tests for the 'where-is' command of the Weather CLI application.
 These tests verify the functionality of the location lookup features.
 """
 
+import json
+
 import pytest
 from click.testing import CliRunner
 from weather import weather
-from weather_api import WeatherService
+from weather_api import Location, WeatherService
+
+SAN_FRANCISCO = Location("San Francisco", "CA", 37.7864, -122.3892)
+SEATTLE = Location("Seattle", "WA", 47.6062, -122.3321, "America/Los_Angeles")
 
 
 @pytest.fixture
@@ -18,9 +23,8 @@ def runner():
 
 def test_where_is_with_valid_zipcode(runner, mocker):
     """Test where-is command with a valid zipcode."""
-    # Mock the WeatherService.get_location_by_zipcode method
-    mock_location = mocker.patch.object(WeatherService, "get_location_by_zipcode")
-    mock_location.return_value = ("San Francisco", "CA")
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_location.return_value = SAN_FRANCISCO
 
     result = runner.invoke(weather, ["where-is", "--zipcode", "94105"])
     assert result.exit_code == 0
@@ -30,20 +34,18 @@ def test_where_is_with_valid_zipcode(runner, mocker):
 
 def test_where_is_current_location(runner, mocker):
     """Test where-is command without zipcode (current location)."""
-    # Mock the WeatherService.get_current_location method
-    mock_location = mocker.patch.object(WeatherService, "get_current_location")
-    mock_location.return_value = ("Seattle", "WA")
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
+    mock_location.return_value = SEATTLE
 
     result = runner.invoke(weather, ["where-is"])
     assert result.exit_code == 0
     assert "Your current location is Seattle, WA" in result.output
-    mock_location.assert_called_once()
+    mock_location.assert_called_once_with(None)
 
 
 def test_where_is_with_invalid_zipcode(runner, mocker):
     """Test where-is command with an invalid zipcode."""
-    # Mock the WeatherService.get_location_by_zipcode method
-    mock_location = mocker.patch.object(WeatherService, "get_location_by_zipcode")
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
     mock_location.return_value = None
 
     result = runner.invoke(weather, ["where-is", "--zipcode", "00000"])
@@ -54,8 +56,7 @@ def test_where_is_with_invalid_zipcode(runner, mocker):
 
 def test_where_is_current_location_failure(runner, mocker):
     """Test where-is command when current location cannot be determined."""
-    # Mock the WeatherService.get_current_location method
-    mock_location = mocker.patch.object(WeatherService, "get_current_location")
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
     mock_location.return_value = None
 
     result = runner.invoke(weather, ["where-is"])
@@ -66,11 +67,44 @@ def test_where_is_current_location_failure(runner, mocker):
 
 def test_where_is_api_error(runner, mocker):
     """Test where-is command when API throws an error."""
-    # Mock the WeatherService.get_location_by_zipcode method to raise an exception
-    mock_location = mocker.patch.object(WeatherService, "get_location_by_zipcode")
+    mock_location = mocker.patch.object(WeatherService, "resolve_location")
     mock_location.side_effect = Exception("API Error")
 
     result = runner.invoke(weather, ["where-is", "--zipcode", "94105"])
     assert result.exit_code == 0  # CLI handles errors gracefully
     assert "Error: API Error" in result.output
     mock_location.assert_called_once_with("94105")
+
+
+def test_where_is_json(runner, mocker):
+    """Test that --format json prints the place as a JSON array."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=SEATTLE)
+
+    result = runner.invoke(
+        weather, ["where-is", "--zipcode", "98101", "--format", "json"]
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.output) == [
+        {
+            "zipcode": "98101",
+            "city": "Seattle",
+            "state": "WA",
+            "lat": 47.6062,
+            "lon": -122.3321,
+            "timezone": "America/Los_Angeles",
+            "error": None,
+        }
+    ]
+
+
+def test_where_is_csv_error(runner, mocker):
+    """Test that a failed lookup becomes a CSV row with its error."""
+    mocker.patch.object(WeatherService, "resolve_location", return_value=None)
+
+    result = runner.invoke(
+        weather, ["where-is", "--zipcode", "00000", "--format", "csv"]
+    )
+    assert result.output.splitlines() == [
+        "zipcode,city,state,lat,lon,timezone,error",
+        "00000,,,,,,location not found",
+    ]
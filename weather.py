@@ -5,73 +5,710 @@ Weather CLI Application
 A command-line interface for getting weather information and location data.
 """
 
+import logging
+import math
+import os
+import time
+
 import click
-from weather_api import WeatherService
+from weather_api import MAX_FORECAST_DAYS, WeatherService
+from weather_cache import (
+    ResponseCache,
+    default_gazetteer_path,
+    default_places_path,
+    default_state_path,
+)
+from weather_metrics import Metrics
+
+# Batch, daemon and gazetteer support is imported inside the commands that
+# use it, keeping startup for help text and single lookups short
+
+
+class EchoHandler(logging.Handler):
+    """Show log records, such as failed lookups, on stderr through click."""
+
+    def emit(self, record):
+        click.echo(self.format(record), err=True)
+
+
+def cache_options(command):
+    """Add the --no-cache and --refresh options shared by lookup commands."""
+    command = click.option(
+        "--refresh",
+        is_flag=True,
+        help="Ignore cached responses and fetch fresh data (updates the cache)",
+    )(command)
+    command = click.option(
+        "--no-cache", is_flag=True, help="Do not read or write the response cache"
+    )(command)
+    return command
+
+
+def make_service(no_cache=False, refresh=False, use_daemon=True, **kwargs):
+    """Build a WeatherService configured from the cache options.
+
+    When a 'weather serve' daemon is running, and the cache options do not
+    ask to bypass its shared cache, lookups are forwarded to it instead,
+    falling back to a WeatherService of our own if it has gone away.
+    Services share the Metrics collected by --profile and --metrics-file.
+    """
+    ctx = click.get_current_context(silent=True)
+    metrics = ctx.find_object(Metrics) if ctx is not None else None
+    if metrics is not None:
+        kwargs.setdefault("metrics", metrics)
+
+    def direct():
+        cache = None if no_cache else ResponseCache()
+        if not no_cache:
+            from weather_places import PlaceIndex
+
+            kwargs.setdefault("places", PlaceIndex())
+        gazetteer = None
+        if os.path.exists(default_gazetteer_path()):
+            from weather_gazetteer import Gazetteer
+
+            gazetteer = Gazetteer(default_gazetteer_path())
+        return WeatherService(
+            cache=cache, refresh=refresh, gazetteer=gazetteer, **kwargs
+        )
+
+    if (
+        use_daemon
+        and not (no_cache or refresh)
+        and os.path.exists(default_state_path())
+    ):
+        from weather_daemon import DaemonClient
+
+        client = DaemonClient.discover(fallback=direct, **kwargs)
+        if client is not None:
+            return client
+    return direct()
+
+
+class Coordinates(click.ParamType):
+    """A 'LAT,LON' pair of decimal degrees, converted to a (lat, lon) tuple."""
+
+    name = "lat,lon"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, tuple):
+            return value
+        try:
+            lat, lon = (float(part) for part in value.split(","))
+        except ValueError:
+            self.fail(f"{value} is not a LAT,LON pair", param, ctx)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            self.fail(f"{value} is out of range", param, ctx)
+        return (lat, lon)
+
+
+def complete_city(ctx, param, incomplete):
+    """Complete --city from the place index only, never the network."""
+    if not os.path.exists(default_places_path()):
+        return []
+    from weather_places import PlaceIndex
+
+    index = PlaceIndex()
+    try:
+        return [place.label for place in index.complete(incomplete)]
+    finally:
+        index.close()
+
+
+def location_options(command):
+    """Add the --city and --coords options that stand in for --zipcode."""
+    command = click.option(
+        "--coords",
+        type=Coordinates(),
+        help="Coordinates to look up, as LAT,LON (e.g. 45.52,-122.68)",
+    )(command)
+    command = click.option(
+        "--city",
+        shell_complete=complete_city,
+        help="City to look up, optionally with its state or country "
+        '(e.g. "Portland, OR")',
+    )(command)
+    return command
+
+
+def exclusive(**options):
+    """Fail unless at most one of the named options was given."""
+    given = [f"--{name.replace('_', '-')}" for name, value in options.items() if value]
+    if len(given) > 1:
+        raise click.UsageError(f"{' and '.join(given)} are mutually exclusive")
+
+
+def resolve(weather_service, zipcode=None, city=None, coords=None):
+    """Resolve whichever of --zipcode, --city and --coords was given."""
+    if city:
+        return weather_service.resolve_location(city=city)
+    if coords:
+        return weather_service.resolve_location(coordinates=coords)
+    return weather_service.resolve_location(zipcode)
+
+
+def format_option(command):
+    """Add the --format option shared by lookup commands."""
+    return click.option(
+        "--format",
+        "output_format",
+        type=click.Choice(["text", "json", "jsonl", "csv"]),
+        default="text",
+        show_default=True,
+        help="Output format: sentences, a JSON array, JSON lines or CSV",
+    )(command)
+
+
+def echo_records(records, record_type, output_format, describe):
+    """Print records as they arrive in the chosen output format."""
+    from weather_output import format_records
+
+    for line in format_records(records, record_type, output_format, describe):
+        click.echo(line)
+
+
+def place_name(record):
+    """A record's 'City, ST', or its coordinates when no place is named."""
+    if record.city is None:
+        return f"{record.lat},{record.lon}"
+    return f"{record.city}, {record.state}" if record.state else record.city
+
+
+def describe_weather(record, query=None):
+    """Render a WeatherRecord as the sentence printed by 'current'.
+
+    query is the --city or --coords text the record was looked up by.
+    """
+    if record.error is None:
+        return (
+            f"It is currently {record.temperature}ºF, and {record.condition} "
+            f"in {place_name(record)}."
+        )
+    if query:
+        return f"Could not get weather information for {query}."
+    if record.zipcode:
+        return f"Could not get weather information for zipcode {record.zipcode}."
+    return "Could not get weather information for your current location."
+
+
+def describe_place(record, city=None, coords=None):
+    """Render a PlaceRecord as the sentence printed by 'where-is'."""
+    if record.error is None:
+        if city:
+            return f"{place_name(record)} is at {record.lat},{record.lon}."
+        if coords:
+            if record.city is None:
+                return f"There is no known place near {place_name(record)}."
+            return f"{record.lat},{record.lon} is near {place_name(record)}."
+        if record.zipcode:
+            return f"{record.zipcode} is in {place_name(record)}."
+        return f"Your current location is {place_name(record)}."
+    if city:
+        return f"Could not find location information for {city}."
+    if coords:
+        return f"Could not find location information for {coords[0]},{coords[1]}."
+    if record.zipcode:
+        return f"Could not find location information for zipcode {record.zipcode}."
+    return "Could not determine your current location."
+
+
+def current_batch(zipcode_file, output_format, order, concurrency, no_cache, refresh):
+    """Stream weather for every zip code in zipcode_file."""
+    from weather_batch import read_zipcodes, run_batch
+    from weather_output import WeatherRecord
+
+    weather_service = make_service(no_cache, refresh, pool_size=concurrency)
+    with weather_service:
+        records = run_batch(
+            weather_service,
+            read_zipcodes(zipcode_file),
+            ordered=order == "input",
+            concurrency=concurrency,
+        )
+        echo_records(records, WeatherRecord, output_format, describe_weather)
 
 
 @click.group()
-def weather():
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Print a timing breakdown of upstream requests after the command",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False),
+    envvar="WEATHER_METRICS_FILE",
+    help="Write metrics in Prometheus text format to this file after the command",
+)
+@click.pass_context
+def weather(ctx, profile, metrics_file):
     """Weather CLI application for getting current weather and location information."""
-    pass
+    logger = logging.getLogger("weather")
+    if not any(isinstance(handler, EchoHandler) for handler in logger.handlers):
+        logger.addHandler(EchoHandler())
+    if not (profile or metrics_file):
+        return
+    metrics = ctx.ensure_object(Metrics)
+    started = time.perf_counter()
+
+    def report():
+        elapsed = time.perf_counter() - started
+        metrics.observe("command", elapsed, command=ctx.invoked_subcommand)
+        if profile:
+            click.echo(metrics.format_profile(), err=True)
+        if metrics_file:
+            metrics.write_prometheus(metrics_file)
+
+    ctx.call_on_close(report)
 
 
 @weather.command()
 @click.option("--zipcode", help="Zip code to get location information for")
-def where_is(zipcode):
+@location_options
+@format_option
+@cache_options
+def where_is(zipcode, city, coords, output_format, no_cache, refresh):
     """Display the city and state for a given location."""
-    weather_service = WeatherService()
+    from functools import partial
+
+    from weather_output import PlaceRecord
+
+    exclusive(zipcode=zipcode, city=city, coords=coords)
+    weather_service = make_service(no_cache, refresh)
 
     try:
-        if zipcode:
-            location_info = weather_service.get_location_by_zipcode(zipcode)
-            if location_info:
-                city, state = location_info
-                click.echo(f"{zipcode} is in {city}, {state}.")
-            else:
-                click.echo(
-                    f"Could not find location information for zipcode {zipcode}."
-                )
-        else:
-            location_info = weather_service.get_current_location()
-            if location_info:
-                city, state = location_info
-                click.echo(f"Your current location is {city}, {state}.")
-            else:
-                click.echo("Could not determine your current location.")
+        location = resolve(weather_service, zipcode, city, coords)
+        record = PlaceRecord.from_location(zipcode, location)
     except Exception as e:
-        click.echo(f"Error: {str(e)}")
+        if output_format == "text":
+            click.echo(f"Error: {str(e)}")
+            return
+        record = PlaceRecord(zipcode, error=str(e))
+    describe = partial(describe_place, city=city, coords=coords)
+    echo_records([record], PlaceRecord, output_format, describe)
 
 
 @weather.command()
 @click.option("--zipcode", help="Zip code to get weather information for")
-def current(zipcode):
+@click.option(
+    "--zipcode-file",
+    type=click.File("r"),
+    help="File with one zip code per line to look up in batch ('-' for stdin)",
+)
+@location_options
+@format_option
+@click.option(
+    "--order",
+    type=click.Choice(["input", "completion"]),
+    default="input",
+    show_default=True,
+    help="Emit batch results in input order or as soon as each completes",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="Maximum number of batch lookups in flight",
+)
+@cache_options
+def current(
+    zipcode,
+    zipcode_file,
+    city,
+    coords,
+    output_format,
+    order,
+    concurrency,
+    no_cache,
+    refresh,
+):
     """Display the current temperature and weather conditions for a given location."""
-    weather_service = WeatherService()
+    from functools import partial
+
+    from weather_output import WeatherRecord
+
+    exclusive(zipcode=zipcode, zipcode_file=zipcode_file, city=city, coords=coords)
+    if zipcode_file is not None:
+        current_batch(
+            zipcode_file, output_format, order, concurrency, no_cache, refresh
+        )
+        return
+
+    weather_service = make_service(no_cache, refresh)
 
     try:
-        if zipcode:
-            weather_info = weather_service.get_weather_by_zipcode(zipcode)
-            location_info = weather_service.get_location_by_zipcode(zipcode)
-        else:
-            weather_info = weather_service.get_current_weather()
-            location_info = weather_service.get_current_location()
+        location = resolve(weather_service, zipcode, city, coords)
+        weather_info = None
+        if location:
+            weather_info = weather_service.get_weather_by_coordinates(
+                location.lat, location.lon
+            )
+        record = WeatherRecord.from_lookup(zipcode, location, weather_info)
+    except Exception as e:
+        if output_format == "text":
+            click.echo(f"Error: {str(e)}")
+            return
+        record = WeatherRecord(zipcode, error=str(e))
+    query = city or (coords and f"{coords[0]},{coords[1]}")
+    describe = partial(describe_weather, query=query)
+    echo_records([record], WeatherRecord, output_format, describe)
 
-        if weather_info and location_info:
-            temperature, condition = weather_info
-            city, state = location_info
-            click.echo(
-                f"It is currently {temperature}ºF, and {condition} in {city}, {state}."
+
+def format_temperature(value):
+    return "n/a" if math.isnan(value) else f"{round(value)}ºF"
+
+
+def local_time(timestamp, utc_offset):
+    """Convert a forecast timestamp to wall-clock time at the forecast location."""
+    from datetime import datetime, timezone
+
+    return datetime.fromtimestamp(timestamp + utc_offset, tz=timezone.utc)
+
+
+@weather.command()
+@click.option("--zipcode", help="Zip code to get the forecast for")
+@click.option(
+    "--days",
+    type=click.IntRange(1, MAX_FORECAST_DAYS),
+    default=7,
+    show_default=True,
+    help="Number of days to forecast",
+)
+@click.option("--hourly", is_flag=True, help="Also show the forecast for every hour")
+@cache_options
+def forecast(zipcode, days, hourly, no_cache, refresh):
+    """Display the daily forecast for a given location."""
+    # The daemon does not serve forecasts; fetching them here stores them in
+    # the shared cache, where the daemon's current lookups find them too
+    weather_service = make_service(no_cache, refresh, use_daemon=False)
+
+    try:
+        location = weather_service.resolve_location(zipcode)
+        result = None
+        if location:
+            result = weather_service.get_forecast(
+                location.lat, location.lon, days, hourly
             )
-        else:
+
+        if not result:
             if zipcode:
-                click.echo(f"Could not get weather information for zipcode {zipcode}.")
+                click.echo(f"Could not get a forecast for zipcode {zipcode}.")
             else:
+                click.echo("Could not get a forecast for your current location.")
+            return
+
+        click.echo(f"Forecast for {location.city}, {location.state}:")
+        condition = weather_service.weather_code_to_condition
+        hour = 0
+        for day in range(len(result)):
+            date = local_time(result.daily_time[day], result.utc_offset)
+            click.echo(
+                f"{date:%a %b %d}: high {format_temperature(result.daily_max[day])}, "
+                f"low {format_temperature(result.daily_min[day])}, "
+                f"{condition(result.daily_code[day])}"
+            )
+            while hourly and hour < len(result.hourly_time):
+                when = local_time(result.hourly_time[hour], result.utc_offset)
+                if when.date() != date.date():
+                    break
                 click.echo(
-                    "Could not get weather information for your current location."
+                    f"  {when:%H:%M} "
+                    f"{format_temperature(result.hourly_temperature[hour])}, "
+                    f"{condition(result.hourly_code[hour])}"
                 )
+                hour += 1
     except Exception as e:
         click.echo(f"Error: {str(e)}")
 
 
+def describe_history(record):
+    """Render a HistoryRecord as one line of 'history' output."""
+    precipitation = (
+        "n/a" if record.precipitation is None else f"{record.precipitation:.2f} in"
+    )
+    return (
+        f"{record.period}: low {format_degrees(record.low)}, "
+        f"high {format_degrees(record.high)}, mean {format_degrees(record.mean)}, "
+        f"precipitation {precipitation}, degree-days "
+        f"{record.heating_degree_days:g} heating / "
+        f"{record.cooling_degree_days:g} cooling"
+    )
+
+
+def format_degrees(value):
+    return "n/a" if value is None else f"{round(value)}ºF"
+
+
+@weather.command()
+@click.option("--zipcode", help="Zip code to get past weather for")
+@click.option(
+    "--start",
+    type=click.DateTime(["%Y-%m-%d"]),
+    required=True,
+    help="First day (YYYY-MM-DD)",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(["%Y-%m-%d"]),
+    required=True,
+    help="Last day (YYYY-MM-DD)",
+)
+@click.option(
+    "--by",
+    "period",
+    type=click.Choice(["day", "week", "month", "year"]),
+    default="day",
+    show_default=True,
+    help="Summarize the days of each period",
+)
+@click.option(
+    "--base",
+    type=float,
+    default=65.0,
+    show_default=True,
+    help="Base temperature (ºF) for heating and cooling degree-days",
+)
+@format_option
+@cache_options
+def history(zipcode, start, end, period, base, output_format, no_cache, refresh):
+    """Display past daily weather for a given location.
+
+    Days are kept in a local store, so repeated and overlapping queries only
+    fetch the days not looked up before.
+    """
+    from weather_history import HistoryStore
+    from weather_output import HistoryRecord
+
+    start, end = start.date(), end.date()
+    if start > end:
+        raise click.BadParameter("must not be before --start", param_hint="--end")
+    store = None if no_cache else HistoryStore()
+    weather_service = make_service(no_cache, refresh, use_daemon=False, history=store)
+    # Messages would corrupt structured output, so they go to stderr there
+    err = output_format != "text"
+
+    try:
+        location = weather_service.resolve_location(zipcode)
+        result = None
+        if location:
+            result = weather_service.get_history(location.lat, location.lon, start, end)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=err)
+        return
+
+    if not result:
+        if zipcode:
+            click.echo(f"Could not get past weather for zipcode {zipcode}.", err=err)
+        else:
+            click.echo("Could not get past weather for your current location.", err=err)
+        return
+    if output_format == "text":
+        click.echo(f"Weather history for {location.city}, {location.state}:")
+    records = result.aggregate(period, base)
+    echo_records(records, HistoryRecord, output_format, describe_history)
+
+
+@weather.command()
+@click.option("--host", default="127.0.0.1", show_default=True, help="Address to bind")
+@click.option(
+    "--port", default=0, show_default=True, help="Port to bind (0 picks a free port)"
+)
+def serve(host, port):
+    """Run a local daemon that shares a warm service between weather commands.
+
+    While it runs, other weather commands on this host send their lookups to
+    it, sharing its connection pool and cache, and identical concurrent
+    lookups are fetched once. Watched locations are kept fresh as well.
+    """
+    import signal
+
+    from weather_daemon import WeatherDaemon
+    from weather_watch import WatchRefresher
+
+    weather_service = make_service(use_daemon=False)
+    daemon = WeatherDaemon(weather_service, host, port)
+    refresher = WatchRefresher(weather_service).start()
+    # Stop on SIGTERM (kill, systemd) as on Ctrl-C, removing the state file
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    click.echo(f"Serving weather lookups on {daemon.url}")
+    try:
+        daemon.serve_forever(default_state_path())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        refresher.stop()
+        weather_service.close()
+
+
+@weather.command()
+def quota():
+    """Display how much of each upstream API's rate limit is in use.
+
+    Limits are shared by every weather process on this host; requests that
+    would exceed one wait their turn instead of being sent.
+    """
+    from weather_ratelimit import default_limiters
+
+    for limiter in default_limiters().values():
+        usage = limiter.usage()
+        line = (
+            f"{usage['host']}: {usage['used']} of {usage['requests']} requests "
+            f"per {usage['per']}s in use"
+        )
+        if usage["queued"]:
+            line += f", {usage['queued']} queued"
+        click.echo(f"{line} ({usage['total']} sent in total).")
+
+
+@weather.group()
+def watch():
+    """Keep weather for a list of locations fresh in the background.
+
+    Watched locations are refreshed before their cached weather expires by
+    'weather watch run', or by 'weather serve' while the daemon runs.
+    """
+    pass
+
+
+def parse_watch_locations(locations):
+    from weather_watch import format_location, parse_location
+
+    try:
+        return [format_location(parse_location(location)) for location in locations]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="LOCATIONS")
+
+
+# Let negative coordinates through as arguments rather than options
+@watch.command("add", context_settings={"ignore_unknown_options": True})
+@click.argument("locations", nargs=-1, required=True)
+def add_watch(locations):
+    """Watch zip codes or LAT,LON pairs."""
+    from weather_watch import Watchlist
+
+    watchlist = Watchlist.load()
+    for location in parse_watch_locations(locations):
+        if location not in watchlist.locations:
+            watchlist.locations.append(location)
+    watchlist.save()
+    click.echo(f"Watching {len(watchlist.locations)} locations.")
+
+
+@watch.command("remove", context_settings={"ignore_unknown_options": True})
+@click.argument("locations", nargs=-1, required=True)
+def remove_watch(locations):
+    """Stop watching zip codes or LAT,LON pairs."""
+    from weather_watch import Watchlist
+
+    watchlist = Watchlist.load()
+    removed = set(parse_watch_locations(locations))
+    watchlist.locations = [
+        location for location in watchlist.locations if location not in removed
+    ]
+    watchlist.save()
+    click.echo(f"Watching {len(watchlist.locations)} locations.")
+
+
+@watch.command("list")
+def list_watch():
+    """Display the watched locations."""
+    from weather_watch import Watchlist
+
+    watchlist = Watchlist.load()
+    if not watchlist.locations:
+        click.echo("No locations are being watched.")
+        return
+    for location in watchlist.locations:
+        click.echo(location)
+    click.echo(f"Checked every {watchlist.interval:g} seconds.")
+
+
+@watch.command("interval")
+@click.argument("seconds", type=click.FloatRange(min=1))
+def watch_interval(seconds):
+    """Set how often the watched locations are checked."""
+    from weather_watch import Watchlist
+
+    watchlist = Watchlist.load()
+    watchlist.interval = seconds
+    watchlist.save()
+    click.echo(f"Watched locations will be checked every {seconds:g} seconds.")
+
+
+@watch.command("run")
+def run_watch():
+    """Refresh the watched locations until interrupted."""
+    from weather_watch import WatchRefresher
+
+    def report(results):
+        for location, result in results.items():
+            if not isinstance(result, tuple):
+                click.echo(f"Could not refresh {location}: {result}")
+
+    weather_service = make_service(use_daemon=False)
+    click.echo("Refreshing watched locations. Press Ctrl-C to stop.")
+    try:
+        WatchRefresher(weather_service).run(report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        weather_service.close()
+
+
+@weather.group()
+def gazetteer():
+    """Manage the offline zip code gazetteer."""
+    pass
+
+
+@gazetteer.command("import")
+@click.argument("csv_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    help="Where to write the gazetteer (defaults to the cache directory)",
+)
+def import_gazetteer(csv_file, output):
+    """Build the gazetteer from a CSV of zip codes.
+
+    The CSV needs a header row naming zip code, city, state, latitude and
+    longitude columns; GeoNames postal code files (e.g. US.txt), which
+    have none, are recognized by their layout.
+    """
+    from weather_gazetteer import build_gazetteer
+
+    output = output or default_gazetteer_path()
+    try:
+        count = build_gazetteer(csv_file, output)
+        click.echo(f"Imported {count} zip codes into {output}.")
+    except Exception as e:
+        click.echo(f"Error: {str(e)}")
+
+
+# Let negative coordinates through as arguments rather than options
+@gazetteer.command(context_settings={"ignore_unknown_options": True})
+@click.argument("lat", type=float)
+@click.argument("lon", type=float)
+def nearest(lat, lon):
+    """Display the zip code closest to LAT, LON."""
+    from weather_gazetteer import Gazetteer
+
+    places = Gazetteer.open_default()
+    if places is None:
+        click.echo("No gazetteer found. Run 'weather gazetteer import' first.")
+        return
+    match = places.nearest(lat, lon)
+    if match:
+        zipcode, location = match
+        click.echo(
+            f"The nearest zip code is {zipcode} in {location.city}, {location.state}."
+        )
+    else:
+        click.echo("The gazetteer is empty.")
+
+
 if __name__ == "__main__":
     weather()
@@ -4,104 +4,1347 @@ Weather API Service
 Handles interactions with weather and location APIs using free services.
 """
 
-import requests
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+from urllib.parse import urlencode, urlsplit
+
+from weather_cache import geohash, geohash_bounds
+from weather_metrics import Metrics
+from weather_ratelimit import default_limiters
+
+# Failed lookups are logged here rather than printed; the CLI shows them on
+# stderr, and embedding applications route them like any other library's
+logger = logging.getLogger("weather")
+logger.addHandler(logging.NullHandler())
+
+# Cache lifetimes in seconds, per upstream. A zipcode's place never changes,
+# IP geolocation can change when the network does, and Open-Meteo refreshes
+# current conditions roughly every 15 minutes.
+ZIPCODE_TTL = None
+GEOCODING_TTL = None
+IP_LOCATION_TTL = 5 * 60
+WEATHER_TTL = 10 * 60
+FORECAST_TTL = 30 * 60
+
+# Results asked of the geocoding API per name; qualifiers such as a state
+# pick among them, so a city is found even when a larger namesake ranks first
+GEOCODING_RESULTS = 10
+
+# Coordinates are named after the nearest known place within this distance (km)
+NEAREST_PLACE_DISTANCE = 25
+
+# HTTP defaults. Connect timeouts are kept short since a host that does not
+# accept a connection quickly is better retried than waited on.
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Coordinates sent per Open-Meteo multi-location request
+MULTI_LOCATION_CHUNK = 100
+
+# Current weather is cached per geohash cell rather than per exact point.
+# Precision 5 cells are about 5 km across, close to Open-Meteo's model grid,
+# so neighbouring zip codes share one lookup per WEATHER_TTL time bucket.
+GRID_PRECISION = 5
+
+# Weather fetched in the last REFRESH_LEAD seconds of a time bucket is kept
+# through the next bucket too, so refreshers can renew entries before they
+# expire. Expired weather up to STALE_WHILE_REVALIDATE seconds old is served
+# at once while a fresh copy is fetched in the background.
+REFRESH_LEAD = WEATHER_TTL // 10
+STALE_WHILE_REVALIDATE = 5 * 60
+REVALIDATE_WORKERS = 4
+
+# Forecast series requested from Open-Meteo, and the longest forecast it offers
+DAILY_VARIABLES = ("weather_code", "temperature_2m_max", "temperature_2m_min")
+HOURLY_VARIABLES = ("weather_code", "temperature_2m")
+MAX_FORECAST_DAYS = 16
+
+# Hours of the hourly series requested along with a daily-only forecast, so
+# current weather can still be served from it until it expires
+CURRENT_FORECAST_HOURS = 24
+
+# Fields decoded from each upstream's responses (see weather_json.project);
+# everything else in a payload is skipped or dropped before it is cached
+ZIPCODE_SCHEMA = {
+    "places": [
+        {
+            "place name": str,
+            "state abbreviation": str,
+            "latitude": str,
+            "longitude": str,
+        }
+    ]
+}
+IP_LOCATION_SCHEMA = {
+    "status": str,
+    "city": str,
+    "regionName": str,
+    "lat": float,
+    "lon": float,
+    "timezone": str,
+}
+CURRENT_SCHEMA = {"current": {"temperature_2m": float, "weather_code": int}}
+FORECAST_SCHEMA = {
+    "utc_offset_seconds": int,
+    "daily": {
+        "time": [int],
+        "weather_code": [int],
+        "temperature_2m_max": [float],
+        "temperature_2m_min": [float],
+    },
+    "hourly": {"time": [int], "weather_code": [int], "temperature_2m": [float]},
+}
+WTTR_SCHEMA = {"current_condition": [{"temp_F": str, "weatherCode": str}]}
+
+# Hedging: a backup provider is asked once the primary has taken longer than
+# its recent p95 latency, or HEDGE_DELAY until enough samples are recorded
+HEDGE_DELAY = 1.0
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 100
+
+# A provider is skipped for BREAKER_RESET seconds after BREAKER_FAILURES
+# consecutive failures, then tried again
+BREAKER_FAILURES = 3
+BREAKER_RESET = 30
+
+# WorldWeatherOnline condition codes used by wttr.in, mapped to the nearest
+# Open-Meteo (WMO) weather code so both providers describe weather alike
+WWO_TO_WMO = {
+    113: 0,
+    116: 2,
+    119: 3,
+    122: 3,
+    143: 45,
+    176: 80,
+    179: 85,
+    182: 66,
+    185: 56,
+    200: 95,
+    227: 73,
+    230: 75,
+    248: 45,
+    260: 48,
+    263: 51,
+    266: 51,
+    281: 56,
+    284: 57,
+    293: 61,
+    296: 61,
+    299: 63,
+    302: 63,
+    305: 65,
+    308: 65,
+    311: 66,
+    314: 67,
+    317: 66,
+    320: 67,
+    323: 71,
+    326: 71,
+    329: 73,
+    332: 73,
+    335: 75,
+    338: 75,
+    350: 77,
+    353: 80,
+    356: 81,
+    359: 82,
+    362: 80,
+    365: 81,
+    368: 85,
+    371: 86,
+    374: 77,
+    377: 77,
+    386: 95,
+    389: 95,
+    392: 95,
+    395: 95,
+}
+
+
+class WeatherError(Exception):
+    """Base class of the errors WeatherService raises or returns."""
+
+
+class UpstreamError(WeatherError):
+    """An upstream API request failed or returned unusable data."""
+
+
+class LocationNotFound(WeatherError):
+    """A zip code, city, coordinates or IP address could not be resolved."""
+
+
+@dataclass(frozen=True)
+class Location:
+    """A resolved place with the coordinates used for weather lookups."""
+
+    city: Optional[str]
+    state: Optional[str]
+    lat: float
+    lon: float
+    timezone: Optional[str] = None
+
+
+class Forecast:
+    """Daily and hourly forecast series stored as parallel columns.
+
+    Times are Unix timestamps marking the start of each day or hour,
+    temperatures are floats (NaN when missing) and weather codes are small
+    integers (-1 when missing).
+    """
+
+    __slots__ = (
+        "utc_offset",
+        "daily_time",
+        "daily_max",
+        "daily_min",
+        "daily_code",
+        "hourly_time",
+        "hourly_temperature",
+        "hourly_code",
+    )
+
+    def __init__(self, payload, days=None):
+        self.utc_offset = payload.get("utc_offset_seconds", 0)
+        daily = payload.get("daily", {})
+        hourly = payload.get("hourly", {})
+        hours = days * 24 if days is not None else None
+        self.daily_time = _column("q", daily.get("time"), 0, days)
+        self.daily_max = _column("d", daily.get("temperature_2m_max"), math.nan, days)
+        self.daily_min = _column("d", daily.get("temperature_2m_min"), math.nan, days)
+        self.daily_code = _column("h", daily.get("weather_code"), -1, days)
+        self.hourly_time = _column("q", hourly.get("time"), 0, hours)
+        self.hourly_temperature = _column(
+            "d", hourly.get("temperature_2m"), math.nan, hours
+        )
+        self.hourly_code = _column("h", hourly.get("weather_code"), -1, hours)
+
+    def __len__(self):
+        return len(self.daily_time)
+
+    def hour_index(self, timestamp):
+        """Return the index of the hourly slot containing timestamp, or None."""
+        times = self.hourly_time
+        if not times or not times[0] <= timestamp < times[-1] + 3600:
+            return None
+        return int((timestamp - times[0]) // 3600)
+
+
+def _column(typecode, values, missing, limit=None):
+    """Pack a JSON series into a typed array, replacing nulls with missing."""
+    values = (values or [])[:limit]
+    return array(typecode, (missing if v is None else v for v in values))
+
+
+def _hourly_days(payload):
+    """Return how many whole days, from the first, the hourly series covers."""
+    daily = payload.get("daily", {}).get("time") or []
+    hourly = payload.get("hourly", {}).get("time") or []
+    if not daily or not hourly or hourly[0] != daily[0]:
+        return 0
+    return len(hourly) // 24
+
+
+def _validators(response):
+    """Return a response's (ETag, Last-Modified) headers, None where missing."""
+    headers = getattr(response, "headers", None)
+    if not hasattr(headers, "get"):
+        return None, None
+    values = (headers.get("ETag"), headers.get("Last-Modified"))
+    return tuple(value if isinstance(value, str) else None for value in values)
+
+
+def _time_connections(adapter, metrics):
+    """Time connection setup on every pool the adapter creates.
+
+    DNS resolution and the TCP connect are recorded as the connect phase and,
+    for HTTPS, the rest of connection setup as the tls phase.
+    """
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def timed(pool_class):
+        class TimedPool(pool_class):
+            def _new_conn(self):
+                conn = super()._new_conn()
+                _time_connect(conn, metrics, self.host, self.scheme == "https")
+                return conn
+
+        return TimedPool
+
+    adapter.poolmanager.pool_classes_by_scheme = {
+        "http": timed(HTTPConnectionPool),
+        "https": timed(HTTPSConnectionPool),
+    }
+
+
+def _time_connect(conn, metrics, host, tls):
+    connect, new_socket = conn.connect, conn._new_conn
+    socket_times = []
+
+    def timed_new_socket():
+        started = time.perf_counter()
+        sock = new_socket()
+        socket_times.append(time.perf_counter() - started)
+        return sock
+
+    def timed_connect():
+        started = time.perf_counter()
+        connect()
+        elapsed = time.perf_counter() - started
+        socket_time = socket_times.pop() if socket_times else elapsed
+        metrics.observe("upstream_request", socket_time, upstream=host, phase="connect")
+        if tls:
+            metrics.observe(
+                "upstream_request", elapsed - socket_time, upstream=host, phase="tls"
+            )
+
+    conn._new_conn = timed_new_socket
+    conn.connect = timed_connect
+
+
+class CircuitBreaker:
+    """Tracks consecutive failures of an upstream and stops calling it for a while.
+
+    The breaker opens after `failures` consecutive failures. Once `reset`
+    seconds have passed, calls are allowed again; the first success closes
+    the breaker and the first failure opens it for another `reset` seconds.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self._consecutive = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return (
+                self._opened_at is not None
+                and time.monotonic() - self._opened_at < self.reset
+            )
+
+    def allow(self):
+        """Return True if the upstream may be called."""
+        return not self.is_open
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            # A failed trial after the reset period reopens straight away
+            if self._consecutive >= self.failures or self._opened_at is not None:
+                self._opened_at = time.monotonic()
+
+
+class WeatherProvider:
+    """An upstream answering current conditions as (temperature, condition).
+
+    Subclasses describe the request for a point and how to parse its JSON
+    payload. Each provider keeps its own circuit breaker and a window of
+    recent latencies from which the hedging delay is derived.
+    """
+
+    name = None
+    schema = None  # fields used from the payload, see weather_json
+
+    def __init__(self, breaker=None):
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def request(self, service, lat, lon):
+        """Return the (url, params) to request for a point."""
+        raise NotImplementedError
+
+    def parse(self, service, data):
+        """Return (temperature, condition) from a response payload."""
+        raise NotImplementedError
+
+    def fetch(self, service, lat, lon):
+        """Request weather for a point."""
+        url, params = self.request(service, lat, lon)
+        data = service._fetch_json(url, params, self.schema)
+        if data is None:
+            raise UpstreamError(f"{self.name} request failed")
+        try:
+            return self.parse(service, data)
+        except Exception as e:
+            raise UpstreamError(f"{self.name} returned unusable data: {e}")
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self):
+        """Seconds to wait before asking a backup: the recent p95 latency."""
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return HEDGE_DELAY
+            latencies = sorted(self._latencies)
+        return latencies[math.ceil(0.95 * len(latencies)) - 1]
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """Current conditions from Open-Meteo, the primary provider."""
+
+    name = "open-meteo"
+    schema = CURRENT_SCHEMA
+
+    def request(self, service, lat, lon):
+        return service.weather_base_url, service._weather_params(lat, lon)
+
+    def parse(self, service, data):
+        return service._parse_weather(data)
+
+
+class WttrProvider(WeatherProvider):
+    """Current conditions from wttr.in's JSON format."""
+
+    name = "wttr.in"
+    schema = WTTR_SCHEMA
+
+    def request(self, service, lat, lon):
+        return f"{service.wttr_url}/{lat},{lon}", {"format": "j1"}
+
+    def parse(self, service, data):
+        current = data["current_condition"][0]
+        code = WWO_TO_WMO.get(int(current["weatherCode"]))
+        return (int(current["temp_F"]), service.weather_code_to_condition(code))
+
+
+def default_providers():
+    """Open-Meteo first, with wttr.in as the backup."""
+    return [OpenMeteoProvider(), WttrProvider()]
 
 
 class WeatherService:
     """Service class for weather and location data."""
 
-    def __init__(self):
-        # Using free APIs that don't require registration
-        self.weather_base_url = "https://api.open-meteo.com/v1/forecast"
-        self.geocoding_url = "https://geocoding-api.open-meteo.com/v1/search"
-        self.ip_location_url = "http://ip-api.com/json"
-        self.zipcode_url = "https://api.zippopotam.us/us"
+    def __init__(
+        self,
+        cache=None,
+        refresh=False,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        pool_size=POOL_SIZE,
+        pool_sizes=None,
+        rate_limits=None,
+        gazetteer=None,
+        metrics=None,
+        providers=None,
+        hedge_delay=None,
+        grid_precision=GRID_PRECISION,
+        stale_while_revalidate=STALE_WHILE_REVALIDATE,
+        history=None,
+        places=None,
+        json_decoder=None,
+        raise_errors=False,
+        max_workers=None,
+    ):
+        # Using free APIs that don't require registration. The environment
+        # can point them elsewhere, e.g. at a local stand-in for benchmarks.
+        env = os.environ.get
+        self.weather_base_url = env(
+            "WEATHER_OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast"
+        )
+        self.geocoding_url = env(
+            "WEATHER_GEOCODING_URL", "https://geocoding-api.open-meteo.com/v1/search"
+        )
+        self.ip_location_url = env("WEATHER_IP_LOCATION_URL", "http://ip-api.com/json")
+        self.zipcode_url = env("WEATHER_ZIPCODE_URL", "https://api.zippopotam.us/us")
+        self.wttr_url = env("WEATHER_WTTR_URL", "https://wttr.in")
+        self.archive_url = env(
+            "WEATHER_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive"
+        )
 
-    def get_current_location(self):
-        """Get current location based on IP address."""
+        # Optional ResponseCache; refresh skips cached reads but still writes
+        self.cache = cache
+        self.refresh = refresh
+
+        # Geohash precision of weather cache cells; None caches exact points
+        self.grid_precision = grid_precision
+
+        # Seconds past expiry cached weather may be served while refreshing
+        self.stale_while_revalidate = stale_while_revalidate
+        self._revalidating = set()
+        self._revalidate_pool = None
+
+        # One keep-alive session per upstream host; pool_sizes overrides
+        # pool_size for individual hosts, e.g. {"api.open-meteo.com": 20}
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.pool_sizes = dict(pool_sizes or {})
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+        # Per-host RateLimiters applied to upstream requests (not cache hits)
+        self.rate_limits = default_limiters() if rate_limits is None else rate_limits
+
+        # Optional offline Gazetteer consulted before zippopotam.us
+        self.gazetteer = gazetteer
+
+        # Optional PlaceIndex remembering the results of geocoded names
+        self.places = places
+
+        # Optional HistoryStore keeping archived days so they are fetched once
+        self.history = history
+
+        # weather_json decoder for upstream responses; the fastest installed
+        # one is picked on first use so startup does not import it
+        self.json_decoder = json_decoder
+
+        # Failed lookups raise a WeatherError when raise_errors is set, and
+        # are otherwise logged and answered with None
+        self.raise_errors = raise_errors
+
+        # Worker threads for map(); no more than the connections to a host,
+        # so concurrent lookups wait for a worker rather than a connection
+        self.max_workers = max_workers or pool_size
+        self._worker_pool = None
+
+        # Request phase timings, cache and retry counters, and errors
+        self.metrics = Metrics() if metrics is None else metrics
+
+        # Current conditions providers in order of preference. hedge_delay
+        # fixes the wait before asking the next one instead of using p95.
+        self.providers = default_providers() if providers is None else providers
+        self.hedge_delay = hedge_delay
+        self._hedge_pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close every pooled connection held by the service.
+
+        Background refreshes of stale weather are allowed to finish first.
+        """
+        with self._sessions_lock:
+            revalidate_pool, self._revalidate_pool = self._revalidate_pool, None
+        if revalidate_pool is not None:
+            revalidate_pool.shutdown(wait=True)
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            hedge_pool, self._hedge_pool = self._hedge_pool, None
+            worker_pool, self._worker_pool = self._worker_pool, None
+        if hedge_pool is not None:
+            hedge_pool.shutdown(wait=False)
+        if worker_pool is not None:
+            worker_pool.shutdown(wait=True, cancel_futures=True)
+        for session in sessions:
+            session.close()
+
+    def _failed(self, operation, message, error):
+        """Count a failed lookup, then raise it or log it and return None."""
+        self.metrics.increment("errors", operation=operation)
+        if self.raise_errors:
+            if isinstance(error, WeatherError):
+                raise error
+            raise WeatherError(f"{message}: {error}") from error
+        logger.warning("%s: %s", message, error)
+        return None
+
+    def map(self, func, items, ordered=True):
+        """Call func for every item on the service's worker pool, yielding results.
+
+        Tuple items are unpacked as func's arguments, so
+        map(service.get_weather_by_coordinates, points) looks up every
+        point. At most max_workers calls run at once. A call that raises
+        yields its exception in place of a result, which with raise_errors
+        includes every failed lookup. Results are yielded in input order, or
+        as calls complete when ordered is false. func must not call map.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        def call(item):
+            try:
+                return func(*item) if isinstance(item, tuple) else func(item)
+            except Exception as e:
+                return e
+
+        def results(limit):
+            """Yield finished calls until no more than limit are pending."""
+            while len(pending) > limit:
+                if ordered:
+                    yield pending.popleft().result()
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+
+        pool = self._workers()
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(call, item))
+                # Keep a bounded window of calls queued, so a long or endless
+                # iterable is not submitted up front
+                yield from results(2 * self.max_workers - 1)
+            yield from results(0)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _workers(self):
+        """Return the worker pool used by map(), creating it on first use."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._sessions_lock:
+            if self._worker_pool is None:
+                self._worker_pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="weather-worker"
+                )
+            return self._worker_pool
+
+    def _session_for(self, url):
+        """Return the pooled session for the host serving url."""
+        host = urlsplit(url).netloc
+        with self._sessions_lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._new_session(self.pool_sizes.get(host, self.pool_size))
+                self._sessions[host] = session
+        return session
+
+    def _new_session(self, pool_size):
+        """Create a session that retries throttled and failed GETs with backoff."""
+        # The HTTP stack is slow to import, so load it only when a request
+        # actually has to go out rather than for help text or cache hits
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util import make_headers
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        _time_connections(adapter, self.metrics)
+        session = requests.Session()
+        # Negotiate every encoding urllib3 can decode: gzip and deflate, and
+        # brotli or zstd when their packages are installed
+        session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)[
+            "accept-encoding"
+        ]
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _cache_key(self, url, params=None):
+        return f"{url}?{urlencode(sorted(params.items()))}" if params else url
+
+    def _cached_json(self, key, optional=False):
+        """Return a cached payload, or None on a miss or when refreshing."""
+        entry = self._cached_entry(key, optional=optional)
+        return entry[0] if entry else None
+
+    def _cached_entry(self, key, max_stale=0, optional=False):
+        """Return a cached (payload, expires_at), or None on a miss or when
+        refreshing. Entries expired up to max_stale seconds ago count too.
+        A miss of an optional lookup, one tried before the entry actually
+        needed, is not counted."""
+        if self.cache is None or self.refresh:
+            return None
+        entry = self.cache.get_entry(key, max_stale)
+        if entry is None:
+            if optional:
+                return None
+            outcome = "cache_misses"
+        elif entry[1] is not None and entry[1] <= time.time():
+            outcome = "cache_stale_hits"
+        else:
+            outcome = "cache_hits"
+        self.metrics.increment(outcome, upstream=urlsplit(key).hostname)
+        return entry
+
+    def _fetch_json(self, url, params=None, schema=None):
+        """Request a JSON payload from an upstream, bypassing the cache.
+
+        Only the fields named by schema are decoded, when one is given. Each
+        phase of the request is timed under the upstream_request metric, and
+        responses, retries and failures are counted per upstream host.
+
+        With a cache, responses carrying an ETag or Last-Modified header are
+        kept with them, and the same request is later made conditional: a
+        304 Not Modified answers it with the kept payload, without a body.
+        """
+        host = urlsplit(url).hostname
+        span = self.metrics.span
+        key = self._cache_key(url, params)
+        validated = self.cache.get_validated(key) if self.cache is not None else None
+        headers = {}
+        if validated is not None:
+            _, etag, last_modified = validated
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
         try:
-            response = requests.get(self.ip_location_url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "success":
-                    city = data.get("city")
-                    state = data.get("regionName")
-                    return (city, state)
+            limiter = self.rate_limits.get(host)
+            if limiter is not None:
+                with span("upstream_request", upstream=host, phase="rate_limit"):
+                    limiter.acquire()
+            with span("upstream_request", upstream=host, phase="ttfb"):
+                # Streaming returns at the headers so the body is timed apart
+                response = self._session_for(url).get(
+                    url,
+                    params=params,
+                    timeout=self.timeout,
+                    stream=True,
+                    **({"headers": headers} if headers else {}),
+                )
+            with span("upstream_request", upstream=host, phase="body"):
+                response.content
         except Exception as e:
-            print(f"Error getting current location: {e}")
+            self.metrics.increment(
+                "upstream_errors", upstream=host, error=type(e).__name__
+            )
+            raise
+
+        self.metrics.increment(
+            "upstream_responses", upstream=host, status=str(response.status_code)
+        )
+        history = getattr(getattr(response.raw, "retries", None), "history", None)
+        if isinstance(history, tuple) and history:
+            self.metrics.increment("upstream_retries", len(history), upstream=host)
+        # Bytes as they came over the wire, before gzip or brotli decoding
+        received = getattr(response.raw, "tell", None)
+        received = received() if callable(received) else None
+        if isinstance(received, int):
+            self.metrics.increment("upstream_bytes", received, upstream=host)
+        if response.status_code == 304 and validated is not None:
+            return validated[0]
+        if response.status_code != 200:
+            return None
+        if self.json_decoder is None:
+            from weather_json import default_decoder
+
+            self.json_decoder = default_decoder()
+        with span("upstream_request", upstream=host, phase="decode"):
+            data = self.json_decoder.decode(response.content, schema)
+        etag, last_modified = _validators(response)
+        if (etag or last_modified) and self.cache is not None:
+            self.cache.set_validated(key, data, etag, last_modified)
+        return data
+
+    def _get_json(self, url, params=None, ttl=None, schema=None):
+        """Fetch a JSON payload, going through the response cache if enabled."""
+        key = self._cache_key(url, params)
+        data = self._cached_json(key)
+        if data is not None:
+            return data
+
+        data = self._fetch_json(url, params, schema)
+        if data is not None and self.cache is not None:
+            self.cache.set(key, data, ttl)
+        return data
+
+    def resolve_location(self, zipcode=None, city=None, coordinates=None):
+        """Resolve a zip code, city name, (lat, lon) coordinates, or the
+        current IP address, to a Location.
+
+        Place name and coordinates come from a single upstream request so
+        callers can display the location and look up its weather without
+        fetching it twice. A city is a name optionally followed by its state
+        or country, as in 'Portland, OR'.
+        """
+        try:
+            if city:
+                location = self._location_from_city(city)
+            elif coordinates:
+                location = self._location_from_coordinates(*coordinates)
+            elif zipcode:
+                location = self._location_from_zipcode(zipcode)
+            else:
+                location = self._location_from_ip()
+        except Exception as e:
+            return self._failed("resolve_location", "Error resolving location", e)
+        if location is None and self.raise_errors:
+            if city:
+                message = f"No place found named {city}"
+            elif coordinates:
+                message = f"No place at coordinates {coordinates[0]},{coordinates[1]}"
+            elif zipcode:
+                message = f"No place found for zip code {zipcode}"
+            else:
+                message = "Could not determine the current location"
+            raise LocationNotFound(message)
+        return location
+
+    def _location_from_zipcode(self, zipcode):
+        """Build a Location from the gazetteer, or a zippopotam.us lookup."""
+        if self.gazetteer is not None:
+            location = self.gazetteer.lookup(zipcode)
+            outcome = "gazetteer_misses" if location is None else "gazetteer_hits"
+            self.metrics.increment(outcome)
+            if location is not None:
+                return location
+        data = self._get_json(
+            f"{self.zipcode_url}/{zipcode}", ttl=ZIPCODE_TTL, schema=ZIPCODE_SCHEMA
+        )
+        if data:
+            places = data.get("places", [])
+            if places:
+                place = places[0]
+                return Location(
+                    city=place.get("place name"),
+                    state=place.get("state abbreviation"),
+                    lat=float(place.get("latitude")),
+                    lon=float(place.get("longitude")),
+                )
+        return None
+
+    def _location_from_city(self, query):
+        """Build a Location from the place index, or a geocoding lookup.
+
+        Every result for the name is kept in the index, so the same name
+        with any other qualifier is answered without asking again.
+        """
+        from weather_places import GEOCODING_SCHEMA, Place, split_query
+
+        name, qualifiers = split_query(query)
+        if not name:
+            return None
+        places = None
+        if self.places is not None and not self.refresh:
+            places = self.places.search(name)
+            outcome = "place_index_misses" if places is None else "place_index_hits"
+            self.metrics.increment(outcome)
+        if places is None:
+            params = {
+                "name": name,
+                "count": GEOCODING_RESULTS,
+                "language": "en",
+                "format": "json",
+            }
+            data = self._get_json(
+                self.geocoding_url, params, ttl=GEOCODING_TTL, schema=GEOCODING_SCHEMA
+            )
+            if data is None:
+                return None
+            results = (Place.from_result(r) for r in data.get("results") or [])
+            places = [place for place in results if place is not None]
+            if self.places is not None:
+                self.places.add(name, places)
+        for place in places:
+            if place.matches(qualifiers):
+                return place.location()
+        return None
+
+    def _location_from_coordinates(self, lat, lon):
+        """Build a Location for a point, named after the nearest known place.
+
+        Open-Meteo has no reverse geocoding, so names come from the
+        gazetteer's zip codes and the places already in the index; a point
+        with neither nearby keeps its coordinates and no name.
+        """
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None
+        from weather_places import distance_km
+
+        candidates = []
+        if self.gazetteer is not None:
+            nearest = self.gazetteer.nearest(lat, lon)
+            if nearest is not None:
+                candidates.append(nearest[1])
+        if self.places is not None:
+            place = self.places.nearest(lat, lon, NEAREST_PLACE_DISTANCE)
+            if place is not None:
+                candidates.append(place.location())
+        candidates = [
+            (distance_km(lat, lon, candidate.lat, candidate.lon), candidate)
+            for candidate in candidates
+        ]
+        candidates = [c for c in candidates if c[0] <= NEAREST_PLACE_DISTANCE]
+        if not candidates:
+            return Location(city=None, state=None, lat=lat, lon=lon)
+        nearest = min(candidates, key=lambda c: c[0])[1]
+        return Location(nearest.city, nearest.state, lat, lon, nearest.timezone)
+
+    def _location_from_ip(self):
+        """Build a Location from an ip-api.com lookup."""
+        data = self._get_json(
+            self.ip_location_url, ttl=IP_LOCATION_TTL, schema=IP_LOCATION_SCHEMA
+        )
+        if data and data.get("status") == "success":
+            return Location(
+                city=data.get("city"),
+                state=data.get("regionName"),
+                lat=data.get("lat"),
+                lon=data.get("lon"),
+                timezone=data.get("timezone"),
+            )
+        return None
+
+    def get_current_location(self):
+        """Get current location based on IP address."""
+        location = self.resolve_location()
+        if location:
+            return (location.city, location.state)
         return None
 
     def get_location_by_zipcode(self, zipcode):
         """Get location information by zip code."""
-        try:
-            response = requests.get(f"{self.zipcode_url}/{zipcode}", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                city = data.get("post code")  # This might be the place name
-                places = data.get("places", [])
-                if places:
-                    city = places[0].get("place name")
-                    state = places[0].get("state abbreviation")
-                    return (city, state)
-        except Exception as e:
-            print(f"Error getting location by zipcode: {e}")
+        location = self.resolve_location(zipcode)
+        if location:
+            return (location.city, location.state)
         return None
 
     def get_coordinates_by_zipcode(self, zipcode):
         """Get latitude and longitude by zip code."""
-        try:
-            response = requests.get(f"{self.zipcode_url}/{zipcode}", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                places = data.get("places", [])
-                if places:
-                    lat = float(places[0].get("latitude"))
-                    lon = float(places[0].get("longitude"))
-                    return (lat, lon)
-        except Exception as e:
-            print(f"Error getting coordinates by zipcode: {e}")
+        location = self.resolve_location(zipcode)
+        if location:
+            return (location.lat, location.lon)
         return None
 
     def get_current_coordinates(self):
         """Get current coordinates based on IP address."""
-        try:
-            response = requests.get(self.ip_location_url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "success":
-                    lat = data.get("lat")
-                    lon = data.get("lon")
-                    return (lat, lon)
-        except Exception as e:
-            print(f"Error getting current coordinates: {e}")
+        location = self.resolve_location()
+        if location:
+            return (location.lat, location.lon)
         return None
 
+    def _weather_params(self, lat, lon):
+        return {
+            "latitude": lat,
+            "longitude": lon,
+            "current": "temperature_2m,weather_code",
+            "temperature_unit": "fahrenheit",
+            "timezone": "auto",
+        }
+
+    def _parse_weather(self, data):
+        """Extract (temperature, condition) from an Open-Meteo location payload."""
+        current = data.get("current", {})
+        temperature = current.get("temperature_2m")
+        weather_code = current.get("weather_code")
+
+        # Convert weather code to readable condition
+        condition = self.weather_code_to_condition(weather_code)
+
+        return (int(temperature), condition)
+
     def get_weather_by_coordinates(self, lat, lon):
-        """Get weather information by coordinates using Open-Meteo API."""
+        """Get weather information by coordinates.
+
+        Weather is looked up, and cached, for the grid cell containing the
+        point. Providers are asked in order of preference, skipping any whose
+        circuit breaker is open. When a provider fails, or has not answered
+        within its hedging delay, the next one is asked too and the first
+        good answer wins.
+        """
         try:
-            params = {
-                "latitude": lat,
-                "longitude": lon,
-                "current": "temperature_2m,weather_code",
-                "temperature_unit": "fahrenheit",
-                "timezone": "auto",
-            }
+            # A cached forecast already knows the conditions for this hour
+            weather = self._weather_from_cached_forecast(lat, lon)
+            if weather:
+                return weather
+
+            cell, cell_lat, cell_lon, bounds = self._weather_cell(lat, lon)
+            cached = self._cached_weather(cell, self.stale_while_revalidate)
+            if cached:
+                weather, expires_at = cached
+                if expires_at is not None and expires_at <= time.time():
+                    self._revalidate(cell, cell_lat, cell_lon, bounds)
+                return weather
+            return self._refresh_cell(cell, cell_lat, cell_lon, bounds)
+        except Exception as e:
+            return self._failed(
+                "get_weather_by_coordinates", "Error getting weather by coordinates", e
+            )
+
+    def _refresh_cell(self, cell, lat, lon, bounds):
+        """Fetch and cache weather for a cell from the available providers."""
+        providers = []
+        for provider in self.providers:
+            if provider.breaker.allow():
+                providers.append(provider)
+            else:
+                self.metrics.increment("provider_skipped", provider=provider.name)
+        if not providers:
+            raise UpstreamError("every weather provider is failing")
+        weather = self._hedged_weather(providers, lat, lon)
+        self._store_weather(cell, bounds, weather)
+        return weather
+
+    def _revalidate(self, cell, lat, lon, bounds):
+        """Refresh a cell's stale weather in the background, once at a time."""
+        with self._sessions_lock:
+            if cell in self._revalidating:
+                return
+            self._revalidating.add(cell)
+            if self._revalidate_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._revalidate_pool = ThreadPoolExecutor(
+                    max_workers=REVALIDATE_WORKERS,
+                    thread_name_prefix="weather-revalidate",
+                )
+            pool = self._revalidate_pool
+
+        def refresh():
+            try:
+                self._refresh_cell(cell, lat, lon, bounds)
+            except Exception:
+                self.metrics.increment("errors", operation="revalidate")
+            finally:
+                with self._sessions_lock:
+                    self._revalidating.discard(cell)
+
+        self.metrics.increment("revalidations")
+        pool.submit(refresh)
+
+    def _hedged_weather(self, providers, lat, lon):
+        """Return the first good answer from providers, hedging slow ones."""
+        if len(providers) == 1:
+            return self._weather_from_provider(providers[0], lat, lon)
+
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        queue = list(providers)
+        pending = {}
+        errors = []
+
+        def ask_next():
+            provider = queue.pop(0)
+            pending[
+                self._hedge_executor().submit(
+                    self._weather_from_provider, provider, lat, lon
+                )
+            ] = provider
+            return provider
+
+        waiting_on = ask_next()
+        while pending:
+            timeout = None
+            if queue:
+                timeout = self.hedge_delay
+                if timeout is None:
+                    timeout = waiting_on.hedge_delay()
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self.metrics.increment("hedged_requests", provider=queue[0].name)
+                waiting_on = ask_next()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+            if queue:
+                waiting_on = ask_next()
+        raise UpstreamError("; ".join(errors))
+
+    def _hedge_executor(self):
+        with self._sessions_lock:
+            if self._hedge_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                # Threads start on demand, so a generous cap costs nothing idle
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=self.pool_size * len(self.providers),
+                    thread_name_prefix="weather-hedge",
+                )
+            return self._hedge_pool
+
+    def _weather_from_provider(self, provider, lat, lon):
+        """Fetch from one provider, feeding its breaker and latency window."""
+        started = time.perf_counter()
+        try:
+            weather = provider.fetch(self, lat, lon)
+        except Exception:
+            provider.breaker.record_failure()
+            self.metrics.increment(
+                "provider_requests", provider=provider.name, outcome="failure"
+            )
+            raise
+        provider.breaker.record_success()
+        provider.record_latency(time.perf_counter() - started)
+        self.metrics.increment(
+            "provider_requests", provider=provider.name, outcome="success"
+        )
+        return weather
+
+    def get_weather_for_coordinates(
+        self, points, chunk_size=MULTI_LOCATION_CHUNK, refresh_within=0
+    ):
+        """Get weather for many (lat, lon) points with multi-location requests.
+
+        Points are grouped by grid cell, and cells missing from the cache are
+        sent to Open-Meteo chunk_size at a time. Returns a list aligned with
+        points holding a (temperature, condition) tuple for each point, or an
+        UpstreamError explaining why that point could not be fetched. Chunks
+        share Open-Meteo's circuit breaker, so while it is open points fail
+        without a request. Cells cached but expiring within refresh_within
+        seconds are fetched again.
+        """
+        points = list(points)
+        results = [None] * len(points)
+        cells = {}  # cell -> (lat, lon, bounds, indexes of points inside it)
+        for index, (lat, lon) in enumerate(points):
+            cell, cell_lat, cell_lon, bounds = self._weather_cell(lat, lon)
+            if cell not in cells:
+                cells[cell] = (cell_lat, cell_lon, bounds, [])
+            cells[cell][3].append(index)
 
-            response = requests.get(self.weather_base_url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                current = data.get("current", {})
-                temperature = current.get("temperature_2m")
-                weather_code = current.get("weather_code")
+        misses = []
+        renew_before = time.time() + refresh_within
+        for cell, (_, _, _, indexes) in cells.items():
+            cached = self._cached_weather(cell)
+            if cached is None or (cached[1] is not None and cached[1] <= renew_before):
+                misses.append(cell)
+                continue
+            for index in indexes:
+                results[index] = cached[0]
 
-                # Convert weather code to readable condition
-                condition = self.weather_code_to_condition(weather_code)
+        for start in range(0, len(misses), chunk_size):
+            end = start + chunk_size
+            self._fetch_weather_chunk(cells, misses[start:end], results)
+        return results
 
-                return (int(temperature), condition)
+    def _fetch_weather_chunk(self, cells, chunk, results):
+        """Fetch one multi-location request and fill results for its cells."""
+        params = self._weather_params(
+            ",".join(str(cells[cell][0]) for cell in chunk),
+            ",".join(str(cells[cell][1]) for cell in chunk),
+        )
+        breaker = self._open_meteo_breaker()
+        try:
+            if breaker is not None and not breaker.allow():
+                raise UpstreamError("Open-Meteo is failing, skipped until it recovers")
+            payload = self._fetch_json(self.weather_base_url, params, CURRENT_SCHEMA)
+            if payload is None:
+                raise UpstreamError("Open-Meteo request failed")
+            if isinstance(payload, dict):
+                # A single location comes back as an object rather than a list
+                payload = [payload]
+            if len(payload) != len(chunk):
+                raise UpstreamError(
+                    f"Open-Meteo returned {len(payload)} results for {len(chunk)} points"
+                )
         except Exception as e:
-            print(f"Error getting weather by coordinates: {e}")
+            self.metrics.increment("errors", operation="get_weather_for_coordinates")
+            # A chunk skipped by an open breaker is not a new failure
+            if breaker is not None and breaker.allow():
+                breaker.record_failure()
+            if not isinstance(e, UpstreamError):
+                e = UpstreamError(f"Open-Meteo request failed: {e}")
+            for cell in chunk:
+                for index in cells[cell][3]:
+                    results[index] = e
+            return
+
+        if breaker is not None:
+            breaker.record_success()
+
+        for cell, data in zip(chunk, payload):
+            lat, lon, bounds, indexes = cells[cell]
+            weather = self._parse_point(data, (lat, lon))
+            if isinstance(weather, tuple):
+                self._store_weather(cell, bounds, weather)
+            for index in indexes:
+                results[index] = weather
+
+    def _weather_cell(self, lat, lon):
+        """Return (cell, lat, lon, bounds) for the grid cell holding a point.
+
+        The coordinates returned are the cell's center, where weather for
+        the whole cell is looked up.
+        """
+        if self.grid_precision is None:
+            return f"{lat},{lon}", lat, lon, (lat, lon, lat, lon)
+        cell = geohash(lat, lon, self.grid_precision)
+        south, west, north, east = bounds = geohash_bounds(cell)
+        return (
+            cell,
+            round((south + north) / 2, 4),
+            round((west + east) / 2, 4),
+            bounds,
+        )
+
+    def _weather_key(self, cell):
+        return f"{self.weather_base_url}#cell={cell}"
+
+    def _cached_weather(self, cell, max_stale=0):
+        """Return ((temperature, condition), expires_at) for a cell, or None."""
+        entry = self._cached_entry(self._weather_key(cell), max_stale)
+        if not entry or not entry[0]:
+            return None
+        return tuple(entry[0]), entry[1]
+
+    def _store_weather(self, cell, bounds, weather):
+        """Cache a cell's weather until the end of the current time bucket.
+
+        Buckets are WEATHER_TTL long and aligned to the clock, so every cell
+        fetched within one bucket is refreshed together in the next. Weather
+        fetched within REFRESH_LEAD of the end of a bucket also covers the next.
+        """
+        if self.cache is not None:
+            ttl = WEATHER_TTL - time.time() % WEATHER_TTL
+            if ttl <= REFRESH_LEAD:
+                ttl += WEATHER_TTL
+            self.cache.set(self._weather_key(cell), list(weather), ttl, bounds)
+
+    def cached_weather_in_box(self, south, west, north, east):
+        """Return {cell: (temperature, condition)} for cached cells in a box."""
+        if self.cache is None:
+            return {}
+        prefix = self._weather_key("")
+        found = self.cache.find_in_box(south, west, north, east, prefix)
+        return {key[len(prefix) :]: tuple(value) for key, value in found.items()}
+
+    def _open_meteo_breaker(self):
+        """The circuit breaker of the Open-Meteo provider, shared with batches."""
+        for provider in self.providers:
+            if isinstance(provider, OpenMeteoProvider):
+                return provider.breaker
         return None
 
+    def _parse_point(self, data, point):
+        """Parse one location payload, turning failures into an UpstreamError."""
+        try:
+            return self._parse_weather(data)
+        except Exception as e:
+            return UpstreamError(f"No weather for {point[0]},{point[1]}: {e}")
+
+    def _forecast_key(self, lat, lon):
+        # Keyed by location only, so any cached forecast length can be reused
+        return f"{self.weather_base_url}#forecast?latitude={lat}&longitude={lon}"
+
+    def get_forecast(self, lat, lon, days=7, hourly=True):
+        """Get a days-long daily, and optionally hourly, forecast as a Forecast.
+
+        Both series come from a single Open-Meteo request. The hourly one,
+        roughly 24 times the size of the daily one, covers every day only when
+        asked for, and otherwise just the next CURRENT_FORECAST_HOURS hours
+        that current weather lookups are served from. A cached forecast
+        covering at least as many days, and hours if needed, is reused without
+        a new request, and one with every hour keeps them when it is extended.
+        """
+        try:
+            key = self._forecast_key(lat, lon)
+            data = self._cached_json(key) or {}
+            cached_days = len(data.get("daily", {}).get("time") or [])
+            if cached_days < days or (hourly and _hourly_days(data) < days):
+                params = {
+                    "latitude": lat,
+                    "longitude": lon,
+                    "daily": ",".join(DAILY_VARIABLES),
+                    "hourly": ",".join(HOURLY_VARIABLES),
+                    "forecast_days": days,
+                    "temperature_unit": "fahrenheit",
+                    "timezone": "auto",
+                    "timeformat": "unixtime",
+                }
+                if not hourly and not 0 < cached_days <= _hourly_days(data):
+                    params["forecast_hours"] = CURRENT_FORECAST_HOURS
+                data = self._fetch_json(self.weather_base_url, params, FORECAST_SCHEMA)
+                if data and self.cache is not None:
+                    self.cache.set(key, data, FORECAST_TTL)
+            if not data:
+                raise UpstreamError("Open-Meteo returned no forecast")
+            return Forecast(data, days)
+        except Exception as e:
+            return self._failed("get_forecast", "Error getting forecast", e)
+
+    def get_history(self, lat, lon, start, end):
+        """Get daily History from start to end (dates, inclusive).
+
+        History is looked up for the grid cell containing the point. With a
+        HistoryStore only the days it does not hold yet are requested from
+        Open-Meteo's archive, one request per run of missing days; refresh
+        requests the whole range again and updates the store. The archive
+        rejects days after today, so end is clamped to today.
+        """
+        from weather_history import FIRST_HISTORY_DATE, History
+
+        if start > end:
+            raise ValueError("start must not be after end")
+        if start < FIRST_HISTORY_DATE:
+            raise ValueError(f"history starts on {FIRST_HISTORY_DATE}")
+        today = date.today()
+        if start > today:
+            raise ValueError("start must not be in the future")
+        end = min(end, today)
+        try:
+            cell, cell_lat, cell_lon, _ = self._weather_cell(lat, lon)
+            if self.history is None or self.refresh:
+                missing = [(start, end)]
+            else:
+                missing = self.history.missing(cell, start, end)
+            for first, last in missing:
+                self.metrics.increment("history_days_fetched", (last - first).days + 1)
+                data = self._fetch_history(cell_lat, cell_lon, first, last)
+                if not data:
+                    raise UpstreamError("Open-Meteo returned no history")
+                fetched = History.from_payload(data)
+                if self.history is None:
+                    return fetched
+                self.history.save(cell, fetched)
+            return self.history.load(cell, start, end)
+        except Exception as e:
+            return self._failed("get_history", "Error getting history", e)
+
+    def _fetch_history(self, lat, lon, start, end):
+        from weather_history import HISTORY_SCHEMA, HISTORY_VARIABLES
+
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "daily": ",".join(HISTORY_VARIABLES),
+            "temperature_unit": "fahrenheit",
+            "precipitation_unit": "inch",
+            "timezone": "auto",
+        }
+        return self._fetch_json(self.archive_url, params, HISTORY_SCHEMA)
+
+    def _weather_from_cached_forecast(self, lat, lon):
+        """Return (temperature, condition) for this hour from a cached forecast."""
+        data = self._cached_json(self._forecast_key(lat, lon), optional=True)
+        if not data:
+            return None
+        forecast = Forecast(data)
+        index = forecast.hour_index(time.time())
+        if index is None or math.isnan(forecast.hourly_temperature[index]):
+            return None
+        condition = self.weather_code_to_condition(forecast.hourly_code[index])
+        return (int(forecast.hourly_temperature[index]), condition)
+
     def get_weather_by_zipcode(self, zipcode):
         """Get weather information by zip code."""
         coordinates = self.get_coordinates_by_zipcode(zipcode)
@@ -151,3 +1394,129 @@ class WeatherService:
             99: "thunderstorm with heavy hail",
         }
         return weather_codes.get(code, "unknown conditions")
+
+
+_shared_service = None
+_shared_lock = threading.Lock()
+
+
+def shared_service(**kwargs):
+    """Return the process-wide WeatherService, creating it on first use.
+
+    Every thread of an embedding application can use the one service, so
+    they share its connection pools, rate limits, response cache and worker
+    pool. It caches responses in the default ResponseCache and raises
+    WeatherError on failed lookups unless kwargs say otherwise; kwargs are
+    only accepted by the call that creates it.
+    """
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            from weather_cache import ResponseCache
+
+            if "cache" not in kwargs:
+                kwargs["cache"] = ResponseCache()
+            kwargs.setdefault("raise_errors", True)
+            _shared_service = WeatherService(**kwargs)
+        elif kwargs:
+            raise RuntimeError("the shared WeatherService is already configured")
+        return _shared_service
+
+
+def close_shared_service():
+    """Close the process-wide WeatherService, if one was created."""
+    global _shared_service
+    with _shared_lock:
+        service, _shared_service = _shared_service, None
+    if service is not None:
+        service.close()
+        if service.cache is not None:
+            service.cache.close()
+
+
+class AsyncWeatherService:
+    """Asyncio front end that runs WeatherService lookups concurrently.
+
+    Lookups run on a thread pool sized to the service's connection pool, so
+    they share its keep-alive sessions and response cache. Independent
+    requests can then be awaited together instead of one after another.
+    """
+
+    def __init__(self, service=None, max_workers=None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.service = service if service is not None else WeatherService()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or self.service.pool_size,
+            thread_name_prefix="weather",
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def shutdown(self):
+        """Stop the worker threads, leaving the underlying service open."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def close(self):
+        """Stop the worker threads and close the underlying service."""
+        self.shutdown()
+        self.service.close()
+
+    async def _run(self, func, *args):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def resolve_location(self, zipcode=None, city=None, coordinates=None):
+        """Resolve a zip code, city name, (lat, lon) coordinates, or the
+        current IP address, to a Location."""
+        from functools import partial
+
+        resolve = self.service.resolve_location
+        if city:
+            return await self._run(partial(resolve, city=city))
+        if coordinates:
+            return await self._run(partial(resolve, coordinates=coordinates))
+        return await self._run(resolve, zipcode)
+
+    async def get_weather_by_coordinates(self, lat, lon):
+        """Get (temperature, condition) for a pair of coordinates."""
+        return await self._run(self.service.get_weather_by_coordinates, lat, lon)
+
+    async def get_weather_for_coordinates(self, points, chunk_size=None):
+        """Get weather for many points using multi-location requests."""
+        chunk_size = chunk_size or MULTI_LOCATION_CHUNK
+        return await self._run(
+            self.service.get_weather_for_coordinates, points, chunk_size
+        )
+
+    async def get_forecast(self, lat, lon, days=7, hourly=True):
+        """Get a daily and hourly Forecast for a pair of coordinates."""
+        return await self._run(self.service.get_forecast, lat, lon, days, hourly)
+
+    async def get_current(self, zipcode=None):
+        """Return (location, weather) for a zip code or the current location."""
+        location = await self.resolve_location(zipcode)
+        if location is None:
+            return (None, None)
+        weather = await self.get_weather_by_coordinates(location.lat, location.lon)
+        return (location, weather)
+
+    async def gather_locations(self, zipcodes):
+        """Resolve many zip codes concurrently, preserving input order."""
+        import asyncio
+
+        return await asyncio.gather(*(self.resolve_location(z) for z in zipcodes))
+
+    async def gather_weather(self, points):
+        """Fetch weather for many (lat, lon) points concurrently, in order."""
+        import asyncio
+
+        return await asyncio.gather(
+            *(self.get_weather_by_coordinates(lat, lon) for lat, lon in points)
+        )
@@ -0,0 +1,116 @@
+"""
+Weather Batch Lookups
+
+Resolves many zip codes in one process with bounded concurrency.
+"""
+
+import asyncio
+
+from weather_api import MULTI_LOCATION_CHUNK, AsyncWeatherService
+from weather_output import WeatherRecord
+
+BATCH_FIELDS = list(WeatherRecord._fields)
+
+
+def read_zipcodes(stream):
+    """Yield zip codes from a text stream, one per line, skipping blanks and comments."""
+    for line in stream:
+        zipcode = line.strip()
+        if zipcode and not zipcode.startswith("#"):
+            yield zipcode
+
+
+async def _locate(service, zipcode):
+    """Resolve one zip code, returning (zipcode, Location or error record)."""
+    try:
+        location = await service.resolve_location(zipcode)
+    except Exception as e:
+        return zipcode, WeatherRecord(zipcode, error=str(e))
+    if location is None:
+        return zipcode, WeatherRecord.from_lookup(zipcode, None, None)
+    return zipcode, location
+
+
+async def _add_weather(service, entries, chunk_size, futures):
+    """Fetch weather for located zip codes in one multi-location request."""
+    points = [(location.lat, location.lon) for _, location in entries]
+    try:
+        results = await service.get_weather_for_coordinates(points, chunk_size)
+    except Exception as e:
+        results = [e] * len(entries)
+    for (zipcode, location), result in zip(entries, results):
+        futures[zipcode].set_result(
+            WeatherRecord.from_lookup(zipcode, location, result)
+        )
+
+
+async def _pipeline(service, futures, chunk_size):
+    """Resolve every location, grouping them into chunked weather requests."""
+    chunk = []
+    weather_tasks = []
+    try:
+        for located in asyncio.as_completed([_locate(service, z) for z in futures]):
+            zipcode, location = await located
+            if isinstance(location, WeatherRecord):
+                futures[zipcode].set_result(location)
+                continue
+            chunk.append((zipcode, location))
+            if len(chunk) == chunk_size:
+                weather_tasks.append(
+                    asyncio.ensure_future(
+                        _add_weather(service, chunk, chunk_size, futures)
+                    )
+                )
+                chunk = []
+        if chunk:
+            weather_tasks.append(
+                asyncio.ensure_future(_add_weather(service, chunk, chunk_size, futures))
+            )
+        await asyncio.gather(*weather_tasks)
+    finally:
+        for task in weather_tasks:
+            task.cancel()
+        # Never leave a consumer waiting on a record that will not arrive
+        for zipcode, future in futures.items():
+            if not future.done():
+                future.set_result(WeatherRecord(zipcode, error="lookup cancelled"))
+
+
+def run_batch(
+    service, zipcodes, ordered=True, concurrency=10, chunk_size=MULTI_LOCATION_CHUNK
+):
+    """Look up weather for many zip codes, yielding a WeatherRecord per zip code.
+
+    Duplicate zip codes are fetched once, locations are resolved concurrently
+    and their weather is fetched chunk_size points per request. Records are
+    yielded as soon as they are available: in input order when ordered is
+    true, otherwise in the order lookups complete.
+    """
+    zipcodes = list(zipcodes)
+    counts = {}
+    for zipcode in zipcodes:
+        counts[zipcode] = counts.get(zipcode, 0) + 1
+
+    loop = asyncio.new_event_loop()
+    async_service = AsyncWeatherService(service, max_workers=concurrency)
+    futures = {zipcode: loop.create_future() for zipcode in counts}
+    pipeline = loop.create_task(_pipeline(async_service, futures, chunk_size))
+    try:
+        if ordered:
+            for zipcode in zipcodes:
+                yield loop.run_until_complete(futures[zipcode])
+        else:
+            pending = set(futures.values())
+            while pending:
+                done, pending = loop.run_until_complete(
+                    asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                )
+                for future in done:
+                    record = future.result()
+                    for _ in range(counts[record.zipcode]):
+                        yield record
+    finally:
+        pipeline.cancel()
+        loop.run_until_complete(asyncio.gather(pipeline, return_exceptions=True))
+        async_service.shutdown()
+        loop.close()
@@ -0,0 +1,327 @@
+"""
+Weather Response Cache
+
+Persistent, size-bounded response cache shared between CLI processes.
+"""
+
+import json
+import os
+import threading
+import time
+
+DEFAULT_MAX_ENTRIES = 5000
+
+# Expired entries are kept this long so they can still be served, flagged as
+# stale, while a fresh copy is fetched
+STALE_GRACE = 15 * 60
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def default_cache_dir():
+    """Return the directory used for the cache and other local data files."""
+    path = os.environ.get("WEATHER_CACHE_DIR")
+    if not path:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        path = os.path.join(base, "weather-cli")
+    return path
+
+
+def default_gazetteer_path():
+    """Return the path the offline zip code gazetteer is imported to."""
+    return os.path.join(default_cache_dir(), "gazetteer.bin")
+
+
+def default_state_path():
+    """Return the file a running weather daemon advertises its address in."""
+    return os.path.join(default_cache_dir(), "daemon.json")
+
+
+def default_watch_path():
+    """Return the file holding the list of watched locations."""
+    return os.path.join(default_cache_dir(), "watch.json")
+
+
+def default_ratelimit_dir():
+    """Return the directory holding the rate limit buckets shared by processes."""
+    return os.path.join(default_cache_dir(), "ratelimit")
+
+
+def default_history_dir():
+    """Return the directory holding the local store of historical weather."""
+    return os.path.join(default_cache_dir(), "history")
+
+
+def default_places_path():
+    """Return the path of the index of place names resolved by geocoding."""
+    return os.path.join(default_cache_dir(), "places.sqlite3")
+
+
+def geohash(lat, lon, precision):
+    """Encode a point as a geohash of precision characters.
+
+    Each extra character makes cells 4-8 times smaller: at precision 5 a
+    cell is about 4.9 km wide and 4.9 km tall at the equator.
+    """
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            middle = (west + east) / 2
+            value = value * 2 + (lon >= middle)
+            west, east = (middle, east) if lon >= middle else (west, middle)
+        else:
+            middle = (south + north) / 2
+            value = value * 2 + (lat >= middle)
+            south, north = (middle, north) if lat >= middle else (south, middle)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def geohash_bounds(cell):
+    """Return the (south, west, north, east) bounds of a geohash cell."""
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                middle = (west + east) / 2
+                west, east = (middle, east) if bit else (west, middle)
+            else:
+                middle = (south + north) / 2
+                south, north = (middle, north) if bit else (south, middle)
+            even = not even
+    return (south, west, north, east)
+
+
+class ResponseCache:
+    """SQLite-backed key/value cache with per-entry TTLs and LRU eviction."""
+
+    def __init__(
+        self, path=None, max_entries=DEFAULT_MAX_ENTRIES, stale_grace=STALE_GRACE
+    ):
+        if path is None:
+            path = os.path.join(default_cache_dir(), "cache.sqlite3")
+        self.path = path
+        self.max_entries = max_entries
+        self.stale_grace = stale_grace
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """Open the database on first use so constructing a cache is free."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            import sqlite3
+
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)"
+            )
+            # Bounding boxes of entries describing an area, e.g. a grid cell
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS areas ("
+                " key TEXT PRIMARY KEY REFERENCES entries (key) ON DELETE CASCADE,"
+                " south REAL NOT NULL,"
+                " west REAL NOT NULL,"
+                " north REAL NOT NULL,"
+                " east REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS areas_south ON areas (south)")
+            # Upstream responses that carried an ETag or Last-Modified header,
+            # keyed by request, so they can be revalidated with a 304
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS validated ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS validated_accessed"
+                " ON validated (accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key, max_stale=0):
+        """Return (value, expires_at) for key, or None if missing or expired.
+
+        Entries that expired less than max_stale seconds ago (and no longer
+        ago than stale_grace) are still returned; callers can tell them
+        apart by expires_at. expires_at is None for entries that never expire.
+        """
+        now = time.time()
+        max_stale = min(max_stale, self.stale_grace)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now - max_stale:
+                if expires_at <= now - self.stale_grace:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    conn.commit()
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return json.loads(value), expires_at
+
+    def set(self, key, value, ttl=None, bounds=None):
+        """Store a JSON-serializable value; a ttl of None never expires.
+
+        bounds, a (south, west, north, east) box, makes the entry findable
+        with find_in_box.
+        """
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            if bounds is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO areas (key, south, west, north, east)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, *bounds),
+                )
+            self._evict(conn, now)
+            conn.commit()
+
+    def find_in_box(self, south, west, north, east, prefix=""):
+        """Return {key: value} for live entries whose bounds overlap the box.
+
+        Only entries stored with bounds and whose key starts with prefix
+        are considered.
+        """
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT entries.key, entries.value FROM areas"
+                " JOIN entries ON entries.key = areas.key"
+                " WHERE areas.south <= ? AND areas.north >= ?"
+                " AND areas.west <= ? AND areas.east >= ?"
+                " AND entries.key >= ? AND entries.key < ?"
+                " AND (entries.expires_at IS NULL OR entries.expires_at > ?)",
+                (north, south, east, west, prefix, prefix + "\uffff", time.time()),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_validated(self, key):
+        """Return (value, etag, last_modified) stored for a request, or None.
+
+        Validated responses do not expire; the upstream decides whether
+        they are still current when asked with the validators.
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, etag, last_modified FROM validated WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE validated SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            conn.commit()
+        return json.loads(row[0]), row[1], row[2]
+
+    def set_validated(self, key, value, etag=None, last_modified=None):
+        """Store a request's response with its ETag and Last-Modified validators."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO validated"
+                " (key, value, etag, last_modified, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), etag, last_modified, time.time()),
+            )
+            count = conn.execute("SELECT COUNT(*) FROM validated").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM validated WHERE key IN ("
+                    " SELECT key FROM validated ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+            conn.commit()
+
+    def delete(self, key):
+        """Remove a single entry."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.commit()
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM validated")
+            conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            conn = self._connect()
+            return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _evict(self, conn, now):
+        """Drop entries expired beyond the stale grace period, then the least
+        recently used beyond max_entries."""
+        conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (now - self.stale_grace,),
+        )
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
@@ -0,0 +1,355 @@
+"""
+Weather Daemon
+
+Long-running local server that shares one warm WeatherService between CLI calls.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Future
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from weather_api import (
+    MULTI_LOCATION_CHUNK,
+    POOL_SIZE,
+    Location,
+    UpstreamError,
+    WeatherError,
+    WeatherService,
+    logger,
+)
+from weather_cache import default_state_path
+from weather_metrics import Metrics
+
+# Short timeouts: the daemon is local, so a slow answer means it is unhealthy
+DAEMON_CONNECT_TIMEOUT = 0.5
+DAEMON_READ_TIMEOUT = 60
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """Run func once per key at a time; concurrent callers share its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result()
+
+        try:
+            call.set_result(func())
+        except BaseException as e:
+            call.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return call.result()
+
+
+class WeatherDaemon:
+    """HTTP server answering location and weather lookups on localhost."""
+
+    def __init__(self, service, host="127.0.0.1", port=0):
+        self.service = service
+        self.flights = SingleFlight()
+        self.server = ThreadingHTTPServer((host, port), _DaemonHandler)
+        self.server.daemon_threads = True
+        self.server.weather_daemon = self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self, state_path=None):
+        """Serve until shutdown, advertising the address in state_path if given."""
+        try:
+            if state_path:
+                directory = os.path.dirname(state_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(state_path, "w") as f:
+                    json.dump({"url": self.url, "pid": os.getpid()}, f)
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if state_path and os.path.exists(state_path):
+                os.remove(state_path)
+
+    def shutdown(self):
+        """Stop a server running in another thread."""
+        self.server.shutdown()
+
+    def location(self, zipcode=None, city=None, coordinates=None):
+        key = ("location", zipcode, city, coordinates)
+        return self.flights.do(
+            key, lambda: self.service.resolve_location(zipcode, city, coordinates)
+        )
+
+    def weather(self, lat, lon):
+        key = ("weather", lat, lon)
+        return self.flights.do(
+            key, lambda: self.service.get_weather_by_coordinates(lat, lon)
+        )
+
+    def weather_many(self, points, chunk_size=None):
+        chunk_size = chunk_size or MULTI_LOCATION_CHUNK
+        return self.service.get_weather_for_coordinates(points, chunk_size)
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    """Routes daemon requests to the shared WeatherDaemon."""
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def _handle(self, method):
+        try:
+            method(self.server.weather_daemon)
+        except Exception as e:
+            self._reply({"error": str(e)}, status=500)
+
+    def _get(self, daemon):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/ping":
+            self._reply({"status": "ok", "pid": os.getpid()})
+        elif url.path == "/location":
+            coordinates = None
+            if "coords" in query:
+                lat, lon = query["coords"].split(",")
+                coordinates = (float(lat), float(lon))
+            location = daemon.location(
+                query.get("zipcode"), query.get("city"), coordinates
+            )
+            self._reply({"location": asdict(location) if location else None})
+        elif url.path == "/weather":
+            weather = daemon.weather(float(query["lat"]), float(query["lon"]))
+            self._reply({"weather": weather})
+        elif url.path == "/metrics":
+            self._send(
+                daemon.service.metrics.to_prometheus().encode("utf-8"),
+                "text/plain; version=0.0.4",
+            )
+        else:
+            self._reply({"error": "not found"}, status=404)
+
+    def _post(self, daemon):
+        if urlsplit(self.path).path != "/weather":
+            self._reply({"error": "not found"}, status=404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length))
+        points = [tuple(point) for point in body["points"]]
+        results = daemon.weather_many(points, body.get("chunk_size"))
+        self._reply(
+            {
+                "results": [
+                    r if isinstance(r, tuple) else {"error": str(r)} for r in results
+                ]
+            }
+        )
+
+    def _reply(self, payload, status=200):
+        self._send(json.dumps(payload).encode("utf-8"), "application/json", status)
+
+    def _send(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep the daemon's terminal quiet; lookups are not worth a log line
+        pass
+
+
+class DaemonUnavailable(Exception):
+    """No daemon is listening at the address in the state file."""
+
+
+class DaemonClient:
+    """Forwards location and weather lookups to a running WeatherDaemon.
+
+    The daemon is spoken to with http.client, one request per lookup, so a
+    command it serves loads neither the HTTP stack nor the rate limiters
+    and decoders WeatherService sets up for the upstreams. If the daemon
+    turns out to be gone, its state file is removed and lookups go to the
+    WeatherService built by fallback instead.
+    """
+
+    def __init__(
+        self,
+        url,
+        fallback=None,
+        state_path=None,
+        metrics=None,
+        pool_size=POOL_SIZE,
+        raise_errors=False,
+    ):
+        self.daemon_url = url
+        parts = urlsplit(url)
+        self._address = (parts.hostname, parts.port)
+        self.fallback = fallback
+        self.state_path = state_path
+        self.metrics = Metrics() if metrics is None else metrics
+        self.pool_size = pool_size
+        self.raise_errors = raise_errors
+        self._service = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def discover(cls, state_path=None, **kwargs):
+        """Return a client for the daemon in the state file, or None if there is none.
+
+        Whether the daemon still runs is only found out by the first lookup.
+        """
+        state_path = state_path or default_state_path()
+        try:
+            with open(state_path) as f:
+                url = json.load(f)["url"]
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(url, state_path=state_path, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the fallback service, if one was needed."""
+        with self._lock:
+            service, self._service = self._service, None
+        if service is not None:
+            service.close()
+
+    def _request(self, method, path, params=None, body=None):
+        """Send one request to the daemon and return its decoded JSON reply."""
+        import http.client
+
+        if self._service is not None:
+            raise DaemonUnavailable(self.daemon_url)
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = {}
+        if body is not None:
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        conn = http.client.HTTPConnection(
+            *self._address, timeout=DAEMON_CONNECT_TIMEOUT
+        )
+        try:
+            try:
+                conn.connect()
+            except OSError as e:
+                raise DaemonUnavailable(self.daemon_url) from e
+            conn.sock.settimeout(DAEMON_READ_TIMEOUT)
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            data = json.loads(response.read())
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise UpstreamError(f"Weather daemon failed: {data.get('error')}")
+        return data
+
+    def _direct(self):
+        """Return the fallback service, removing the dead daemon's state file."""
+        with self._lock:
+            if self._service is None:
+                if self.state_path:
+                    try:
+                        os.remove(self.state_path)
+                    except OSError:
+                        pass
+                if self.fallback is not None:
+                    self._service = self.fallback()
+                else:
+                    self._service = WeatherService(
+                        metrics=self.metrics,
+                        pool_size=self.pool_size,
+                        raise_errors=self.raise_errors,
+                    )
+            return self._service
+
+    def _failed(self, operation, message, error):
+        """Count a failed lookup, then raise it or log it and return None."""
+        self.metrics.increment("errors", operation=operation)
+        if self.raise_errors:
+            if isinstance(error, WeatherError):
+                raise error
+            raise WeatherError(f"{message}: {error}") from error
+        logger.warning("%s: %s", message, error)
+        return None
+
+    def resolve_location(self, zipcode=None, city=None, coordinates=None):
+        """Resolve a location through the daemon."""
+        if city:
+            params = {"city": city}
+        elif coordinates:
+            params = {"coords": f"{coordinates[0]},{coordinates[1]}"}
+        elif zipcode:
+            params = {"zipcode": zipcode}
+        else:
+            params = None
+        try:
+            data = self._request("GET", "/location", params)
+        except DaemonUnavailable:
+            return self._direct().resolve_location(zipcode, city, coordinates)
+        except Exception as e:
+            return self._failed("resolve_location", "Error resolving location", e)
+        location = data.get("location")
+        return Location(**location) if location else None
+
+    def get_location_by_zipcode(self, zipcode):
+        """Get location information by zip code."""
+        location = self.resolve_location(zipcode)
+        if location:
+            return (location.city, location.state)
+        return None
+
+    def get_weather_by_coordinates(self, lat, lon):
+        """Get weather through the daemon."""
+        try:
+            data = self._request("GET", "/weather", {"lat": lat, "lon": lon})
+        except DaemonUnavailable:
+            return self._direct().get_weather_by_coordinates(lat, lon)
+        except Exception as e:
+            return self._failed(
+                "get_weather_by_coordinates", "Error getting weather by coordinates", e
+            )
+        if data.get("weather"):
+            temperature, condition = data["weather"]
+            return (temperature, condition)
+        return None
+
+    def get_weather_for_coordinates(self, points, chunk_size=None):
+        """Get weather for many points through the daemon."""
+        body = {"points": [list(point) for point in points], "chunk_size": chunk_size}
+        try:
+            results = self._request("POST", "/weather", body=body)["results"]
+        except DaemonUnavailable:
+            return self._direct().get_weather_for_coordinates(points, chunk_size)
+        except Exception as e:
+            error = UpstreamError(f"Weather daemon request failed: {e}")
+            return [error] * len(points)
+        return [
+            tuple(r) if isinstance(r, list) else UpstreamError(r["error"])
+            for r in results
+        ]
@@ -0,0 +1,256 @@
+"""
+Weather Gazetteer
+
+Offline US zip code gazetteer stored in a compact, memory-mapped binary file.
+"""
+
+import csv
+import itertools
+import math
+import mmap
+import os
+import struct
+
+from weather_api import Location
+from weather_cache import default_gazetteer_path
+from weather_places import US_STATES, normalize
+
+MAGIC = b"WGAZ"
+VERSION = 1
+HEADER = struct.Struct("<4sII")  # magic, version, record count
+ZIP_SLOTS = 100000  # one int32 row index per possible 5-digit zip code
+
+# Accepted CSV header names for each column
+COLUMNS = {
+    "zipcode": ("zipcode", "zip", "postal code", "postal_code", "post code"),
+    "city": ("city", "place", "place name", "place_name"),
+    "state": ("state", "state abbreviation", "state_code", "admin code1"),
+    "lat": ("lat", "latitude"),
+    "lon": ("lon", "lng", "long", "longitude"),
+}
+
+
+# Column positions in GeoNames postal code dumps (e.g. US.txt), which have no
+# header: country code, postal code, place name, admin name1, admin code1,
+# admin name2, admin code2, admin name3, admin code3, latitude, longitude,
+# accuracy
+GEONAMES_COLUMNS = {"zipcode": 1, "city": 2, "state": 4, "lat": 9, "lon": 10}
+GEONAMES_FIELDS = 12
+
+
+def _is_geonames_row(fields):
+    """Whether a line is a data row of a headerless GeoNames postal code dump."""
+    if len(fields) != GEONAMES_FIELDS or len(fields[0].strip()) != 2:
+        return False
+    try:
+        float(fields[GEONAMES_COLUMNS["lat"]])
+        float(fields[GEONAMES_COLUMNS["lon"]])
+    except ValueError:
+        return False
+    return True
+
+
+# Abbreviations of full state names, which are stored as their 2-letter codes
+STATE_CODES = {normalize(name): code for name, code in US_STATES.items()}
+
+
+def _state_code(state, zipcode):
+    """Return a state's 2-letter code, given the code itself or its full name."""
+    state = state.strip()
+    if not state or (len(state) == 2 and state.isascii() and state.isalpha()):
+        return state.upper()
+    code = STATE_CODES.get(normalize(state))
+    if code is None:
+        raise ValueError(
+            f"State {state!r} of zip code {zipcode} is neither a 2-letter code "
+            "nor a US state name"
+        )
+    return code
+
+
+def _read_rows(csv_path):
+    """Yield (zipcode, city, state, lat, lon) tuples from a CSV/TSV file.
+
+    The file needs a header naming its columns, unless it is a GeoNames
+    postal code dump, whose fixed layout is recognized from its first line.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        header = f.readline()
+        delimiter = "\t" if "\t" in header else ","
+        fields = next(csv.reader([header], delimiter=delimiter), [])
+        if delimiter == "\t" and _is_geonames_row(fields):
+            positions = GEONAMES_COLUMNS
+            rows = itertools.chain([fields], csv.reader(f, delimiter=delimiter))
+        else:
+            names = [name.strip().lower() for name in fields]
+            positions = {}
+            for column, aliases in COLUMNS.items():
+                matches = [names.index(alias) for alias in aliases if alias in names]
+                if not matches:
+                    raise ValueError(f"CSV file has no {column} column")
+                positions[column] = matches[0]
+            rows = csv.reader(f, delimiter=delimiter)
+
+        for row in rows:
+            if not row:
+                continue
+            zipcode = row[positions["zipcode"]].strip()
+            if not (len(zipcode) == 5 and zipcode.isdigit()):
+                continue
+            yield (
+                zipcode,
+                row[positions["city"]].strip(),
+                _state_code(row[positions["state"]], zipcode),
+                float(row[positions["lat"]]),
+                float(row[positions["lon"]]),
+            )
+
+
+def build_gazetteer(csv_path, out_path=None):
+    """Build a gazetteer file from a CSV of zip codes and return its size.
+
+    The CSV needs a header naming zip code, city, state, latitude and
+    longitude columns, or the layout of a GeoNames postal code dump. States
+    may be given as 2-letter codes or US state names, which are stored as
+    their codes. Later rows for a zip code replace earlier ones.
+    """
+    out_path = out_path or default_gazetteer_path()
+    records = {}
+    for zipcode, city, state, lat, lon in _read_rows(csv_path):
+        records[int(zipcode)] = (city, state, lat, lon)
+
+    zips = sorted(records)
+    count = len(zips)
+    index = [-1] * ZIP_SLOTS
+    names = bytearray()
+    offsets = []
+    for row, zipcode in enumerate(zips):
+        index[zipcode] = row
+        offsets.append(len(names))
+        names += records[zipcode][0].encode("utf-8")
+    offsets.append(len(names))
+
+    directory = os.path.dirname(out_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count))
+        f.write(struct.pack(f"<{ZIP_SLOTS}i", *index))
+        f.write(struct.pack(f"<{count}i", *zips))
+        f.write(struct.pack(f"<{count}f", *(records[z][2] for z in zips)))
+        f.write(struct.pack(f"<{count}f", *(records[z][3] for z in zips)))
+        f.write(b"".join(records[z][1].encode("ascii").ljust(2) for z in zips))
+        f.write(struct.pack(f"<{count + 1}I", *offsets))
+        f.write(bytes(names))
+    # Replace atomically so running processes never map a half-written file
+    os.replace(tmp_path, out_path)
+    return count
+
+
+class Gazetteer:
+    """Read-only view of a gazetteer file with O(1) zip code lookups."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a gazetteer file")
+        self.count = count
+        self._index_at = HEADER.size
+        self._zips_at = self._index_at + 4 * ZIP_SLOTS
+        self._lats_at = self._zips_at + 4 * count
+        self._lons_at = self._lats_at + 4 * count
+        self._states_at = self._lons_at + 4 * count
+        self._offsets_at = self._states_at + 2 * count
+        self._names_at = self._offsets_at + 4 * (count + 1)
+        self._arrays = None
+
+    @classmethod
+    def open_default(cls):
+        """Open the default gazetteer, or return None if none was imported."""
+        path = default_gazetteer_path()
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self.count
+
+    def _row_for(self, zipcode):
+        zipcode = str(zipcode)
+        if not (len(zipcode) == 5 and zipcode.isdigit()):
+            return -1
+        return struct.unpack_from("<i", self._map, self._index_at + 4 * int(zipcode))[0]
+
+    def _location(self, row):
+        (lat,) = struct.unpack_from("<f", self._map, self._lats_at + 4 * row)
+        (lon,) = struct.unpack_from("<f", self._map, self._lons_at + 4 * row)
+        start, end = struct.unpack_from("<II", self._map, self._offsets_at + 4 * row)
+        name = self._map[self._names_at + start : self._names_at + end]
+        state_at = self._states_at + 2 * row
+        return Location(
+            city=name.decode("utf-8"),
+            state=self._map[state_at : state_at + 2].decode("ascii").strip(),
+            lat=round(lat, 4),
+            lon=round(lon, 4),
+        )
+
+    def _zipcode(self, row):
+        return "%05d" % struct.unpack_from("<i", self._map, self._zips_at + 4 * row)
+
+    def lookup(self, zipcode):
+        """Return the Location for a zip code, or None if it is not listed."""
+        row = self._row_for(zipcode)
+        if row < 0:
+            return None
+        return self._location(row)
+
+    def nearest(self, lat, lon):
+        """Return (zipcode, Location) for the listed zip code closest to lat, lon."""
+        if self.count == 0:
+            return None
+        # Equirectangular distance is accurate enough to rank nearby points
+        scale = math.cos(math.radians(lat))
+        numpy = _numpy()
+        if numpy is not None:
+            lats, lons = self._numpy_arrays(numpy)
+            distances = (lats - lat) ** 2 + ((lons - lon) * scale) ** 2
+            row = int(numpy.argmin(distances))
+        else:
+            row = self._nearest_row(lat, lon, scale)
+        return (self._zipcode(row), self._location(row))
+
+    def _numpy_arrays(self, numpy):
+        """Latitude and longitude columns as arrays, decoded once per file."""
+        if self._arrays is None:
+            lats = numpy.frombuffer(self._map, "<f4", self.count, self._lats_at)
+            lons = numpy.frombuffer(self._map, "<f4", self.count, self._lons_at)
+            self._arrays = (lats.astype(numpy.float64), lons.astype(numpy.float64))
+        return self._arrays
+
+    def _nearest_row(self, lat, lon, scale):
+        """Pure Python nearest-point scan used when NumPy is not installed."""
+        lats = struct.unpack_from(f"<{self.count}f", self._map, self._lats_at)
+        lons = struct.unpack_from(f"<{self.count}f", self._map, self._lons_at)
+        best_row, best = -1, math.inf
+        for row in range(self.count):
+            distance = (lats[row] - lat) ** 2 + ((lons[row] - lon) * scale) ** 2
+            if distance < best:
+                best_row, best = row, distance
+        return best_row
+
+
+def _numpy():
+    """Import NumPy on first use; it is optional and slow to import."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
@@ -0,0 +1,284 @@
+"""
+Weather History
+
+Daily historical weather kept in a local columnar store, one chunk file per
+grid cell and year, with aggregates computed from the stored columns.
+"""
+
+import math
+import os
+import struct
+import sys
+import threading
+from array import array
+from datetime import date, timedelta
+
+from weather_cache import default_history_dir
+from weather_output import HistoryRecord
+
+# Daily series requested from Open-Meteo's archive, in the order they are
+# stored as columns of each chunk file
+HISTORY_VARIABLES = (
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "temperature_2m_mean",
+    "precipitation_sum",
+    "weather_code",
+)
+
+# Fields decoded from archive responses (see weather_json.project)
+HISTORY_SCHEMA = {
+    "daily": {
+        "time": [str],
+        **{name: [float] for name in HISTORY_VARIABLES},
+    }
+}
+
+# The archive starts in 1940 and trails the present by a few days
+FIRST_HISTORY_DATE = date(1940, 1, 1)
+
+# Base temperature (ºF) for heating and cooling degree-days
+DEGREE_DAY_BASE = 65.0
+
+MAGIC = b"WHST"
+VERSION = 1
+HEADER = struct.Struct("<4sIi")  # magic, version, year
+DAYS_PER_CHUNK = 366  # one slot per day of the year, leap day included
+
+PERIODS = ("day", "week", "month", "year")
+
+
+class History:
+    """Daily weather from start onwards stored as parallel columns.
+
+    Temperatures are ºF and precipitation inches, as float arrays with NaN
+    for days without data; weather codes are stored as floats as well.
+    """
+
+    __slots__ = ("start", "high", "low", "mean", "precipitation", "code")
+
+    def __init__(self, start, columns):
+        self.start = start
+        self.high, self.low, self.mean, self.precipitation, self.code = columns
+
+    @classmethod
+    def from_payload(cls, payload):
+        """Build a History from an Open-Meteo archive response."""
+        daily = payload.get("daily", {})
+        times = daily.get("time") or []
+        start = date.fromisoformat(times[0]) if times else None
+        columns = [
+            array("d", (math.nan if v is None else v for v in daily.get(name) or []))
+            for name in HISTORY_VARIABLES
+        ]
+        return cls(start, columns)
+
+    def __len__(self):
+        return len(self.high)
+
+    def dates(self):
+        return [self.start + timedelta(days=day) for day in range(len(self))]
+
+    def daily_mean(self):
+        """Mean temperature per day, from the high and low where none is given."""
+        return array(
+            "d",
+            (
+                (high + low) / 2 if math.isnan(mean) else mean
+                for high, low, mean in zip(self.high, self.low, self.mean)
+            ),
+        )
+
+    def degree_days(self, base=DEGREE_DAY_BASE):
+        """Return (heating, cooling) degree-days over the whole history."""
+        return _degree_days(self.daily_mean(), base)
+
+    def aggregate(self, period="day", base=DEGREE_DAY_BASE):
+        """Summarize the history per day, week, month or year as HistoryRecords.
+
+        Days without data are left out of every statistic; a period with no
+        data at all has None in place of each value.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"unknown period: {period}")
+        means = self.daily_mean()
+        records = []
+        start = 0
+        dates = self.dates()
+        for end in range(1, len(dates) + 1):
+            if end < len(dates) and _period(dates[end], period) == _period(
+                dates[start], period
+            ):
+                continue
+            heating, cooling = _degree_days(means[start:end], base)
+            records.append(
+                HistoryRecord(
+                    _period(dates[start], period),
+                    _finite(min, self.low[start:end]),
+                    _finite(max, self.high[start:end]),
+                    _finite(_average, means[start:end]),
+                    _finite(sum, self.precipitation[start:end]),
+                    heating,
+                    cooling,
+                )
+            )
+            start = end
+        return records
+
+
+def _period(day, period):
+    if period == "day":
+        return day.isoformat()
+    if period == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "month":
+        return f"{day:%Y-%m}"
+    return f"{day:%Y}"
+
+
+def _average(values):
+    return sum(values) / len(values)
+
+
+def _finite(statistic, values):
+    """Apply statistic to the values that are not NaN, or return None."""
+    values = [value for value in values if not math.isnan(value)]
+    return round(statistic(values), 2) if values else None
+
+
+def _degree_days(means, base):
+    heating = cooling = 0.0
+    for mean in means:
+        if not math.isnan(mean):
+            heating += max(0.0, base - mean)
+            cooling += max(0.0, mean - base)
+    return round(heating, 1), round(cooling, 1)
+
+
+def _empty_chunk():
+    return [array("d", [math.nan]) * DAYS_PER_CHUNK for _ in HISTORY_VARIABLES]
+
+
+def _has_data(columns, slot):
+    """Whether a day has a high or low temperature; recent days have neither."""
+    high, low = columns[0][slot], columns[1][slot]
+    return not (math.isnan(high) and math.isnan(low))
+
+
+class HistoryStore:
+    """Directory of history chunks: <directory>/<cell>/<year>.bin.
+
+    Each chunk holds one little-endian float64 column per HISTORY_VARIABLES
+    entry with a slot for every day of its year, so any date range is read
+    with a few sequential reads and written back a year at a time. Days
+    without temperatures are treated as missing and fetched again.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_history_dir()
+        self._lock = threading.Lock()
+
+    def _path(self, cell, year):
+        return os.path.join(self.directory, cell, f"{year}.bin")
+
+    def _read(self, cell, year):
+        """Return the columns of a chunk, or empty columns if none is stored."""
+        try:
+            with open(self._path(cell, year), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return _empty_chunk()
+        size = 8 * DAYS_PER_CHUNK
+        if len(data) < HEADER.size:
+            return _empty_chunk()
+        magic, version, stored_year = HEADER.unpack_from(data, 0)
+        if (
+            magic != MAGIC
+            or version != VERSION
+            or stored_year != year
+            or len(data) != HEADER.size + size * len(HISTORY_VARIABLES)
+        ):
+            # A damaged chunk or one from another version is refetched
+            return _empty_chunk()
+        columns = []
+        for index in range(len(HISTORY_VARIABLES)):
+            column = array("d")
+            offset = HEADER.size + index * size
+            column.frombytes(data[offset : offset + size])
+            if sys.byteorder == "big":
+                column.byteswap()
+            columns.append(column)
+        return columns
+
+    def _write(self, cell, year, columns):
+        path = self._path(cell, year)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, year))
+            for column in columns:
+                if sys.byteorder == "big":
+                    column = array("d", column)
+                    column.byteswap()
+                f.write(column.tobytes())
+        # Replace atomically so readers never see a half-written chunk
+        os.replace(tmp_path, path)
+
+    def _chunks(self, start, end):
+        """Yield (year, first slot, last slot, offset from start) covering a range."""
+        for year in range(start.year, end.year + 1):
+            first = max(start, date(year, 1, 1))
+            last = min(end, date(year, 12, 31))
+            yield (
+                year,
+                first.timetuple().tm_yday - 1,
+                last.timetuple().tm_yday - 1,
+                (first - start).days,
+            )
+
+    def load(self, cell, start, end):
+        """Return the stored History for a cell from start to end, inclusive."""
+        columns = [array("d") for _ in HISTORY_VARIABLES]
+        for year, first, last, _ in self._chunks(start, end):
+            chunk = self._read(cell, year)
+            for column, stored in zip(columns, chunk):
+                column.extend(stored[first : last + 1])
+        return History(start, columns)
+
+    def missing(self, cell, start, end):
+        """Return the (first, last) date ranges with no stored data for a cell."""
+        ranges = []
+        for year, first, last, offset in self._chunks(start, end):
+            chunk = self._read(cell, year)
+            for slot in range(first, last + 1):
+                if _has_data(chunk, slot):
+                    continue
+                day = start + timedelta(days=offset + slot - first)
+                if ranges and ranges[-1][1] == day - timedelta(days=1):
+                    ranges[-1] = (ranges[-1][0], day)
+                else:
+                    ranges.append((day, day))
+        return ranges
+
+    def save(self, cell, history):
+        """Merge the days of history that have data into the cell's chunks."""
+        if not len(history):
+            return
+        end = history.start + timedelta(days=len(history) - 1)
+        columns = (
+            history.high,
+            history.low,
+            history.mean,
+            history.precipitation,
+            history.code,
+        )
+        with self._lock:
+            for year, first, last, offset in self._chunks(history.start, end):
+                chunk = self._read(cell, year)
+                for slot in range(first, last + 1):
+                    day = offset + slot - first
+                    if _has_data(columns, day):
+                        for stored, column in zip(chunk, columns):
+                            stored[slot] = column[day]
+                self._write(cell, year, chunk)
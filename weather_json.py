@@ -0,0 +1,134 @@
+"""
+Weather JSON
+
+Pluggable decoding of upstream JSON that keeps only the fields we use.
+"""
+
+import json
+import threading
+from typing import List, Optional, Union
+
+# A schema lists the fields used from a response: a dict names the keys kept
+# from a JSON object, a one-item list describes every item of an array, and
+# a type (str, int, float) is a value kept as decoded. A dict schema also
+# matches an array of such objects, as returned by multi-location requests.
+
+
+def project(data, schema):
+    """Return data reduced to the fields named by schema."""
+    if isinstance(schema, dict):
+        if isinstance(data, list):
+            return [project(item, schema) for item in data]
+        if not isinstance(data, dict):
+            return data
+        return {
+            key: project(data[key], field)
+            for key, field in schema.items()
+            if key in data
+        }
+    # Series of plain values, such as hourly temperatures, are kept as they are
+    if isinstance(schema, list) and isinstance(schema[0], (dict, list)):
+        if isinstance(data, list):
+            return [project(item, schema[0]) for item in data]
+    return data
+
+
+class JSONDecoder:
+    """Decodes with the standard library json module, then drops unused fields."""
+
+    name = "json"
+
+    def loads(self, body):
+        return json.loads(body)
+
+    def decode(self, body, schema=None):
+        """Decode a response body, keeping only the fields in schema if given."""
+        data = self.loads(body)
+        return data if schema is None else project(data, schema)
+
+
+class OrjsonDecoder(JSONDecoder):
+    """Decodes with orjson, several times faster than the json module."""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self.loads = orjson.loads
+
+
+class MsgspecDecoder(JSONDecoder):
+    """Decodes straight into typed structs holding only the schema's fields.
+
+    Unused fields are skipped by the parser rather than built and thrown
+    away. A payload that does not match its schema's types is decoded again
+    without them, so a change upstream degrades to the slower path instead
+    of failing.
+    """
+
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._msgspec = msgspec
+        self._decoders = {}  # id(schema) -> (schema, typed decoder)
+        self._lock = threading.Lock()
+
+    def loads(self, body):
+        return self._msgspec.json.decode(body)
+
+    def decode(self, body, schema=None):
+        if schema is None:
+            return self.loads(body)
+        try:
+            data = self._decoder_for(schema).decode(body)
+        except self._msgspec.ValidationError:
+            return super().decode(body, schema)
+        return self._msgspec.to_builtins(data)
+
+    def _decoder_for(self, schema):
+        with self._lock:
+            entry = self._decoders.get(id(schema))
+            if entry is None or entry[0] is not schema:
+                struct = self._type(schema, "Payload")
+                if isinstance(schema, dict):
+                    struct = Union[struct, List[struct]]
+                entry = (schema, self._msgspec.json.Decoder(struct))
+                self._decoders[id(schema)] = entry
+        return entry[1]
+
+    def _type(self, schema, name):
+        """Build the msgspec type for a schema; every value may be null."""
+        if isinstance(schema, dict):
+            fields = []
+            rename = {}
+            for index, (key, field) in enumerate(schema.items()):
+                attribute = f"f{index}"
+                rename[attribute] = key
+                fields.append(
+                    (attribute, Optional[self._type(field, f"{name}{index}")], None)
+                )
+            return self._msgspec.defstruct(
+                name, fields, rename=rename, omit_defaults=True
+            )
+        if isinstance(schema, list):
+            return List[Optional[self._type(schema[0], name)]]
+        if schema is float:
+            # Whole numbers stay ints, as the other decoders leave them
+            return Union[int, float]
+        return schema
+
+
+DECODERS = (MsgspecDecoder, OrjsonDecoder, JSONDecoder)
+
+
+def default_decoder():
+    """Return the fastest decoder whose library is installed."""
+    for decoder in DECODERS:
+        try:
+            return decoder()
+        except ImportError:
+            continue
+    return JSONDecoder()
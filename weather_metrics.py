@@ -0,0 +1,155 @@
+"""
+Weather Metrics
+
+Timing spans and counters for upstream requests, with Prometheus text export.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Phases timed for every upstream request. connect covers DNS and TCP, tls
+# the handshake on top of it, ttfb everything up to the response headers
+# (including connection setup and retries), body reading the payload and
+# decode parsing its JSON.
+PHASES = ("rate_limit", "connect", "tls", "ttfb", "body", "decode")
+
+
+class Metrics:
+    """Thread-safe counters and timings keyed by name and labels.
+
+    Every observation is also passed to each hook as
+    hook(kind, name, value, labels), where kind is "counter" or "timing",
+    so metrics can be forwarded to another system as they are recorded.
+    """
+
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}  # key -> [count, total seconds, max seconds]
+
+    def increment(self, name, value=1, **labels):
+        """Add value to the counter name."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        for hook in self.hooks:
+            hook("counter", name, value, labels)
+
+    def observe(self, name, seconds, **labels):
+        """Record one timing of name."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                self._timings[key] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+        for hook in self.hooks:
+            hook("timing", name, seconds, labels)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the body of a with block as one observation of name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name, **labels):
+        """Return the current value of a counter, or 0 if never incremented."""
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def timing(self, name, **labels):
+        """Return (count, total seconds, max seconds) for a timing."""
+        with self._lock:
+            timing = self._timings.get((name, tuple(sorted(labels.items()))))
+            return tuple(timing) if timing else (0, 0.0, 0.0)
+
+    def snapshot(self):
+        """Return copies of the counters and timings dicts."""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {key: tuple(value) for key, value in self._timings.items()}
+        return counters, timings
+
+    def to_prometheus(self, prefix="weather"):
+        """Render every metric in the Prometheus text exposition format.
+
+        Counters become <prefix>_<name>_total and timings become summaries
+        named <prefix>_<name>_seconds.
+        """
+        counters, timings = self.snapshot()
+        lines = []
+        for name, series in _by_name(counters):
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in series:
+                lines.append(f"{metric}{_labels(labels)} {value}")
+        for name, series in _by_name(timings):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for labels, (count, total, _) in series:
+                lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{metric}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="weather"):
+        """Write to_prometheus() to path, e.g. for a textfile collector."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Replace atomically so a scrape never reads a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus(prefix))
+        os.replace(tmp_path, path)
+
+    def format_profile(self):
+        """Return a human-readable table of timings followed by counters."""
+        counters, timings = self.snapshot()
+        rows = [("timing", "calls", "total ms", "max ms")]
+        for (name, labels), (count, total, peak) in sorted(timings.items()):
+            rows.append(
+                (
+                    _describe(name, labels),
+                    str(count),
+                    f"{total * 1000:.1f}",
+                    f"{peak * 1000:.1f}",
+                )
+            )
+        for (name, labels), value in sorted(counters.items()):
+            rows.append((_describe(name, labels), str(value), "", ""))
+        width = max(len(row[0]) for row in rows)
+        return "\n".join(
+            f"{row[0]:<{width}}  {row[1]:>6}  {row[2]:>10}  {row[3]:>10}".rstrip()
+            for row in rows
+        )
+
+
+def _by_name(metrics):
+    """Group {(name, labels): value} into sorted (name, [(labels, value)])."""
+    grouped = {}
+    for (name, labels), value in sorted(metrics.items()):
+        grouped.setdefault(name, []).append((labels, value))
+    return grouped.items()
+
+
+def _describe(name, labels):
+    return " ".join([name, *(str(value) for _, value in labels)])
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
@@ -0,0 +1,115 @@
+"""
+Weather Output
+
+Typed result records and streaming text, JSON, JSON Lines and CSV output.
+"""
+
+from typing import NamedTuple, Optional
+
+OUTPUT_FORMATS = ("text", "json", "jsonl", "csv")
+
+
+class PlaceRecord(NamedTuple):
+    """The result of a where-is lookup; error is set when it failed."""
+
+    zipcode: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    timezone: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_location(cls, zipcode, location):
+        if location is None:
+            return cls(zipcode, error="location not found")
+        return cls(
+            zipcode,
+            location.city,
+            location.state,
+            location.lat,
+            location.lon,
+            location.timezone,
+        )
+
+
+class WeatherRecord(NamedTuple):
+    """The result of a current weather lookup; error is set when it failed."""
+
+    zipcode: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    temperature: Optional[float] = None
+    condition: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_lookup(cls, zipcode, location, weather):
+        """Build a record from a resolved Location and its weather (or an error)."""
+        if location is None:
+            return cls(zipcode, error="location not found")
+        record = cls(zipcode, location.city, location.state, location.lat, location.lon)
+        if isinstance(weather, tuple):
+            return record._replace(temperature=weather[0], condition=weather[1])
+        return record._replace(error=str(weather or "") or "weather unavailable")
+
+
+class HistoryRecord(NamedTuple):
+    """Historical weather summarized over a period (a day, week, month or year).
+
+    Temperatures are ºF and precipitation inches; None marks a period with
+    no data.
+    """
+
+    period: str
+    low: Optional[float] = None
+    high: Optional[float] = None
+    mean: Optional[float] = None
+    precipitation: Optional[float] = None
+    heating_degree_days: float = 0.0
+    cooling_degree_days: float = 0.0
+
+
+def format_records(records, record_type, output_format, describe):
+    """Yield output lines for records of record_type as they arrive.
+
+    text lines come from describe(record). json is a single array written
+    one element per line, so like jsonl and csv every record is available
+    to consumers as soon as it is looked up; csv starts with a header row.
+    """
+    if output_format == "text":
+        for record in records:
+            yield describe(record)
+    elif output_format in ("json", "jsonl"):
+        import json
+
+        prefix = "[" if output_format == "json" else ""
+        for record in records:
+            yield prefix + json.dumps(record._asdict(), separators=(",", ":"))
+            if output_format == "json":
+                prefix = ","
+        if output_format == "json":
+            yield "[]" if prefix == "[" else "]"
+    elif output_format == "csv":
+        import csv
+        import io
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="")
+        writer.writerow(record_type._fields)
+        yield _drain(buffer)
+        for record in records:
+            writer.writerow(record)
+            yield _drain(buffer)
+    else:
+        raise ValueError(f"unknown output format: {output_format}")
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
@@ -0,0 +1,346 @@
+"""
+Weather Places
+
+Persistent index of place names resolved through Open-Meteo geocoding, so
+repeat lookups and name completion are answered without a network request.
+"""
+
+import math
+import os
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+from weather_api import Location
+from weather_cache import default_places_path
+
+# Fields decoded from geocoding responses (see weather_json.project)
+GEOCODING_SCHEMA = {
+    "results": [
+        {
+            "id": int,
+            "name": str,
+            "latitude": float,
+            "longitude": float,
+            "admin1": str,
+            "country_code": str,
+            "country": str,
+            "timezone": str,
+            "population": int,
+        }
+    ]
+}
+
+COMPLETIONS = 10
+
+US_STATES = {
+    "Alabama": "AL",
+    "Alaska": "AK",
+    "Arizona": "AZ",
+    "Arkansas": "AR",
+    "California": "CA",
+    "Colorado": "CO",
+    "Connecticut": "CT",
+    "Delaware": "DE",
+    "District of Columbia": "DC",
+    "Florida": "FL",
+    "Georgia": "GA",
+    "Hawaii": "HI",
+    "Idaho": "ID",
+    "Illinois": "IL",
+    "Indiana": "IN",
+    "Iowa": "IA",
+    "Kansas": "KS",
+    "Kentucky": "KY",
+    "Louisiana": "LA",
+    "Maine": "ME",
+    "Maryland": "MD",
+    "Massachusetts": "MA",
+    "Michigan": "MI",
+    "Minnesota": "MN",
+    "Mississippi": "MS",
+    "Missouri": "MO",
+    "Montana": "MT",
+    "Nebraska": "NE",
+    "Nevada": "NV",
+    "New Hampshire": "NH",
+    "New Jersey": "NJ",
+    "New Mexico": "NM",
+    "New York": "NY",
+    "North Carolina": "NC",
+    "North Dakota": "ND",
+    "Ohio": "OH",
+    "Oklahoma": "OK",
+    "Oregon": "OR",
+    "Pennsylvania": "PA",
+    "Puerto Rico": "PR",
+    "Rhode Island": "RI",
+    "South Carolina": "SC",
+    "South Dakota": "SD",
+    "Tennessee": "TN",
+    "Texas": "TX",
+    "Utah": "UT",
+    "Vermont": "VT",
+    "Virginia": "VA",
+    "Washington": "WA",
+    "West Virginia": "WV",
+    "Wisconsin": "WI",
+    "Wyoming": "WY",
+}
+
+
+def normalize(name):
+    """Fold a place name for matching: no accents, case or extra spaces."""
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def split_query(query):
+    """Split 'Portland, OR' into the name and its qualifiers, ('Portland', ['OR'])."""
+    name, *qualifiers = query.split(",")
+    return name.strip(), [q.strip() for q in qualifiers if q.strip()]
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 6371.0 * 2 * math.asin(math.sqrt(min(1.0, a)))
+
+
+@dataclass(frozen=True)
+class Place:
+    """A named place returned by the geocoding API."""
+
+    id: int
+    name: str
+    lat: float
+    lon: float
+    admin1: Optional[str] = None
+    country_code: Optional[str] = None
+    country: Optional[str] = None
+    timezone: Optional[str] = None
+    population: int = 0
+
+    @classmethod
+    def from_result(cls, result):
+        """Build a Place from a geocoding result, or None if it lacks coordinates."""
+        if result.get("latitude") is None or result.get("longitude") is None:
+            return None
+        return cls(
+            id=result.get("id") or 0,
+            name=result.get("name") or "",
+            lat=float(result["latitude"]),
+            lon=float(result["longitude"]),
+            admin1=result.get("admin1"),
+            country_code=result.get("country_code"),
+            country=result.get("country"),
+            timezone=result.get("timezone"),
+            population=result.get("population") or 0,
+        )
+
+    @property
+    def region(self):
+        """The state abbreviation of a US place, otherwise its country code."""
+        if self.country_code == "US" and self.admin1 in US_STATES:
+            return US_STATES[self.admin1]
+        return self.country_code or self.admin1
+
+    @property
+    def label(self):
+        return f"{self.name}, {self.region}" if self.region else self.name
+
+    def matches(self, qualifiers):
+        """Whether every qualifier names this place's state, region or country."""
+        names = {
+            normalize(value)
+            for value in (self.region, self.admin1, self.country_code, self.country)
+            if value
+        }
+        return all(normalize(qualifier) in names for qualifier in qualifiers)
+
+    def location(self, lat=None, lon=None):
+        """The Location of this place, or of a point named after it."""
+        return Location(
+            city=self.name,
+            state=self.region,
+            lat=self.lat if lat is None else lat,
+            lon=self.lon if lon is None else lon,
+            timezone=self.timezone,
+        )
+
+
+_COLUMNS = "id, name, lat, lon, admin1, country_code, country, timezone, population"
+
+
+class PlaceIndex:
+    """SQLite index of geocoded places keyed by their normalized names.
+
+    Every name searched for is stored with its results in the order the
+    geocoding API ranked them, so asking for the same name again, with any
+    qualifier, is answered from disk. Keys live in a B-tree index, so names
+    starting with a prefix are found with a single range scan.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_places_path()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """Open the database on first use so constructing an index is free."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            import sqlite3
+
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS places ("
+                " id INTEGER PRIMARY KEY,"
+                " key TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " lat REAL NOT NULL,"
+                " lon REAL NOT NULL,"
+                " admin1 TEXT,"
+                " country_code TEXT,"
+                " country TEXT,"
+                " timezone TEXT,"
+                " population INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS places_key ON places (key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS places_lat ON places (lat)")
+            # Names searched for, and the places found for each in rank order
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                " query TEXT PRIMARY KEY,"
+                " searched_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " query TEXT NOT NULL REFERENCES searches (query) ON DELETE CASCADE,"
+                " rank INTEGER NOT NULL,"
+                " place_id INTEGER NOT NULL,"
+                " PRIMARY KEY (query, rank))"
+            )
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def search(self, name):
+        """Return the Places stored for a name, or None if it was never searched."""
+        query = normalize(name)
+        with self._lock:
+            conn = self._connect()
+            if not conn.execute(
+                "SELECT 1 FROM searches WHERE query = ?", (query,)
+            ).fetchone():
+                return None
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM results"
+                " JOIN places ON places.id = results.place_id"
+                " WHERE results.query = ? ORDER BY results.rank",
+                (query,),
+            ).fetchall()
+        return [Place(*row) for row in rows]
+
+    def add(self, name, places):
+        """Store the Places a search for name returned, replacing earlier ones."""
+        query = normalize(name)
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO places ({_COLUMNS}, key)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        place.id,
+                        place.name,
+                        place.lat,
+                        place.lon,
+                        place.admin1,
+                        place.country_code,
+                        place.country,
+                        place.timezone,
+                        place.population,
+                        normalize(place.name),
+                    )
+                    for place in places
+                ],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (query, searched_at) VALUES (?, ?)",
+                (query, time.time()),
+            )
+            conn.execute("DELETE FROM results WHERE query = ?", (query,))
+            conn.executemany(
+                "INSERT INTO results (query, rank, place_id) VALUES (?, ?, ?)",
+                [(query, rank, place.id) for rank, place in enumerate(places)],
+            )
+            conn.commit()
+
+    def complete(self, text, limit=COMPLETIONS):
+        """Return stored Places whose label starts with text, most populous first.
+
+        'Port' completes to every Portland, Port Angeles and so on, while
+        'Portland, M' narrows the Portlands down by state or country.
+        """
+        name, qualifiers = split_query(text)
+        prefix = normalize(name)
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM places"
+                " WHERE key >= ? AND key < ?"
+                " ORDER BY population DESC, key, id",
+                (prefix, prefix + "\uffff"),
+            ).fetchall()
+        places = [Place(*row) for row in rows]
+        if qualifiers:
+            typed = normalize(text)
+            places = [
+                place
+                for place in places
+                if normalize(place.name) == prefix
+                and normalize(place.label).startswith(typed)
+            ]
+        return places[:limit]
+
+    def nearest(self, lat, lon, radius):
+        """Return the stored Place closest to lat, lon within radius km, or None."""
+        span = radius / 111.0  # degrees of latitude
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM places WHERE lat BETWEEN ? AND ?",
+                (lat - span, lat + span),
+            ).fetchall()
+        best, best_distance = None, radius
+        for row in rows:
+            place = Place(*row)
+            distance = distance_km(lat, lon, place.lat, place.lon)
+            if distance <= best_distance:
+                best, best_distance = place, distance
+        return best
+
+    def __len__(self):
+        with self._lock:
+            conn = self._connect()
+            return conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
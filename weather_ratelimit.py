@@ -0,0 +1,141 @@
+"""
+Weather Rate Limiting
+
+Client-side token buckets that keep requests within upstream free-tier limits.
+"""
+
+import math
+import os
+import struct
+import threading
+import time
+
+from weather_cache import default_ratelimit_dir
+
+# Free-tier budgets per upstream host, as (requests, per seconds)
+RATE_LIMITS = {
+    "ip-api.com": (45, 60),
+    "api.open-meteo.com": (600, 60),
+    "archive-api.open-meteo.com": (600, 60),
+    "geocoding-api.open-meteo.com": (600, 60),
+    "api.zippopotam.us": (600, 60),
+    # wttr.in publishes no limit; stay well clear of being blocked
+    "wttr.in": (60, 60),
+}
+
+# Shared bucket file layout: tokens, last refill (Unix time), requests made
+BUCKET = struct.Struct("<ddQ")
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `requests` calls every `per` seconds.
+
+    Callers that find the bucket empty reserve the next token rather than
+    polling for it, so they are served in the order they arrived.
+    """
+
+    def __init__(self, requests, per):
+        self.requests = requests
+        self.per = per
+        self.capacity = float(requests)
+        self.rate = requests / per
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens, updated, now):
+        """Refill, then take a token; return (tokens, wait before using it)."""
+        elapsed = max(0.0, now - updated)
+        tokens = min(self.capacity, tokens + elapsed * self.rate) - 1
+        return tokens, (-tokens / self.rate if tokens < 0 else 0.0)
+
+    def acquire(self):
+        """Take one token, sleeping until it is due."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens, wait = self._reserve(self._tokens, self._updated, now)
+            self._updated = now
+        if wait:
+            time.sleep(wait)
+
+
+class SharedRateLimiter(RateLimiter):
+    """Token bucket shared by every process on this host through a locked file.
+
+    The bucket lives in `<directory>/<host>.bucket` and is updated under an
+    exclusive flock, so concurrent CLI runs, batch jobs and the daemon draw
+    from one budget per upstream. Without fcntl (on Windows) the bucket is
+    only shared between threads.
+    """
+
+    def __init__(self, host, requests, per, directory=None):
+        super().__init__(requests, per)
+        self.host = host
+        self.path = os.path.join(directory or default_ratelimit_dir(), f"{host}.bucket")
+
+    def _locked(self, update):
+        """Run update(tokens, updated, total) on the bucket under its lock.
+
+        update returns the new (tokens, updated, total), or None to leave
+        the file untouched.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                data = os.read(fd, BUCKET.size)
+                if len(data) == BUCKET.size:
+                    state = BUCKET.unpack(data)
+                else:
+                    state = (self.capacity, time.time(), 0)
+                new_state = update(*state)
+                if new_state is not None:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    os.write(fd, BUCKET.pack(*new_state))
+                return state
+            finally:
+                # Closing the descriptor also releases the flock
+                os.close(fd)
+
+    def acquire(self):
+        """Take one token from the shared bucket, sleeping until it is due."""
+        wait = 0.0
+
+        def take(tokens, updated, total):
+            nonlocal wait
+            now = time.time()
+            tokens, wait = self._reserve(tokens, updated, now)
+            return tokens, max(now, updated), total + 1
+
+        self._locked(take)
+        if wait:
+            time.sleep(wait)
+
+    def usage(self):
+        """Return a snapshot of the shared bucket for this host."""
+        tokens, updated, total = self._locked(lambda *state: None)
+        elapsed = max(0.0, time.time() - updated)
+        tokens = min(self.capacity, tokens + elapsed * self.rate)
+        return {
+            "host": self.host,
+            "requests": self.requests,
+            "per": self.per,
+            "used": self.requests - max(0, math.floor(tokens)),
+            "queued": max(0, -math.floor(tokens)),
+            "total": total,
+        }
+
+
+def default_limiters(directory=None):
+    """Build a shared limiter for every upstream with a known budget."""
+    return {
+        host: SharedRateLimiter(host, *limit, directory=directory)
+        for host, limit in RATE_LIMITS.items()
+    }
@@ -0,0 +1,153 @@
+"""
+Weather Watch
+
+Keeps cached weather for a list of watched locations fresh in the background.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import List
+
+from weather_api import REFRESH_LEAD
+from weather_cache import default_watch_path
+
+# Seconds between checks of the watch list. Entries expiring within
+# REFRESH_LEAD are renewed, so checking more often than that keeps every
+# watched location fresh.
+WATCH_INTERVAL = REFRESH_LEAD / 2
+
+
+def parse_location(text):
+    """Return a watched location: a zip code, or a (lat, lon) for 'LAT,LON'."""
+    text = text.strip()
+    if "," in text:
+        try:
+            lat, lon = (float(part) for part in text.split(","))
+        except ValueError:
+            raise ValueError(f"{text} is not a LAT,LON pair")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"{text} is out of range")
+        return (lat, lon)
+    if not (len(text) == 5 and text.isdigit()):
+        raise ValueError(f"{text} is neither a zip code nor a LAT,LON pair")
+    return text
+
+
+def format_location(location):
+    """Render a parsed location the way it is stored in the watch list."""
+    if isinstance(location, tuple):
+        return f"{location[0]},{location[1]}"
+    return location
+
+
+@dataclass
+class Watchlist:
+    """Watched locations, as zip codes or 'LAT,LON', and how often to check them."""
+
+    locations: List[str] = field(default_factory=list)
+    interval: float = WATCH_INTERVAL
+
+    @classmethod
+    def load(cls, path=None):
+        """Read the watch list, or return an empty one if none was saved."""
+        try:
+            with open(path or default_watch_path()) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        return cls(
+            locations=list(data.get("locations", [])),
+            interval=float(data.get("interval", WATCH_INTERVAL)),
+        )
+
+    def save(self, path=None):
+        path = path or default_watch_path()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"locations": self.locations, "interval": self.interval}, f)
+        os.replace(tmp_path, path)
+
+
+class WatchRefresher:
+    """Renews cached weather for watched locations before it expires.
+
+    Each check re-reads the watch list, so locations added while the
+    refresher runs are picked up, and fetches weather for every watched
+    grid cell whose cached entry is missing or expires within lead seconds,
+    using multi-location requests.
+    """
+
+    def __init__(self, service, path=None, lead=REFRESH_LEAD):
+        self.service = service
+        self.path = path
+        self.lead = lead
+        self._coordinates = {}  # zip codes resolved so far
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _point(self, location):
+        location = parse_location(location)
+        if isinstance(location, tuple):
+            return location
+        if location not in self._coordinates:
+            resolved = self.service.resolve_location(location)
+            if resolved is None:
+                return None
+            self._coordinates[location] = (resolved.lat, resolved.lon)
+        return self._coordinates[location]
+
+    def refresh_once(self):
+        """Check the watch list once; return {location: result or error}."""
+        results = {}
+        points = {}
+        for location in Watchlist.load(self.path).locations:
+            try:
+                point = self._point(location)
+            except ValueError as e:
+                point, results[location] = None, e
+            if point is None:
+                results.setdefault(location, LookupError("location not found"))
+            else:
+                points[location] = point
+        weather = self.service.get_weather_for_coordinates(
+            list(points.values()), refresh_within=self.lead
+        )
+        results.update(zip(points, weather))
+        return results
+
+    def run(self, report=None):
+        """Check the watch list every interval seconds until stop() is called.
+
+        report, if given, is called with the results of every check.
+        """
+        while not self._stop.is_set():
+            interval = WATCH_INTERVAL
+            try:
+                interval = Watchlist.load(self.path).interval
+                results = self.refresh_once()
+                if report is not None:
+                    report(results)
+            except Exception:
+                # A bad watch list or failed check must not stop the refresher
+                self.service.metrics.increment("errors", operation="watch")
+            self._stop.wait(interval)
+
+    def start(self):
+        """Run the refresher in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="weather-watch", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None